@@ -11,24 +11,45 @@ on two different contigs.
 
 This module contains all these alignment functions:
     - align
+    - align_chunks
+    - align_pairs
+    - align_to_pairs
+    - bam_to_pairs
     - get_contact_pairs
+    - get_library_pairs
+    - get_read_name_key
     - merge_alignement
+    - merge_ordered_alignment
     - process_bamfile
+    - process_bamfile_worker
     - process_bwa_bamfile
+    - stream_bamfile
 """
 
-import csv
+import concurrent.futures as cf
+import multiprocessing
+import os
 import pysam
+import re
 import shutil as st
+import signal
 import subprocess as sp
+import time
 import hicstuff.cutsite as hcc
 import hicstuff.io as hio
 import hicstuff.iteralign as hci
 import metator.io as mio
 import metator.network as mtn
 from metator.log import logger
-from os.path import join
-from looseversion import LooseVersion
+from os.path import basename, join
+
+
+# Number of threads above which the aligners stop scaling. With more threads,
+# the reads are split in chunks aligned in parallel.
+ALIGNER_THREADS = 16
+
+# Digits runs of the read names, compared as numbers by samtools sort -n.
+DIGITS_REGEX = re.compile(r"([0-9]+)")
 
 
 def align(
@@ -127,6 +148,413 @@ def align(
     return 0
 
 
+def align_chunks(
+    for_in,
+    rev_in,
+    index,
+    aligner,
+    min_qual,
+    contig_data,
+    out_file,
+    bam_prefix,
+    tmp_dir,
+    n_cpu,
+    n_chunks,
+    no_bam=False,
+):
+    """Split the reads of a library in chunks, align them in parallel and
+    merge the pairs of all the chunks in one pairs file.
+
+    The threads are shared between the chunks, so that each aligner process
+    uses a number of threads for which it still scales.
+
+    Parameters
+    ----------
+    for_in : str
+        Path to input forward fastq file to align.
+    rev_in : str
+        Path to input reverse fastq file to align.
+    index : str
+        Path to the index of the assembly.
+    aligner : str
+        Name of the aligner algorithm to use. Either bowtie2 or bwa.
+    min_qual : int
+        Minimum mapping quality required to keep Hi-C pairs.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_file : str
+        Path to write the output pairs file.
+    bam_prefix : str
+        Prefix of the BAM files of the chunks. The chunk number is added to
+        it.
+    tmp_dir : str
+        Path where temporary files should be written.
+    n_cpu : int
+        The number of CPUs to use for the alignment.
+    n_chunks : int
+        Number of chunks to align in parallel.
+    no_bam : bool
+        If enabled, the pairs are built directly from the output of the aligner
+        without writing the BAM files. [Default: False]
+
+    Returns
+    -------
+    int:
+        Number of pairs aligned.
+    """
+    chunk_dir = join(tmp_dir, basename(bam_prefix) + "_chunks")
+    os.makedirs(chunk_dir, exist_ok=True)
+
+    # The workers of a multiprocessing.Pool can't start the processes used to
+    # filter the BAM files, so concurrent.futures executors are used instead.
+    with cf.ProcessPoolExecutor(max_workers=2) as executor:
+        split_for = executor.submit(
+            mio.split_fastq, for_in, n_chunks, join(chunk_dir, "for")
+        )
+        split_rev = executor.submit(
+            mio.split_fastq, rev_in, n_chunks, join(chunk_dir, "rev")
+        )
+        for_chunks = split_for.result()
+        rev_chunks = split_rev.result()
+
+    # Align the chunks in parallel.
+    threads = max(1, int(n_cpu) // n_chunks)
+    chunks_pairs = [join(chunk_dir, f"{k}.pairs") for k in range(n_chunks)]
+    chunks_tmp_dirs = [join(chunk_dir, f"tmp_{k}") for k in range(n_chunks)]
+    for chunk_tmp_dir in chunks_tmp_dirs:
+        os.makedirs(chunk_tmp_dir, exist_ok=True)
+    with cf.ProcessPoolExecutor(max_workers=n_chunks) as executor:
+        futures = [
+            executor.submit(
+                align_pairs,
+                for_chunks[k],
+                rev_chunks[k],
+                index,
+                aligner,
+                min_qual,
+                contig_data,
+                chunks_pairs[k],
+                f"{bam_prefix}_{k}",
+                chunks_tmp_dirs[k],
+                threads,
+                False,
+                no_bam,
+            )
+            for k in range(n_chunks)
+        ]
+        n_pairs = sum(future.result() for future in futures)
+
+    # Merge the pairs of the chunks. The header is taken from the first chunk
+    # but the pairs are no longer sorted by read name.
+    with open(out_file, "w") as merged:
+        for k, chunk_pairs in enumerate(chunks_pairs):
+            with open(chunk_pairs, "r") as pairs:
+                line = pairs.readline()
+                while line.startswith("#"):
+                    if k == 0 and not line.startswith("#sorted"):
+                        merged.write(line)
+                    line = pairs.readline()
+                merged.write(line)
+                st.copyfileobj(pairs, merged)
+    st.rmtree(chunk_dir)
+    return n_pairs
+
+
+def align_pairs(
+    for_in,
+    rev_in,
+    index,
+    aligner,
+    min_qual,
+    contig_data,
+    out_file,
+    bam_prefix,
+    tmp_dir,
+    n_cpu,
+    iterative=False,
+    no_bam=False,
+):
+    """Align the forward and reverse reads of a library and write the pairs
+    file of the aligned pairs.
+
+    Parameters
+    ----------
+    for_in : str
+        Path to input forward fastq file to align.
+    rev_in : str
+        Path to input reverse fastq file to align.
+    index : str
+        Path to the index of the assembly.
+    aligner : str
+        Name of the aligner algorithm to use. Either bowtie2 or bwa.
+    min_qual : int
+        Minimum mapping quality required to keep Hi-C pairs.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_file : str
+        Path to write the output pairs file.
+    bam_prefix : str
+        Prefix of the BAM files written: <bam_prefix>_for.bam and
+        <bam_prefix>_rev.bam, or <bam_prefix>.bam for bwa.
+    tmp_dir : str
+        Path where temporary files should be written.
+    n_cpu : int
+        The number of CPUs to use for the alignment.
+    iterative : bool
+        Wether to use the iterative mapping procedure. [Default: False]
+    no_bam : bool
+        If enabled, the pairs are built directly from the output of the aligner
+        without writing the BAM files. Not available with the iterative
+        mapping. [Default: False]
+
+    Returns
+    -------
+    int:
+        Number of pairs aligned.
+    """
+    if no_bam:
+        logger.info(f"Alignment of {for_in} and {rev_in}:")
+        return align_to_pairs(
+            for_in,
+            rev_in,
+            index,
+            aligner,
+            min_qual,
+            contig_data,
+            out_file,
+            n_cpu,
+            tmp_dir,
+        )
+
+    if iterative or (aligner == "bowtie2"):
+        # Create files to save the alignment.
+        alignment_for = bam_prefix + "_for.bam"
+        alignment_rev = bam_prefix + "_rev.bam"
+
+        # Align the forward reads
+        logger.info(f"Alignment of {for_in}:")
+        align(
+            for_in,
+            index,
+            aligner,
+            alignment_for,
+            n_cpu,
+            tmp_dir,
+            iterative,
+        )
+
+        # Align the reverse reads
+        logger.info(f"Alignment of  {rev_in}:")
+        align(
+            rev_in,
+            index,
+            aligner,
+            alignment_rev,
+            n_cpu,
+            tmp_dir,
+            iterative,
+        )
+    elif aligner == "bwa":
+        # Create file to save the alignement.
+        alignment_for = bam_prefix + ".bam"
+        alignment_rev = None
+        logger.info(f"Alignment of {for_in} and {rev_in}:")
+        align(
+            for_in,
+            index,
+            aligner,
+            alignment_for,
+            n_cpu,
+            tmp_dir,
+            fq_in_2=rev_in,
+        )
+    return bam_to_pairs(
+        alignment_for, alignment_rev, min_qual, contig_data, out_file, n_cpu
+    )
+
+
+def align_to_pairs(
+    for_in,
+    rev_in,
+    index,
+    aligner,
+    min_qual,
+    contig_data,
+    out_file,
+    n_cpu,
+    tmp_dir,
+):
+    """Align the reads and write the pairs file on the fly from the SAM output
+    of the aligner, without writing, sorting and reading again the BAM files.
+
+    With bowtie2, both reads files are aligned at the same time and kept in the
+    order of the fastq files, so that the mates are read side by side. With
+    bwa, the mates are already interleaved in the output.
+
+    Parameters
+    ----------
+    for_in : str
+        Path to input forward fastq file to align.
+    rev_in : str
+        Path to input reverse fastq file to align.
+    index : str
+        Path to the index of the assembly.
+    aligner : str
+        Name of the aligner algorithm to use. Either bowtie2 or bwa.
+    min_qual : int
+        Minimum mapping quality required to keep Hi-C pairs.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_file : str
+        Path to write the output pairs file.
+    n_cpu : int
+        The number of CPUs to use for the alignment.
+    tmp_dir : str
+        Path to directory to store the logs of the aligners.
+
+    Returns
+    -------
+    int:
+        Number of pairs aligned.
+    """
+    n_cpu = int(n_cpu)
+    map_args = {"idx": index, "fq": for_in, "fq_rev": rev_in}
+    if aligner == "bwa":
+        cmds = ["bwa mem -5SP -t {cpus} {idx} {fq} {fq_rev}"]
+        map_args["cpus"] = n_cpu
+    elif aligner == "bowtie2":
+        # Unaligned reads are kept to have one record for each read.
+        cmds = [
+            "bowtie2 -x {idx} -p {cpus} --very-sensitive-local --reorder {fq}",
+            "bowtie2 -x {idx} -p {cpus} --very-sensitive-local --reorder "
+            "{fq_rev}",
+        ]
+        map_args["cpus"] = max(1, n_cpu // 2)
+    else:
+        logger.error('Aligner should be either "bowtie2" or "bwa".')
+        raise ValueError
+
+    # Launch the aligners and read their output as it's written.
+    log_files = [
+        join(tmp_dir, f"{aligner}_{i}.log") for i in range(len(cmds))
+    ]
+    map_processes = []
+    alignments = []
+    try:
+        for cmd, log_file in zip(cmds, log_files):
+            with open(log_file, "w") as log:
+                map_processes.append(
+                    sp.Popen(
+                        cmd.format(**map_args),
+                        shell=True,
+                        stdout=sp.PIPE,
+                        stderr=log,
+                        start_new_session=True,
+                    )
+                )
+        save = pysam.set_verbosity(0)
+        try:
+            for process in map_processes:
+                alignments.append(
+                    pysam.AlignmentFile(process.stdout, "r", check_sq=False)
+                )
+        finally:
+            pysam.set_verbosity(save)
+
+        if aligner == "bwa":
+            n_pairs = process_bwa_bamfile(
+                alignments[0], min_qual, contig_data, out_file
+            )
+        else:
+            n_pairs, aligned_for, aligned_rev = merge_ordered_alignment(
+                alignments[0], alignments[1], min_qual, contig_data, out_file
+            )
+            logger.info(
+                f"{aligned_for} forward reads aligned and {aligned_rev} reverse reads aligned."
+            )
+    except BaseException:
+        # Stop the aligners if their output could not be processed, otherwise
+        # they would keep running with all their threads. The whole process
+        # group is stopped as the shell and the aligners wrappers run the
+        # aligners in child processes.
+        for process in map_processes:
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        raise
+    finally:
+        # Close the streams, wait for the aligners and log their output.
+        for alignment in alignments:
+            alignment.close()
+        returncodes = []
+        for process, log_file in zip(map_processes, log_files):
+            process.stdout.close()
+            returncodes.append(process.wait())
+            with open(log_file, "r") as log:
+                for line in log:
+                    logger.info(line.rstrip("\n"))
+
+    # A failed aligner stops its output early, so the pairs are incomplete.
+    for returncode in returncodes:
+        if returncode != 0:
+            logger.error(f"The alignment failed with the code {returncode}.")
+            raise ValueError
+    return n_pairs
+
+
+def bam_to_pairs(
+    alignment_for, alignment_rev, min_qual, contig_data, out_file, n_cpu
+):
+    """Filter the name sorted alignment BAM files of a library and write the
+    pairs file of the aligned pairs.
+
+    Parameters
+    ----------
+    alignment_for : str
+        Path to the forward alignment, or to the interleaved alignment of bwa.
+    alignment_rev : str or None
+        Path to the reverse alignment. None for the interleaved alignment of
+        bwa.
+    min_qual : int
+        Minimum mapping quality required to keep Hi-C pairs.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_file : str
+        Path to write the output pairs file.
+    n_cpu : int
+        The number of CPUs to use to read the BAM files.
+
+    Returns
+    -------
+    int:
+        Number of pairs aligned.
+    """
+    # Case where a bam file from bwa is given as input.
+    if alignment_rev is None:
+        return process_bwa_bamfile(
+            alignment_for, min_qual, contig_data, out_file, int(n_cpu)
+        )
+
+    # Filters the aligned and non aligned reads from the forward and reverse
+    # bam files in parallel and merge them on the fly to create a pairs file.
+    logger.info("Merging the pairs:")
+    if int(n_cpu) > 1:
+        threads = max(1, int(n_cpu) // 2)
+        aligned_for = stream_bamfile(alignment_for, min_qual, threads)
+        aligned_rev = stream_bamfile(alignment_rev, min_qual, threads)
+    else:
+        aligned_for = process_bamfile(alignment_for, min_qual)
+        aligned_rev = process_bamfile(alignment_rev, min_qual)
+    n_pairs, aligned_reads_for, aligned_reads_rev = merge_alignment(
+        aligned_for, aligned_rev, contig_data, out_file
+    )
+    logger.info(
+        f"{aligned_reads_for} forward reads aligned and {aligned_reads_rev} reverse reads aligned."
+    )
+    return n_pairs
+
+
 def get_contact_pairs(
     for_in,
     rev_in,
@@ -141,6 +569,10 @@ def get_contact_pairs(
     out_dir,
     tmp_dir,
     n_cpu,
+    no_bam=False,
+    compact=False,
+    dedup=False,
+    cache=False,
 ):
     """General function to do the whole alignment of both fastq.
 
@@ -183,6 +615,21 @@ def get_contact_pairs(
         Path where temporary files should be written.
     n_cpu : int
         The number of CPUs to use for the alignment.
+    no_bam : bool
+        If enabled, the pairs are built directly from the output of the aligner
+        without writing the BAM files. Only used with the fastq start and not
+        available with the iterative mode. [Default: False]
+    compact : bool
+        If enabled, the pairs files are converted to the compact npz format
+        (see metator.io.pairs_to_npz) instead of being sorted and indexed.
+        [Default: False]
+    dedup : bool
+        If enabled, the duplicated pairs (same contigs, positions and strands)
+        are removed. [Default: False]
+    cache : bool
+        If enabled, the contigs statistics are read from or written to a cache
+        next to the assembly (see metator.network.create_contig_data).
+        [Default: False]
 
     Returns
     -------
@@ -202,185 +649,369 @@ def get_contact_pairs(
     # Iterates on all the input files:
     for_list = for_in.split(",")
     rev_list = rev_in.split(",")
-    out_file_list = []
-    total_aligned_pairs = 0
+
+    # Build the pairs on the fly from the output of the aligner if possible.
+    pipe = no_bam and start == "fastq"
+    if pipe and aligner_mode == "iterative":
+        logger.warning(
+            "BAM files are required with the iterative mode. They will be written."
+        )
+        pipe = False
 
     # Create the contig data dictionnary and hit from each alignments
     nb_alignment = len(for_list)
     contig_data, hit_data = mtn.create_contig_data(
-        assembly, nb_alignment, depth_file, enzyme
+        assembly, nb_alignment, depth_file, enzyme, n_cpu, cache
     )
 
-    for i in range(len(for_list)):
-        for_in = for_list[i]
-        try:
-            rev_in = rev_list[i]
-        except IndexError:
-            rev_in = None
-        name = "alignment_" + str(i)
-        out_file = join(out_dir, "alignment_" + str(i) + ".pairs")
-
-        # Align if necessary
-        if start == "fastq":
-
-            iterative = False
-
-            # Digest reads if necessary.
-            if aligner_mode == "cutsite":
-                digest_for = join(tmp_dir, f"digest_for_{i}.fq.gz")
-                digest_rev = join(tmp_dir, f"digest_rev_{i}.fq.gz")
-                hcc.cut_ligation_sites(
-                    fq_for=for_in,
-                    fq_rev=rev_in,
-                    digest_for=digest_for,
-                    digest_rev=digest_rev,
-                    enzyme=enzyme,
-                    mode="for_vs_rev",
-                    seed_size=20,
-                    n_cpu=int(n_cpu),
-                )
-                for_in, rev_in = digest_for, digest_rev
-
-            elif aligner_mode == "iterative":
-                iterative = True
-
-            if iterative or (aligner == "bowtie2"):
-                # Create files to save the alignment.
-                alignment_for = join(out_dir, name + "_for.bam")
-                alignment_rev = join(out_dir, name + "_rev.bam")
-
-                # Align the forward reads
-                logger.info(f"Alignment of {for_in}:")
-                align(for_in, index, aligner, alignment_for, n_cpu, iterative)
-
-                # Align the reverse reads
-                logger.info(f"Alignment of  {rev_in}:")
-                align(
-                    rev_in,
-                    index,
-                    aligner,
-                    alignment_rev,
-                    n_cpu,
-                    tmp_dir,
-                    iterative,
-                )
-            elif aligner == "bwa":
-                # Create file to save the alignement.
-                alignment = join(out_dir, name + ".bam")
-                logger.info(f"Alignment of {for_in} and {rev_in}:")
-                align(
-                    for_in,
-                    index,
-                    aligner,
-                    alignment,
-                    n_cpu,
-                    tmp_dir,
-                    fq_in_2=rev_in,
-                )
-
-        elif start == "bam":
-            if aligner == "bowtie2":
-                logger.info(f"Processing {for_in} and {rev_in}:")
-                alignment_for = for_in
-                alignment_rev = rev_in
-            elif aligner == "bwa":
-                alignment = for_in
+    # Run the libraries in parallel if there are enough threads to run several
+    # aligners at their best. The threads are shared between the libraries.
+    n_libraries = len(for_list)
+    n_parallel = min(n_libraries, -(-int(n_cpu) // ALIGNER_THREADS))
+    threads = max(1, int(n_cpu) // n_parallel)
+
+    def get_library_args(i, library_threads):
+        return (
+            i,
+            for_list[i],
+            rev_list[i] if i < len(rev_list) else None,
+            index,
+            aligner,
+            aligner_mode,
+            min_qual,
+            start,
+            enzyme,
+            contig_data,
+            out_dir,
+            tmp_dir,
+            library_threads,
+            pipe,
+            compact,
+            dedup,
+        )
 
+    # Each of the n_parallel slots processes its libraries one after the other
+    # with its threads. The pairs of a library are sorted and indexed in the
+    # background while the next library of the slot is aligned: the threads of
+    # the slot are then split between the sort, much shorter, and the aligner.
+    # With a single thread, the sort is done before the next alignment.
+    if threads > 1:
+        sort_threads = max(1, threads // 4)
+    else:
+        sort_threads = 0
+    if n_parallel > 1:
+        logger.info(
+            f"{n_parallel} libraries processed in parallel with {threads} threads each."
+        )
+        executor = cf.ProcessPoolExecutor(max_workers=n_parallel)
+    else:
+        executor = cf.ThreadPoolExecutor(max_workers=1)
+    start_time = time.time()
+    total_aligned_pairs = 0
+    sort_futures = {}
+    slot_sorts = [None] * n_parallel
+    futures = {}
+    next_library = 0
+    with executor, cf.ThreadPoolExecutor(max_workers=n_parallel) as sorter:
+        for slot in range(min(n_parallel, n_libraries)):
+            future = executor.submit(
+                get_library_pairs, *get_library_args(next_library, threads)
+            )
+            futures[future] = (slot, next_library)
+            next_library += 1
+        while futures:
+            done, _ = cf.wait(futures, return_when=cf.FIRST_COMPLETED)
+            for future in done:
+                slot, i = futures.pop(future)
+                total_aligned_pairs += future.result()
+                library_threads = threads
+                # Compact pairs files don't need to be sorted.
+                if not compact:
+                    # Only one sort by slot to stay within its threads.
+                    if slot_sorts[slot] is not None:
+                        slot_sorts[slot].result()
+                    if next_library == n_libraries:
+                        library_sort_threads = threads
+                    else:
+                        library_sort_threads = sort_threads
+                        library_threads = threads - sort_threads
+                    slot_sorts[slot] = sorter.submit(
+                        mio.sort_pairs_pairtools,
+                        join(out_dir, f"alignment_{i}.pairs"),
+                        threads=max(1, library_sort_threads),
+                        remove=True,
+                        force=True,
+                        dedup=dedup,
+                    )
+                    sort_futures[i] = slot_sorts[slot]
+                    if library_sort_threads == 0:
+                        slot_sorts[slot].result()
+                if next_library < n_libraries:
+                    next_future = executor.submit(
+                        get_library_pairs,
+                        *get_library_args(next_library, library_threads),
+                    )
+                    futures[next_future] = (slot, next_library)
+                    next_library += 1
+
+        if compact:
+            out_file_list = [
+                join(out_dir, f"alignment_{i}.pairs.npz")
+                for i in range(n_libraries)
+            ]
         else:
-            logger.error("Start argument should be either 'fastq' or 'bam'.")
-            raise ValueError
+            out_file_list = [
+                sort_futures[i].result() for i in range(n_libraries)
+            ]
+    logger.info(
+        f"{n_libraries} libraries processed in {time.time() - start_time:.1f}s."
+    )
 
-        if aligner == "bowtie2":
-            # Create files to save the alignment.
-            alignment_temp_for = join(tmp_dir, name + "_for_temp.txt")
-            alignment_temp_rev = join(tmp_dir, name + "_rev_temp.txt")
-
-            # Filters the aligned and non aligned reads from the forward and
-            # reverse bam files.
-            aligned_reads_for = process_bamfile(
-                alignment_for, min_qual, alignment_temp_for
-            )
-            aligned_reads_rev = process_bamfile(
-                alignment_rev, min_qual, alignment_temp_rev
+    if len(out_file_list) > 1:
+        logger.info(f"TOTAL PAIRS MAPPED: {total_aligned_pairs}\n")
+
+    return out_file_list, contig_data, hit_data
+
+
+def get_library_pairs(
+    i,
+    for_in,
+    rev_in,
+    index,
+    aligner,
+    aligner_mode,
+    min_qual,
+    start,
+    enzyme,
+    contig_data,
+    out_dir,
+    tmp_dir,
+    n_cpu,
+    no_bam=False,
+    compact=False,
+    dedup=False,
+):
+    """Build the pairs file of one library from its fastq or bam files. The
+    pairs file is written in <out_dir>/alignment_<i>.pairs.
+
+    Parameters
+    ----------
+    i : int
+        Index of the library.
+    for_in : str
+        Path to input forward fastq or bam file.
+    rev_in : str or None
+        Path to input reverse fastq or bam file.
+    index : str
+        Path to the index of the assembly.
+    aligner : str
+        Either 'bowtie2' or 'bwa' aligner used or to be use to map the reads.
+    aligner_mode : str
+        Either 'normal', 'iterative' or 'cutsiste'. Mode to align the HiC reads.
+    min_qual : int
+        Minimum mapping quality required to keep Hi-C pairs.
+    start : str
+        Either fastq or bam. Starting point for the pipeline.
+    enzyme : str or None
+        String that contains the names of the enzyme separated by a comma.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_dir : str
+        Path to directory where to write the output file.
+    tmp_dir : str
+        Path where temporary files should be written.
+    n_cpu : int
+        The number of CPUs to use for the library.
+    no_bam : bool
+        If enabled, the pairs are built directly from the output of the aligner
+        without writing the BAM files. [Default: False]
+    compact : bool
+        If enabled, the pairs file is converted to the compact npz format in
+        <out_dir>/alignment_<i>.pairs.npz. [Default: False]
+    dedup : bool
+        If enabled with the compact format, the duplicated pairs are removed
+        before the conversion. Otherwise, they are removed while sorting the
+        pairs in get_contact_pairs. [Default: False]
+
+    Returns
+    -------
+    int:
+        Number of pairs aligned.
+    """
+    start_time = time.time()
+    name = "alignment_" + str(i)
+    out_file = join(out_dir, "alignment_" + str(i) + ".pairs")
+    library_tmp_dir = join(tmp_dir, name)
+    os.makedirs(library_tmp_dir, exist_ok=True)
+
+    # Align if necessary
+    if start == "fastq":
+
+        iterative = False
+
+        # Digest reads if necessary.
+        if aligner_mode == "cutsite":
+            digest_for = join(tmp_dir, f"digest_for_{i}.fq.gz")
+            digest_rev = join(tmp_dir, f"digest_rev_{i}.fq.gz")
+            hcc.cut_ligation_sites(
+                fq_for=for_in,
+                fq_rev=rev_in,
+                digest_for=digest_for,
+                digest_rev=digest_rev,
+                enzyme=enzyme,
+                mode="for_vs_rev",
+                seed_size=20,
+                n_cpu=int(n_cpu),
             )
+            for_in, rev_in = digest_for, digest_rev
+
+        elif aligner_mode == "iterative":
+            iterative = True
+
+        # Split the reads in chunks aligned in parallel if there are more
+        # threads than the aligner could use efficiently.
+        n_chunks = 1 if iterative else -(-int(n_cpu) // ALIGNER_THREADS)
+        if n_chunks > 1:
             logger.info(
-                f"{aligned_reads_for} forward reads aligned and {aligned_reads_rev} reverse reads aligned."
+                f"Alignment of {for_in} and {rev_in} in {n_chunks} chunks:"
             )
-
-            # Merge alignement to create a pairs file
-            logger.info("Merging the pairs:")
-            n_pairs = merge_alignment(
-                alignment_temp_for, alignment_temp_rev, contig_data, out_file
+            n_pairs = align_chunks(
+                for_in,
+                rev_in,
+                index,
+                aligner,
+                min_qual,
+                contig_data,
+                out_file,
+                join(out_dir, name),
+                library_tmp_dir,
+                n_cpu,
+                n_chunks,
+                no_bam,
             )
-
-        # Case where a bam file from bwa is given as input.
-        if aligner == "bwa":
-            n_pairs = process_bwa_bamfile(
-                alignment, min_qual, contig_data, out_file
+        else:
+            n_pairs = align_pairs(
+                for_in,
+                rev_in,
+                index,
+                aligner,
+                min_qual,
+                contig_data,
+                out_file,
+                join(out_dir, name),
+                library_tmp_dir,
+                n_cpu,
+                iterative,
+                no_bam,
             )
 
-        logger.info(f"{n_pairs} pairs aligned.\n")
-        total_aligned_pairs += n_pairs
+    elif start == "bam":
+        if aligner == "bowtie2":
+            logger.info(f"Processing {for_in} and {rev_in}:")
+            n_pairs = bam_to_pairs(
+                for_in, rev_in, min_qual, contig_data, out_file, n_cpu
+            )
+        elif aligner == "bwa":
+            logger.info(f"Processing {for_in}:")
+            n_pairs = bam_to_pairs(
+                for_in, None, min_qual, contig_data, out_file, n_cpu
+            )
 
-    # Sort pairs.
-    logger.info(f"Sort and indexed {out_file}")
-    out_file = mio.sort_pairs_pairtools(
-        out_file,
-        threads=n_cpu,
-        remove=True,
-        force=True
+    else:
+        logger.error("Start argument should be either 'fastq' or 'bam'.")
+        raise ValueError
+
+    if compact:
+        if dedup:
+            dedup_file = join(library_tmp_dir, "alignment_dedup.pairs")
+            mio.sort_pairs_file(out_file, dedup_file, n_cpu, dedup=True)
+            st.move(dedup_file, out_file)
+        mio.pairs_to_npz(out_file, remove=True)
+
+    logger.info(
+        f"{n_pairs} pairs aligned for the library {i} in {time.time() - start_time:.1f}s.\n"
     )
-    out_file_list.append(out_file)
+    return n_pairs
 
-    if len(out_file_list) > 1:
-        logger.info(f"TOTAL PAIRS MAPPED: {total_aligned_pairs}\n")
 
-    return out_file_list, contig_data, hit_data
+def get_read_name_key(name):
+    """Build a key to sort the read names in the natural order used by
+    `samtools sort -n` (strnum_cmp function of samtools).
+
+    The characters outside the digits runs are compared one by one and the
+    digits runs are compared as numbers, the run with the more leading zeros
+    coming first in case of equality. A digit run is encoded by the code of the
+    character "0" so that it compares to the other characters as the first
+    digit would.
+
+    Parameters
+    ----------
+    name : str
+        Name of the read.
+
+    Returns
+    -------
+    tuple of int:
+        Key of the read name. Two names are in the samtools order if and only
+        if their keys are in the same order.
+    """
+    key = []
+    for i, token in enumerate(DIGITS_REGEX.split(name)):
+        # Odd tokens are the digits runs.
+        if i % 2:
+            number = token.lstrip("0")
+            key.extend((48, len(number), int(token), len(number) - len(token)))
+        else:
+            key.extend(token.encode())
+    return tuple(key)
 
 
 def merge_alignment(forward_aligned, reverse_aligned, contig_data, out_file):
     """Merge forward and reverse alignment into one file with only pairs which
-    have both reads are aligned on the genome with 9 columns: ReadID, ContigA,
-    Position_startA, Position_endA, StrandA, ContigB, Position_startB,
-    Position_endB, StrandB.
+    have both reads are aligned on the genome with 7 columns: ReadID, ContigA,
+    Position_startA, ContigB, Position_startB, StrandA, StrandB.
+
+    The filtered reads are streamed from both name sorted alignments at the
+    same time, so that no intermediate file is written.
 
     Parameters
     ----------
-    forward_alignement : str
-        File with the table containing the data of the forward reads kept after
-        the alignment. With five columns: ReadID, Contig, Position_start,
-        Position_end, strand.
-    reverse_alignement : str
-        File with the table containing the data of the forward reads kept after
-        the alignment. With five columns: ReadID, Contig, Position_start,
-        Position_end, strand.
-    contig_data : dict
-        Dictionary of the all the contigs from the assembly, the contigs names
-        are the keys to the data of the contig available with the following
-        keys: "id", "length", "GC", "hit", "coverage". Coverage still at 0 and
-        need to be updated later.
+    forward_aligned : iterable
+        Filtered forward reads kept after the alignment as tuples: ReadID,
+        Contig, Position_start, strand. They have to be sorted by ReadID as
+        returned by process_bamfile.
+    reverse_aligned : iterable
+        Filtered reverse reads kept after the alignment as tuples: ReadID,
+        Contig, Position_start, strand. They have to be sorted by ReadID as
+        returned by process_bamfile.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
     out_file : str
         Path to write the output pairs file.
 
     Returns
     -------
-    str:
-        File with the table containing the alignement data of the pairs: ReadID,
-        ContigA, Position_startA, Position_endA, StrandA, ContigB,
-        Position_startB, Position_endB, StrandB
+    int:
+        Number of pairs written.
+    int:
+        Number of forward reads aligned.
+    int:
+        Number of reverse reads aligned.
     """
 
-    # Open files for reading and writing.
-    with open(forward_aligned, "r") as for_file, open(
-        reverse_aligned, "r"
-    ) as rev_file, open(out_file, "w") as merged:
-        for_bam = csv.reader(for_file, delimiter="\t")
-        rev_bam = csv.reader(rev_file, delimiter="\t")
+    for_reads = iter(forward_aligned)
+    rev_reads = iter(reverse_aligned)
+
+    with open(out_file, "w") as merged:
 
         # Initialization.
         n_pairs = 0
-        for_read = next(for_bam)
-        rev_read = next(rev_bam)
+        aligned_for = 0
+        aligned_rev = 0
+        for_read = next(for_reads, None)
+        rev_read = next(rev_reads, None)
+        for_key = None
+        rev_key = None
 
         # Write header of the pairs file.
         merged.write("## pairs format v1.0\n")
@@ -394,146 +1025,252 @@ def merge_alignment(forward_aligned, reverse_aligned, contig_data, out_file):
                 )
             )
 
-        # Loop while at least one end of one end is reached. It's possible to
-        # advance like that as the two tsv files are sorted on the id of the
-        # reads.
-        while n_pairs >= 0:
+        # Loop until the end of one of the alignments is reached. It's possible
+        # to advance like that as the two alignments are sorted on the id of
+        # the reads.
+        while for_read is not None and rev_read is not None:
             # Case of both reads of the pair map.
             if for_read[0] == rev_read[0]:
-                # Write read ID
-                merged.write(for_read[0] + "\t")
                 # Pairs are 1-based so we have to add 1 to 0 based bam position
-                for_position = (
-                    for_read[1] + "\t" + str(int(for_read[2]) + 1) + "\t"
-                )
-                rev_position = (
-                    rev_read[1] + "\t" + str(int(rev_read[2]) + 1) + "\t"
-                )
+                for_position = f"{for_read[1]}\t{for_read[2] + 1}\t"
+                rev_position = f"{rev_read[1]}\t{rev_read[2] + 1}\t"
 
                 # Have upper triangle shape
                 if (
-                    (
-                        for_read[1] == rev_read[1]
-                        and int(for_read[2]) <= int(rev_read[2])
-                    )
-                    or contig_data[for_read[1]]["id"]
-                    < contig_data[rev_read[1]]["id"]
+                    for_read[1] == rev_read[1] and for_read[2] <= rev_read[2]
+                ) or contig_data.get_id(for_read[1]) < contig_data.get_id(
+                    rev_read[1]
                 ):
-
                     merged.write(
-                        for_position
-                        + rev_position
-                        + for_read[3]
-                        + "\t"
-                        + rev_read[3]
-                        + "\n"
+                        f"{for_read[0]}\t{for_position}{rev_position}"
+                        f"{for_read[3]}\t{rev_read[3]}\n"
                     )
                 else:
                     merged.write(
-                        rev_position
-                        + for_position
-                        + rev_read[3]
-                        + "\t"
-                        + for_read[3]
-                        + "\n"
+                        f"{for_read[0]}\t{rev_position}{for_position}"
+                        f"{rev_read[3]}\t{for_read[3]}\n"
                     )
                 n_pairs += 1
-                try:
-                    for_read = next(for_bam)
-                except StopIteration:
-                    break
-                try:
-                    rev_read = next(rev_bam)
-                except StopIteration:
-                    break
-            # As the file is version sorted we have to do compare the two names
-            # according to the version order.
+                aligned_for += 1
+                aligned_rev += 1
+                for_read = next(for_reads, None)
+                rev_read = next(rev_reads, None)
+                for_key = None
+                rev_key = None
+            # As the files are sorted in the natural order we have to compare
+            # the two names according to this order. The key of a read is
+            # only computed once as long as it is not consumed.
             else:
-                names = [for_read[0], rev_read[0]]
-                names_sorted = sorted(names, key=LooseVersion)
+                if for_key is None:
+                    for_key = get_read_name_key(for_read[0])
+                if rev_key is None:
+                    rev_key = get_read_name_key(rev_read[0])
                 # Case of the forward read mapped but not the reverse. Indeed,
-                # no line would have been added previously if the read didn't
-                # map.
-                if names == names_sorted:
-                    try:
-                        for_read = next(for_bam)
-                    except StopIteration:
-                        break
+                # no read would have been yielded if the read didn't map.
+                if for_key <= rev_key:
+                    aligned_for += 1
+                    for_read = next(for_reads, None)
+                    for_key = None
                 # Same but with no mapped forward reads.
                 else:
-                    try:
-                        rev_read = next(rev_bam)
-                    except StopIteration:
-                        break
+                    aligned_rev += 1
+                    rev_read = next(rev_reads, None)
+                    rev_key = None
 
-    return n_pairs
+    # Count the remaining reads of the longest alignment.
+    if for_read is not None:
+        aligned_for += 1 + sum(1 for _ in for_reads)
+    if rev_read is not None:
+        aligned_rev += 1 + sum(1 for _ in rev_reads)
 
+    return n_pairs, aligned_for, aligned_rev
 
-def process_bamfile(alignment, min_qual, filtered_out):
-    """Filter alignment BAM files
 
-    Reads all the reads in the input BAM alignment file. Keep reads in the
-    output if they are aligned with a good quality (greater than min quality
-    threshold given) saving their only some columns: ReadID, Contig,
-    Position_start, Position_end, strand to save memory.
+def merge_ordered_alignment(
+    for_alignment, rev_alignment, min_qual, contig_data, out_file
+):
+    """Merge forward and reverse alignment with one record per read in the
+    same order into one file with only pairs which have both reads aligned on
+    the genome with 7 columns: ReadID, ContigA, Position_startA, ContigB,
+    Position_startB, StrandA, StrandB.
+
+    Contrary to merge_alignment, the reads do not have to be sorted by name,
+    but the mates have to be at the same position in both alignments, as
+    in the unsorted output of bowtie2 with the unaligned reads.
 
     Parameters
     ----------
-    alignment : str
-        Path to the input temporary alignment.
+    for_alignment : iterable of pysam.AlignedSegment
+        Forward alignment.
+    rev_alignment : iterable of pysam.AlignedSegment
+        Reverse alignment.
     min_qual : int
         Minimum mapping quality required to keep a Hi-C pair.
-    filtered_out : str
-        Path to the output temporary tsv alignement.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
+    out_file : str
+        Path to write the output pairs file.
 
     Returns
     -------
     int:
-        Number of reads aligned.
+        Number of pairs written.
+    int:
+        Number of forward reads aligned.
+    int:
+        Number of reverse reads aligned.
+    """
+
+    # Strand of the kept reads (0 or 16 flags are kept only).
+    strands = {0: "+", 16: "-"}
+    n_pairs = 0
+    aligned_for = 0
+    aligned_rev = 0
+    with open(out_file, "w") as merged:
+
+        # Write header of the pairs file.
+        merged.write("## pairs format v1.0\n")
+        merged.write("#columns: readID chr1 pos1 chr2 pos2 strand1 strand2\n")
+        merged.write("#shape: upper triangle\n")
+        for contig in contig_data:
+            merged.write(
+                "#chromsize: {0} {1}\n".format(
+                    contig, contig_data[contig]["length"]
+                )
+            )
+
+        for for_read, rev_read in zip(for_alignment, rev_alignment):
+            # Safety check (forward and reverse are the same reads)
+            if for_read.query_name != rev_read.query_name:
+                logger.error(
+                    f"Reads should be paired - {for_read.query_name}\t{rev_read.query_name}"
+                )
+                raise ValueError
+
+            # Check mapping quality and flag.
+            for_ok = (
+                for_read.mapping_quality >= min_qual
+                and for_read.flag in strands
+            )
+            rev_ok = (
+                rev_read.mapping_quality >= min_qual
+                and rev_read.flag in strands
+            )
+            aligned_for += for_ok
+            aligned_rev += rev_ok
+            if not (for_ok and rev_ok):
+                continue
+
+            # Pairs are 1-based so we have to add 1 to 0 based bam position
+            contig1 = for_read.reference_name
+            contig2 = rev_read.reference_name
+            pos1 = for_read.reference_start
+            pos2 = rev_read.reference_start
+            for_position = f"{contig1}\t{pos1 + 1}\t"
+            rev_position = f"{contig2}\t{pos2 + 1}\t"
+
+            # Have upper triangle shape
+            if (contig1 == contig2 and pos1 <= pos2) or contig_data.get_id(
+                contig1
+            ) < contig_data.get_id(contig2):
+                merged.write(
+                    f"{for_read.query_name}\t{for_position}{rev_position}"
+                    f"{strands[for_read.flag]}\t{strands[rev_read.flag]}\n"
+                )
+            else:
+                merged.write(
+                    f"{for_read.query_name}\t{rev_position}{for_position}"
+                    f"{strands[rev_read.flag]}\t{strands[for_read.flag]}\n"
+                )
+            n_pairs += 1
+
+    return n_pairs, aligned_for, aligned_rev
+
+
+def process_bamfile(alignment, min_qual, threads=1):
+    """Filter alignment BAM files
+
+    Reads all the reads in the input BAM alignment file. Yield reads if they
+    are aligned with a good quality (greater than min quality threshold given)
+    saving their only some columns: ReadID, Contig, Position_start, strand to
+    save memory.
+
+    Parameters
+    ----------
+    alignment : str
+        Path to the input temporary alignment.
+    min_qual : int
+        Minimum mapping quality required to keep a Hi-C pair.
+    threads : int
+        Number of threads used to decompress the BAM file. [Default: 1]
+
+    Yields
+    ------
+    tuple:
+        ReadID, Contig, Position_start (0-based), strand of each aligned read.
     """
 
     # Check the quality and status of each aligned fragment.
-    aligned_reads = 0
     save = pysam.set_verbosity(0)
-    temp_bam = pysam.AlignmentFile(alignment, "rb", check_sq=False)
+    temp_bam = pysam.AlignmentFile(
+        alignment, "rb", check_sq=False, threads=threads
+    )
     pysam.set_verbosity(save)
-    with open(filtered_out, "w") as f:
+    with temp_bam:
         for r in temp_bam:
             # Check mapping quality
             if r.mapping_quality >= min_qual:
                 # Check Mapping (0 or 16 flags are kept only)
                 if r.flag == 0:
-                    aligned_reads += 1
-                    read = str(
-                        r.query_name
-                        + "\t"
-                        + r.reference_name
-                        + "\t"
-                        + str(r.reference_start)
-                        + "\t"
-                        + "+"
-                        + "\n"
+                    yield (
+                        r.query_name,
+                        r.reference_name,
+                        r.reference_start,
+                        "+",
                     )
-                    f.write(read)
                 elif r.flag == 16:
-                    aligned_reads += 1
-                    read = str(
-                        r.query_name
-                        + "\t"
-                        + r.reference_name
-                        + "\t"
-                        + str(r.reference_start)
-                        + "\t"
-                        + "-"
-                        + "\n"
+                    yield (
+                        r.query_name,
+                        r.reference_name,
+                        r.reference_start,
+                        "-",
                     )
-                    f.write(read)
-    temp_bam.close()
 
-    return aligned_reads
 
+def process_bamfile_worker(alignment, min_qual, threads, queue, chunk_size):
+    """Worker filtering a BAM file in its own process and sending the aligned
+    reads to the main process through a queue.
 
-def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
+    Parameters
+    ----------
+    alignment : str
+        Path to the input temporary alignment.
+    min_qual : int
+        Minimum mapping quality required to keep a Hi-C pair.
+    threads : int
+        Number of threads used to decompress the BAM file.
+    queue : multiprocessing.Queue
+        Queue where the lists of filtered reads are put. The end of the file is
+        signaled by None, preceded by the exception if one was raised.
+    chunk_size : int
+        Number of reads sent at once.
+    """
+    try:
+        chunk = []
+        for read in process_bamfile(alignment, min_qual, threads):
+            chunk.append(read)
+            if len(chunk) == chunk_size:
+                queue.put(chunk)
+                chunk = []
+        queue.put(chunk)
+    except Exception as error:
+        queue.put(error)
+    queue.put(None)
+
+
+def process_bwa_bamfile(
+    alignment, min_qual, contig_data, out_file, threads=1
+):
     """Filter alignment BAM files
 
     Reads all the reads in the input BAM alignment file. Keep reads in the
@@ -543,17 +1280,16 @@ def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
 
     Parameters
     ----------
-    alignment : str
-        Path to the input temporary alignment.
+    alignment : str or pysam.AlignmentFile
+        Path to the input temporary alignment or alignment already opened.
     min_qual : int
         Minimum mapping quality required to keep a Hi-C pair.
-    contig_data : dict
-        Dictionnary of the all the contigs from the assembly, the contigs names
-        are the keys to the data of the contig available with the following
-        keys: "id", "length", "GC", "hit", "coverage". Coverage still at 0 and
-        need to be updated later.
+    contig_data : metator.network.ContigTable
+        Table of the all the contigs from the assembly.
     out_file : str
         Path to the output pairs file.
+    threads : int
+        Number of threads used to decompress the BAM file. [Default: 1]
 
     Returns
     -------
@@ -563,16 +1299,24 @@ def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
 
     # Read the bam file.
     n_pairs = 0
-    save = pysam.set_verbosity(0)
-    temp_bam = pysam.AlignmentFile(alignment, "rb", check_sq=False)
-    pysam.set_verbosity(save)
+    # An alignment opened on the output of the aligner is not sorted by name.
+    is_sorted = not isinstance(alignment, pysam.AlignmentFile)
+    if not is_sorted:
+        temp_bam = alignment
+    else:
+        save = pysam.set_verbosity(0)
+        temp_bam = pysam.AlignmentFile(
+            alignment, "rb", check_sq=False, threads=threads
+        )
+        pysam.set_verbosity(save)
 
     with open(out_file, "w") as merged:
 
         # Write header of the pairs file.
         merged.write("## pairs format v1.0\n")
         merged.write("#columns: readID chr1 pos1 chr2 pos2 strand1 strand2\n")
-        merged.write("#sorted: readID\n")
+        if is_sorted:
+            merged.write("#sorted: readID\n")
         merged.write("#shape: upper triangle\n")
         for contig in contig_data:
             merged.write(
@@ -614,7 +1358,7 @@ def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
                         contig1 = for_read.reference_name
                         contig2 = rev_read.reference_name
                         pos1 = for_read.pos + 1
-                        pos2 = for_read.pos + 1
+                        pos2 = rev_read.pos + 1
                         strand1 = "+"
                         strand2 = "+"
                         if for_read.is_reverse:
@@ -624,9 +1368,11 @@ def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
 
                         # Modify order to have an upper triangle and write
                         # the pair.
-                        if (contig1 == contig2 and pos1 <= pos2) or contig_data[
-                            contig1
-                        ]["id"] < contig_data[contig2]["id"]:
+                        if (
+                            contig1 == contig2 and pos1 <= pos2
+                        ) or contig_data.get_id(contig1) < contig_data.get_id(
+                            contig2
+                        ):
                             merged.write(
                                 "\t".join(
                                     [
@@ -664,3 +1410,44 @@ def process_bwa_bamfile(alignment, min_qual, contig_data, out_file):
     # Close the bam file and return number of pairs
     temp_bam.close()
     return n_pairs
+
+
+def stream_bamfile(alignment, min_qual, threads=1, chunk_size=100_000):
+    """Filter an alignment BAM file in a separate process and yield its aligned
+    reads, so that the forward and reverse alignments are filtered at the same
+    time while they are merged.
+
+    Parameters
+    ----------
+    alignment : str
+        Path to the input temporary alignment.
+    min_qual : int
+        Minimum mapping quality required to keep a Hi-C pair.
+    threads : int
+        Number of threads used to decompress the BAM file. [Default: 1]
+    chunk_size : int
+        Number of reads sent at once by the worker process. [Default: 100000]
+
+    Yields
+    ------
+    tuple:
+        ReadID, Contig, Position_start (0-based), strand of each aligned read.
+    """
+    # Bound the queue to keep the memory usage low if the merge is slower.
+    queue = multiprocessing.Queue(maxsize=8)
+    process = multiprocessing.Process(
+        target=process_bamfile_worker,
+        args=(alignment, min_qual, threads, queue, chunk_size),
+        daemon=True,
+    )
+    process.start()
+    try:
+        for chunk in iter(queue.get, None):
+            if isinstance(chunk, Exception):
+                logger.error(f"Filtering of {alignment} failed.")
+                raise chunk
+            yield from chunk
+        process.join()
+    finally:
+        if process.is_alive():
+            process.terminate()
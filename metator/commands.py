@@ -48,7 +48,7 @@ from docopt import docopt
 from functools import partial
 from metator.log import logger
 from metator.version import __version__
-from os.path import exists, dirname, join
+from os.path import exists, dirname, join, splitext
 from scipy.sparse import save_npz, load_npz
 
 
@@ -95,14 +95,18 @@ class Network(AbstractCommand):
 
     Note: the network is in a strict barebone form so that it can be reused and
     imported quickly into other applications etc. Verbose information about
-    every single node in the network is written on a 'contig data' file.
+    every single node in the network is written on a 'contig data' file. A
+    binary version of the network (network.npz) is written too, it's much
+    quicker to load in the next steps.
 
     usage:
         network --forward=STR --assembly=FILE [--reverse=STR]
-        [--aligner=bowtie2] [--aligner-mode=normal] [--depth=FILE] [--edge=0]
-        [--enzyme=STR] [--normalization=empirical_hit] [--no-clean-up]
-        [--outdir=DIR] [--min-quality=30] [--self-contacts] [--start=fastq]
-        [--threads=1] [--tmpdir=DIR]
+        [--aligner=bowtie2] [--aligner-mode=normal] [--cache-stats]
+        [--compact-pairs] [--dedup] [--depth=FILE] [--edge=0] [--enzyme=STR]
+        [--normalization=empirical_hit]
+        [--no-bam] [--no-clean-up] [--outdir=DIR] [--min-quality=30]
+        [--self-contacts] [--start=fastq] [--threads=1] [--tmpdir=DIR]
+        [--update=DIR]
 
     options:
         -1, --forward=STR       Fastq file or list of Fastq separated by a comma
@@ -121,6 +125,17 @@ class Network(AbstractCommand):
                                 "bowtie2". [Default: bowtie2]
         -B, --aligner-mode=STR  Mode of alignment from hicstuff. Either normal,
                                 iterative or cutsite. [Default: normal]
+        --cache-stats           If enabled, the contigs statistics are cached
+                                in <assembly>.metator_stats.npz next to the
+                                assembly and reused by the next runs on the
+                                same assembly and enzymes.
+        -c, --compact-pairs     If enabled, the pairs are written in a compact
+                                binary format (alignment_<i>.pairs.npz) without
+                                the read names instead of the text pairs
+                                format.
+        -D, --dedup             If enabled, remove the duplicated pairs (same
+                                contigs, positions and strands) such as PCR
+                                duplicates. Not used with the pair start.
         -d, --depth=FILE        The depth.txt file from the shotgun reads used
                                 to made the assembly computed by
                                 jgi_summarize_bam_contig_depths from metabat2
@@ -131,12 +146,20 @@ class Network(AbstractCommand):
         -e, --enzyme=STR        The list of restriction enzyme used to digest
                                 the contigs separated by a comma. Example:
                                 HpaII,MluCI.
+        -k, --no-bam            If enabled, the pairs are built on the fly from
+                                the output of the aligner and no bam files are
+                                written. Only used with the fastq start. Not
+                                available with the iterative mode.
         -n, --normalization=STR If None, do not normalized the count of a
                                 contact by the geometric mean of the coverage of
                                 the contigs. Otherwise it's the type of
                                 normalization. 6 values are possible "None",
                                 "abundance", "length", "RS", "empirical_hit",
-                                "theoritical_hit". [Default: empirical_hit]
+                                "theoritical_hit". Several normalizations could
+                                be given separated by a comma, the first one is
+                                used for the network file and the others are
+                                written in network_<normalization>.txt files.
+                                [Default: empirical_hit]
         -N, --no-clean-up       Do not remove temporary files.
         -o, --outdir=DIR        The output directory to write the bam files the
                                 network and contig data into. Default: current
@@ -148,9 +171,16 @@ class Network(AbstractCommand):
         -S, --start=STR         Start stage of the pipeline. Either "fastq",
                                 "bam", or "pair". [Default: fastq]
         -t, --threads=INT       Number of parallel threads allocated for the
-                                alignement. [Default: 1]
+                                alignement, the contigs statistics and the
+                                reading of the pairs. [Default: 1]
         -T, --tmpdir=DIR       Temporary directory. Default to current
                                 directory. [Default: ./tmp]
+        -u, --update=DIR        Output directory of a previous network run on
+                                the same assembly. The contacts of the new
+                                libraries are added to its raw network and hits
+                                and the network is normalized again. The new
+                                sample networks are numbered after the previous
+                                ones.
     """
 
     def execute(self):
@@ -229,29 +259,24 @@ class Network(AbstractCommand):
             "empirical_hit",
             "theoritical_hit",
         ]
-        if self.args["--normalization"] not in list_normalization:
-            logger.error(
-                'Normalization should be among this list: "None", "abundance", "length", "RS", "empirical_hit", "theoritical_hit"'
-            )
-            raise ValueError
         enzyme_required = ["RS", "theoritical_hit"]
-        if (
-            self.args["--normalization"] in enzyme_required
-            and not self.args["--enzyme"]
-        ):
-            logger.error(
-                'For "RS" and "theoritical_hit" normalization, enzyme is required.'
-            )
-            raise ValueError
         depth_required = ["abundance", "theoritical_hit"]
-        if (
-            self.args["--normalization"] in depth_required
-            and not self.args["--depth"]
-        ):
-            logger.error(
-                'For "abundance" and "theoritical_hit" normalization, depth is required.'
-            )
-            raise ValueError
+        for normalization in self.args["--normalization"].split(","):
+            if normalization not in list_normalization:
+                logger.error(
+                    'Normalization should be among this list: "None", "abundance", "length", "RS", "empirical_hit", "theoritical_hit"'
+                )
+                raise ValueError
+            if normalization in enzyme_required and not self.args["--enzyme"]:
+                logger.error(
+                    'For "RS" and "theoritical_hit" normalization, enzyme is required.'
+                )
+                raise ValueError
+            if normalization in depth_required and not self.args["--depth"]:
+                logger.error(
+                    'For "abundance" and "theoritical_hit" normalization, depth is required.'
+                )
+                raise ValueError
         if self.args["--start"] not in ["fastq", "bam", "pair", "network"]:
             logger.error(
                 "Start argument should be 'fastq', 'bam', 'pair' or 'network'."
@@ -294,6 +319,8 @@ class Network(AbstractCommand):
                 nb_alignment,
                 self.args["--depth"],
                 self.args["--enzyme"],
+                self.args["--threads"],
+                self.args["--cache-stats"],
             )
 
         else:
@@ -312,6 +339,10 @@ class Network(AbstractCommand):
                 self.args["--outdir"],
                 tmp_dir,
                 self.args["--threads"],
+                self.args["--no-bam"],
+                self.args["--compact-pairs"],
+                self.args["--dedup"],
+                self.args["--cache-stats"],
             )
 
         # Build the network
@@ -327,6 +358,8 @@ class Network(AbstractCommand):
             self.args["--threads"],
             self.args["--normalization"],
             self_contacts,
+            previous_dir=self.args["--update"],
+            min_quality=None if self.args["--start"] == "pair" else min_qual,
         )
 
         # Delete the temporary folder
@@ -368,7 +401,10 @@ class Partition(AbstractCommand):
         -a, --assembly=FILE     The path to the assembly fasta file used to do
                                 the alignment.
         -A, --algorithm=STR     Either "louvain" or "leiden", algorithm to use
-                                to partition the network. [Default: louvain]
+                                to partition the network. The "louvain_igraph"
+                                and "leiden_igraph" values run them in process
+                                with igraph instead of the external
+                                implementations. [Default: louvain]
         -c, --contigs=FILE      The path to the tsv file containing the data of
                                 the contigs (ID, Name, Length, GC content, Hit,
                                 Coverage, Restriction Site).
@@ -378,7 +414,8 @@ class Partition(AbstractCommand):
         -i, --iterations=INT    Number of iterations of Louvain. [Default: 100]
         -n, --network=FILE      Path to the file containing the network
                                 information from the meta HiC experiment compute
-                                in network function previously.
+                                in network function previously. Either the
+                                edge list or its binary npz version.
         -N, --no-clean-up       Do not remove temporary files.
         -o, --outdir=DIR        Path to the directory to write the output.
                                 Default to current directory. [Default: ./]
@@ -436,8 +473,15 @@ class Partition(AbstractCommand):
         resolution_parameter = float(self.args["--res-param"])
 
         # Check correct algorithm value
-        if self.args["--algorithm"] not in ["louvain", "leiden"]:
-            logger.error('algorithm should be either "louvain" or "leiden"')
+        if self.args["--algorithm"] not in [
+            "louvain",
+            "leiden",
+            "louvain_igraph",
+            "leiden_igraph",
+        ]:
+            logger.error(
+                'algorithm should be either "louvain", "leiden", "louvain_igraph" or "leiden_igraph"'
+            )
             raise ValueError
 
         # Create prefix.
@@ -495,7 +539,9 @@ class Validation(AbstractCommand):
         -a, --assembly=FILE     The path to the assembly fasta file used to do
                                 the alignment.
         -A, --algorithm=STR     Algorithm to use. Either "louvain", "leiden" or
-                                "spinglass". [Default: louvain]
+                                "spinglass". The "louvain_igraph" and
+                                "leiden_igraph" values run Louvain or Leiden in
+                                process with igraph. [Default: louvain]
         -c, --contigs=FILE      The path to the file containing the data of the
                                 contigs from the partition step (13 columns).
         -C, --cluster-matrix    If enabled, save the clustering matrix.
@@ -507,7 +553,8 @@ class Validation(AbstractCommand):
                                 [Default: 10]
         -n, --network=FILE      Path to the file containing the network
                                 information from the meta HiC experiment compute
-                                in network function previously.
+                                in network function previously. Either the
+                                edge list or its binary npz version.
         -N, --no-clean-up       Do not remove temporary files.
         -o, --outdir=DIR        Path to the directory to write the output.
                                 Default to current directory. [Default: ./]
@@ -584,9 +631,15 @@ class Validation(AbstractCommand):
         resolution_parameter = float(self.args["--res-param"])
 
         # Check correct algorithm value
-        if self.args["--algorithm"] not in ["louvain", "leiden", "spinglass"]:
+        if self.args["--algorithm"] not in [
+            "louvain",
+            "leiden",
+            "louvain_igraph",
+            "leiden_igraph",
+            "spinglass",
+        ]:
             logger.error(
-                'algorithm should be either "louvain", "leiden" or "spinglass.'
+                'algorithm should be either "louvain", "leiden", "louvain_igraph", "leiden_igraph" or "spinglass".'
             )
             raise ValueError
 
@@ -637,12 +690,13 @@ class Pipeline(AbstractCommand):
     usage:
         pipeline --assembly=FILE [--forward=STR] [--reverse=STR]
         [--algorithm=louvain] [--aligner=bowtie2] [--aligner-mode=normal]
-        [--cluster-matrix] [--depth=FILE] [--edge=0] [--enzyme=STR] [--force]
-        [--iterations=100] [--rec-iter=10] [--junctions=NNNNN] [--no-clean-up]
-        [--normalization=empirical_hit] [--outdir=DIR] [--overlap=80]
-        [--prefix=STR] [--rec-overlap=90]  [--min-quality=30] [--res-param=1.0]
-        [--size=500000] [--start=fastq] [--scaffold] [--threads=1]
-        [--tmpdir=DIR]
+        [--cache-stats] [--cluster-matrix] [--compact-pairs] [--dedup]
+        [--depth=FILE] [--edge=0] [--enzyme=STR] [--force] [--iterations=100]
+        [--rec-iter=10] [--junctions=NNNNN] [--no-bam] [--no-clean-up]
+        [--normalization=empirical_hit] [--outdir=DIR]
+        [--overlap=80] [--prefix=STR] [--rec-overlap=90]  [--min-quality=30]
+        [--res-param=1.0] [--size=500000] [--start=fastq] [--scaffold]
+        [--threads=1] [--tmpdir=DIR]
 
     options:
         -1, --forward=STR       Fastq file or list of Fastq separated by a comma
@@ -659,13 +713,26 @@ class Pipeline(AbstractCommand):
                                 basename of the bowtie2 index.
         -A, --algorithm=STR     Algorithm to use. Either "louvain", "leiden" or
                                 "spinglass". If spinglass is chosen, the first
-                                partition will be done using louvain
+                                partition will be done using louvain. The
+                                "louvain_igraph" and "leiden_igraph" values run
+                                Louvain or Leiden in process with igraph.
                                 [Default: louvain]
         -b, --aligner=STR       Aligner algorithm to use. Either "bwa" or
                                 "bowtie2". [Default: bowtie2]
         -B, --aligner-mode=STR  Mode of alignment from hicstuff. Either normal,
                                 iterative or cutsite. [Default: normal]
+        --cache-stats           If enabled, the contigs statistics are cached
+                                in <assembly>.metator_stats.npz next to the
+                                assembly and reused by the next runs on the
+                                same assembly and enzymes.
+        -c, --compact-pairs     If enabled, the pairs are written in a compact
+                                binary format (alignment_<i>.pairs.npz) without
+                                the read names instead of the text pairs
+                                format. Not available with the scaffold option.
         -C, --cluster-matrix    If enabled, save the clustering matrix.
+        -D, --dedup             If enabled, remove the duplicated pairs (same
+                                contigs, positions and strands) such as PCR
+                                duplicates. Not used with the pair start.
         -d, --depth=FILE        The depth.txt file from the shotgun reads used
                                 to made the assembly computed by
                                 jgi_summarize_bam_contig_depths from metabat2
@@ -684,13 +751,19 @@ class Pipeline(AbstractCommand):
                                 recursive step. [Default: 10]
         -J, --junctions=STR     Sequences to use as junction between contigs.
                                 [Default: NNNNN]
+        -k, --no-bam            If enabled, the pairs are built on the fly from
+                                the output of the aligner and no bam files are
+                                written. Only used with the fastq start. Not
+                                available with the iterative mode.
         -N, --no-clean-up       Do not remove temporary files.
         -m, --normalization=STR If None, do not normalized the count of a
                                 contact by the geometric mean of the coverage of
                                 the contigs. Otherwise it's the type of
                                 normalization. 6 values are possible None,
                                 abundance, length, RS, empirical_hit,
-                                theoritical_hit. [Default: empirical_hit]
+                                theoritical_hit. Several normalizations could
+                                be given separated by a comma, the first one is
+                                used for the partition. [Default: empirical_hit]
         -o, --outdir=DIR        The output directory to write the bam files the
                                 network and contig data into. Default: current
                                 directory.
@@ -786,9 +859,22 @@ class Pipeline(AbstractCommand):
             self.args["--aligner-mode"] = "iterative"
 
         # Check correct algorithm value.
-        if self.args["--algorithm"] not in ["louvain", "leiden", "spinglass"]:
+        if self.args["--algorithm"] not in [
+            "louvain",
+            "leiden",
+            "louvain_igraph",
+            "leiden_igraph",
+            "spinglass",
+        ]:
+            logger.error(
+                'algorithm should be either "louvain", "leiden", "louvain_igraph", "leiden_igraph" or "spinglass".'
+            )
+            raise ValueError
+
+        # The scaffolder needs the sorted and indexed pairs files.
+        if self.args["--compact-pairs"] and self.args["--scaffold"]:
             logger.error(
-                'algorithm should be either "louvain", "leiden" or "spinglass.'
+                "The compact pairs format is not available with the scaffold option."
             )
             raise ValueError
 
@@ -801,29 +887,24 @@ class Pipeline(AbstractCommand):
             "empirical_hit",
             "theoritical_hit",
         ]
-        if self.args["--normalization"] not in list_normalization:
-            logger.error(
-                'Normalization should be among this list: "None", "abundance", "length", "RS", "empirical_hit", "theoritical_hit"'
-            )
-            raise ValueError
         enzyme_required = ["RS", "theoritical_hit"]
-        if (
-            self.args["--normalization"] in enzyme_required
-            and not self.args["--enzyme"]
-        ):
-            logger.error(
-                'For "RS" and "theoritical_hit" normalization, enzyme is required.'
-            )
-            raise ValueError
         depth_required = ["abundance", "theoritical_hit"]
-        if (
-            self.args["--normalization"] in depth_required
-            and not self.args["--depth"]
-        ):
-            logger.error(
-                'For "abundance" and "theoritical_hit" normalization, depth is required.'
-            )
-            raise ValueError
+        for normalization in self.args["--normalization"].split(","):
+            if normalization not in list_normalization:
+                logger.error(
+                    'Normalization should be among this list: "None", "abundance", "length", "RS", "empirical_hit", "theoritical_hit"'
+                )
+                raise ValueError
+            if normalization in enzyme_required and not self.args["--enzyme"]:
+                logger.error(
+                    'For "RS" and "theoritical_hit" normalization, enzyme is required.'
+                )
+                raise ValueError
+            if normalization in depth_required and not self.args["--depth"]:
+                logger.error(
+                    'For "abundance" and "theoritical_hit" normalization, depth is required.'
+                )
+                raise ValueError
 
         # Sanity check for validation
         recursive_fasta_dir = join(self.args["--outdir"], "recursive_bin")
@@ -953,6 +1034,10 @@ class Pipeline(AbstractCommand):
                 self.args["--outdir"],
                 tmp_dir,
                 self.args["--threads"],
+                self.args["--no-bam"],
+                self.args["--compact-pairs"],
+                self.args["--dedup"],
+                self.args["--cache-stats"],
             )
         else:
             alignment_files = self.args["--forward"].split(",")
@@ -962,6 +1047,8 @@ class Pipeline(AbstractCommand):
                 nb_alignment,
                 self.args["--depth"],
                 self.args["--enzyme"],
+                self.args["--threads"],
+                self.args["--cache-stats"],
             )
         # Build the network
         network_file, contigs_data_file = mtn.alignment_to_contacts(
@@ -1012,7 +1099,7 @@ class Pipeline(AbstractCommand):
             final_fasta_dir,
             overlapping_fasta_dir,
             recursive_iterations,
-            network_file,
+            splitext(network_file)[0] + ".npz",
             self.args["--outdir"],
             recursive_overlapping_parameter,
             recursive_fasta_dir,
@@ -1371,16 +1458,21 @@ class Scaffold(AbstractCommand):
 class Pairs(AbstractCommand):
     """Sort and pairs files for faster assess to the data.
 
-    Sort the pairs file using pairtools. Compress them using bgzip. Index them
-    using pairix.
+    Sort the pairs file by chromosomes and positions. Compress them using
+    bgzip. Index them using pairix.
 
     usage:
-        pairs [--force] [--remove] [--threads=1] <pairsfile>...
+        pairs [--buffer=2G] [--dedup] [--force] [--remove] [--threads=1]
+        <pairsfile>...
 
     arguments:
         pairsfile           File(s) containing pairs information.
 
     options:
+        -b, --buffer=STR    Memory budget used to sort the pairs. Consists of a
+                            number and a unit (K, M or G). [Default: 2G]
+        -D, --dedup         If enabled, remove the duplicated pairs (same
+                            contigs, positions and strands).
         -F, --force         Write files even if the output files already exists.
         -r, --remove        Remove the input file at the end to keep only the
                             sorted, compressed and indexed pairs file.
@@ -1404,6 +1496,8 @@ class Pairs(AbstractCommand):
                 threads=int(self.args["--threads"]),
                 remove=self.args["--remove"],
                 force=self.args["--force"],
+                buffer=self.args["--buffer"],
+                dedup=self.args["--dedup"],
             )
 
         generate_log_footer(log_file)
@@ -1425,7 +1519,7 @@ class Host(AbstractCommand):
         -b, --binning=FILE      Path to the anvio binning file.
         -c, --contig-data=FILE  Path to the MetaTOR contig data file.
         -m, --mges=FILE       Path to the file with mges contigs list.
-        -n, --network=FILE      Path to the network file.
+        -n, --network=FILE      Path to the network file (edge list or npz).
         -o, --outfile=FILE      Path where to write the output file.
         -t, --threshold=FLOAT   Threshold to consider an association with a MAG.
                                 [Default: 0.1]
@@ -1500,7 +1594,7 @@ class Mge(AbstractCommand):
         -m, --mges=FILE         Path to the file with mges contigs list.
         -M, --method=STR        Method for the binning. Either 'metabat' or
                                 'pairs' [Default: pairs].
-        -n, --network=FILE      Path to the network file.
+        -n, --network=FILE      Path to the network file (edge list or npz).
         -N, --no-clean-up       If enabled, remove the temporary files.
         -o, --outdir=DIR        Path to the output directory where the output
                                 will be written. Default current directory.
@@ -26,6 +26,7 @@ Core functions to plot the firgures are:
 
 import hicstuff.hicstuff as hcs
 import matplotlib.pyplot as plt
+import metator.io as mio
 import numpy as np
 import os
 import pandas as pd
@@ -134,7 +135,8 @@ def build_matrix_network(pairs_files, info_contigs, N, bin_size):
     Parameters:
     -----------
     pairs_files : list of str
-        List of path of the alignment ".pairs" file.
+        List of path of the alignment ".pairs" file or of their compact
+        ".pairs.npz" version.
     info_contigs: dict
         Dictionnary with frags id of the contigs.
     N : int
@@ -152,6 +154,37 @@ def build_matrix_network(pairs_files, info_contigs, N, bin_size):
 
     # Iterates on the input pairs file
     for pairs_file in pairs_files:
+        # Compact pairs files are read by chunks of contigs ids.
+        if pairs_file.endswith(".npz"):
+            for chunk in mio.read_pairs(pairs_file):
+                frags = []
+                for chrom, pos in [("chr1", "pos1"), ("chr2", "pos2")]:
+                    info = [
+                        info_contigs.get(contig, {"start": -1, "init": 0})
+                        for contig in chunk[chrom].cat.categories
+                    ]
+                    start = np.array([x["start"] for x in info])
+                    init = np.array([x["init"] for x in info])
+                    codes = chunk[chrom].cat.codes.values
+                    frags.append(
+                        np.where(
+                            start[codes] >= 0,
+                            start[codes]
+                            + (chunk[pos].values + init[codes]) // bin_size,
+                            -1,
+                        )
+                    )
+                frag1, frag2 = frags
+                mask = (frag1 >= 0) & (frag2 >= 0) & (frag1 != frag2)
+                np.add.at(
+                    matrix,
+                    (
+                        np.minimum(frag1, frag2)[mask],
+                        np.maximum(frag1, frag2)[mask],
+                    ),
+                    1,
+                )
+            continue
         with open(pairs_file, "r") as input_pairs:
             for pairs_line in input_pairs:
                 # Ignore header lines.
@@ -880,7 +913,7 @@ def plot_figures(out_dir, contigs_data, bin_summary, threshold):
     pairs_files = []
     list_files = os.listdir(out_dir)
     for file in list_files:
-        if re.search("\.pairs$", file):
+        if re.search("\.pairs(\.npz)?$", file):
             pairs_files.append(join(out_dir, file))
 
     # Plot heatmap with a binning of 50kb.
@@ -9,37 +9,61 @@ This mdoule contains all core I/O functions:
     - check_is_fasta
     - check_louvain_cpp
     - check_pairix
-    - check_pairtools
+    - compare_versions
     - generate_fasta_index
     - generate_temp_dir
+    - get_assembly_key
+    - get_fasta_ranges
+    - get_natural_key
     - get_pairs_data
+    - get_pairs_ranges
     - get_restriction_site
     - import_anvio_binning
     - import_contig_data_mges
     - import_network
     - import_mges_contigs
+    - pairs_to_npz
     - process_ligation_sites
     - read_bin_summary
     - read_compressed
     - read_contig_data
+    - read_contigs_stats_cache
+    - read_fasta_range
+    - read_network
+    - read_pairs
+    - read_pairs_npz
+    - read_pairs_range
     - read_results_checkm
     - retrieve_fasta
     - sort_pairs
+    - sort_pairs_chunk
+    - sort_pairs_file
     - sort_pairs_pairtools
+    - split_fastq
     - write_bin_summary
+    - write_contigs_stats_cache
     - write_mge_data
+    - write_network_npz
+    - write_network_txt
+    - write_pairs_npz
 """
 
 import bz2
+import concurrent.futures as cf
+import functools
 import gzip
+import hashlib
 import io
+import itertools
 import networkx as nx
 import numpy as np
 import os
 import pandas as pd
 import pathlib
 import pypairix
+import pysam
 import re
+import shutil
 import subprocess as sp
 import zipfile
 from Bio import SeqIO
@@ -47,6 +71,7 @@ from Bio.Restriction import RestrictionBatch
 from metator.log import logger
 from os.path import join, exists, isfile
 from random import getrandbits
+from scipy import sparse
 
 
 def check_checkm():
@@ -207,24 +232,119 @@ def check_pairix():
     return True
 
 
-def check_pairtools():
-    """
-    Function to test if pairtools is in the path.
+def compare_versions(text1, text2):
+    """Compare two strings in the version order of GNU sort -V (filevercmp
+    from gnulib). The non-digit parts are compared character by character with
+    "~" first, then the end of the part, the letters and the other characters.
+    The digit parts are compared as integers, without their leading zeros. The
+    file suffixes (".fa", ".tar.gz") are only compared if the rest of the
+    strings is equal. Strings starting with a dot are sorted first.
+
+    Parameters:
+    -----------
+    text1 : str
+        First string to compare.
+    text2 : str
+        Second string to compare.
 
     Returns:
     --------
-    bool:
-        True if pairtools found in the path, False otherwise.
+    int:
+        Negative if text1 is before text2, positive if it is after, 0 if they
+        are equal in the version order.
     """
-    try:
-        pairix = sp.check_output("pairtools", stderr=sp.STDOUT, shell=True)
-    except sp.CalledProcessError:
-        logger.error(
-            "Cannot find 'pairtools' in your path please install it or add it in your path."
-        )
-        raise ImportError
-        return False
-    return True
+
+    def is_digit(char):
+        return "0" <= char <= "9"
+
+    def is_alpha(char):
+        return "a" <= char <= "z" or "A" <= char <= "Z"
+
+    def prefix_length(text):
+        """Length of the string without its suffix. The suffixes are dots
+        followed by a letter or a "~" and then letters, digits or "~".
+        """
+        prefix = 0
+        i = 0
+        while i < len(text):
+            if (
+                text[i] == "."
+                and i + 1 < len(text)
+                and (is_alpha(text[i + 1]) or text[i + 1] == "~")
+            ):
+                i += 2
+                while i < len(text) and (
+                    is_alpha(text[i]) or is_digit(text[i]) or text[i] == "~"
+                ):
+                    i += 1
+            else:
+                i += 1
+                prefix = i
+        return prefix
+
+    def order(text, pos):
+        if pos == len(text):
+            return -1
+        char = text[pos]
+        if is_digit(char):
+            return 0
+        if is_alpha(char):
+            return ord(char)
+        if char == "~":
+            return -2
+        return ord(char) + 256
+
+    def compare(text1, text2):
+        pos1, pos2 = 0, 0
+        while pos1 < len(text1) or pos2 < len(text2):
+            # Compare the non-digit parts.
+            while (pos1 < len(text1) and not is_digit(text1[pos1])) or (
+                pos2 < len(text2) and not is_digit(text2[pos2])
+            ):
+                diff = order(text1, pos1) - order(text2, pos2)
+                if diff:
+                    return diff
+                pos1 += 1
+                pos2 += 1
+            # Compare the digit parts as integers.
+            while pos1 < len(text1) and text1[pos1] == "0":
+                pos1 += 1
+            while pos2 < len(text2) and text2[pos2] == "0":
+                pos2 += 1
+            first_diff = 0
+            while (
+                pos1 < len(text1)
+                and pos2 < len(text2)
+                and is_digit(text1[pos1])
+                and is_digit(text2[pos2])
+            ):
+                if not first_diff:
+                    first_diff = ord(text1[pos1]) - ord(text2[pos2])
+                pos1 += 1
+                pos2 += 1
+            if pos1 < len(text1) and is_digit(text1[pos1]):
+                return 1
+            if pos2 < len(text2) and is_digit(text2[pos2]):
+                return -1
+            if first_diff:
+                return first_diff
+        return 0
+
+    # Special cases of the empty strings and of the leading dots: "." is
+    # first, then "..", then the other strings starting with a dot.
+    if not text1 or not text2:
+        return bool(text1) - bool(text2)
+    if text1[0] == "." or text2[0] == ".":
+        if text1[0] != text2[0]:
+            return -1 if text1[0] == "." else 1
+        for special in (".", ".."):
+            if text1 == special or text2 == special:
+                return (text1 != special) - (text2 != special)
+    prefix1, prefix2 = prefix_length(text1), prefix_length(text2)
+    diff = compare(text1[:prefix1], text2[:prefix2])
+    if diff or (prefix1 == len(text1) and prefix2 == len(text2)):
+        return diff
+    return compare(text1, text2)
 
 
 def generate_fasta_index(fasta, aligner, outdir):
@@ -288,9 +408,87 @@ def generate_temp_dir(path):
     return full_path
 
 
+def get_assembly_key(assembly, pattern):
+    """Build the key identifying the contigs statistics of an assembly from
+    the size and the modification time of the file, the checksum of its first
+    and last MiB and the restriction sites pattern.
+
+    Parameters:
+    -----------
+    assembly : str
+        Path to the assembly fasta file.
+    pattern : str
+        Regex of the restriction sites or None if there is no enzyme.
+
+    Returns:
+    --------
+    str:
+        Key of the assembly statistics.
+    """
+    stat = os.stat(assembly)
+    checksum = hashlib.md5()
+    with open(assembly, "rb") as fasta:
+        checksum.update(fasta.read(2**20))
+        fasta.seek(max(stat.st_size - 2**20, 0))
+        checksum.update(fasta.read(2**20))
+    key = [stat.st_size, stat.st_mtime_ns, checksum.hexdigest(), pattern]
+    return "\t".join(map(str, key))
+
+
+def get_fasta_ranges(fasta_file, range_size=2**26):
+    """Split a fasta file in byte ranges of complete records, so that the
+    ranges could be read independently.
+
+    Parameters:
+    -----------
+    fasta_file : str
+        Path to the uncompressed fasta file.
+    range_size : int
+        Approximative size in bytes of the ranges. [Default: 64MiB]
+
+    Returns:
+    --------
+    list of tuple:
+        List of the start and end offsets of each range in the file.
+    """
+    size = os.path.getsize(fasta_file)
+    starts = [0]
+    with open(fasta_file, "rb") as fasta:
+        while starts[-1] + range_size < size:
+            # Move to the start of the next record after the given size.
+            fasta.seek(starts[-1] + range_size)
+            fasta.readline()
+            while True:
+                start = fasta.tell()
+                line = fasta.readline()
+                if not line or line.startswith(b">"):
+                    break
+            if not line:
+                break
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def get_natural_key(text):
+    """Build a key to compare strings in the version order of GNU sort -V:
+    "NODE_2" is before "NODE_10". See compare_versions.
+
+    Parameters:
+    -----------
+    text : str
+        String to convert.
+
+    Returns:
+    --------
+    functools.cmp_to_key:
+        Key comparing the strings with compare_versions.
+    """
+    return functools.cmp_to_key(compare_versions)(text)
+
+
 def get_pairs_data(pairfile, threads=1, remove=False, force=False):
     """Extract pairs data from pypairix indexed pairs file. If no pypairix
-    indexed found, sort pairs files using pairtools executable.
+    indexed found, sort pairs files with the built-in external merge sort.
 
     Parameters
     ----------
@@ -322,6 +520,56 @@ def get_pairs_data(pairfile, threads=1, remove=False, force=False):
     return pairs_data
 
 
+def get_pairs_ranges(pairs_file, range_size=2**26):
+    """Split a pairs file in byte ranges of approximately the given size to be
+    able to read them in parallel. Only uncompressed and bgzip compressed files
+    can be split. For bgzip compressed files, the ranges are aligned on the
+    compressed blocks.
+
+    Parameters
+    ----------
+    pairs_file : str
+        Path to the pairs file to split.
+    range_size : int
+        Approximate size in bytes of the ranges. [Default: 64MiB]
+
+    Returns
+    -------
+    list of tuple:
+        List of the start and end offsets of each range in the file. None if
+        the file cannot be split.
+    """
+    with open(pairs_file, "rb") as pairs:
+        header = pairs.read(18)
+        size = pairs.seek(0, 2)
+
+        # Uncompressed file.
+        if not header.startswith(b"\x1f\x8b") and not header.startswith(
+            (b"\x42\x5a\x68", b"\x50\x4b\x03\x04")
+        ):
+            starts = list(range(0, size, range_size))
+
+        # Bgzip file: walk on the blocks to find their offsets.
+        elif header.startswith(b"\x1f\x8b\x08\x04") and header[12:14] == b"BC":
+            starts = []
+            offset = 0
+            next_start = 0
+            while offset < size:
+                if offset >= next_start:
+                    starts.append(offset)
+                    next_start = offset + range_size
+                pairs.seek(offset + 16)
+                offset += int.from_bytes(pairs.read(2), "little") + 1
+
+        # Other compressed formats could not be split.
+        else:
+            return None
+
+    if len(starts) == 0:
+        return [(0, size)]
+    return list(zip(starts, starts[1:] + [size]))
+
+
 def get_restriction_site(enzyme):
     """Function to return a regex which corresponds to all possible restriction
     sites given a set of enzyme.
@@ -432,16 +680,26 @@ def import_network(network_file):
     Parameters:
     -----------
     network_file : str
-        Path to the network file to import.
+        Path to the network file to import. Either the edge list text file or
+        the binary npz network.
 
     Returns:
     --------
     networkx.classes.graph.Graph:
         Network as networkx class.
     """
-    network = nx.read_edgelist(
-        network_file, nodetype=int, data=(("weight", float),)
-    )
+    # Binary network.
+    if network_file.endswith(".npz"):
+        edges, weights = read_network(network_file)
+        network = nx.Graph()
+        network.add_weighted_edges_from(
+            zip(edges[:, 0].tolist(), edges[:, 1].tolist(), weights.tolist())
+        )
+    # Edge list network.
+    else:
+        network = nx.read_edgelist(
+            network_file, nodetype=int, data=(("weight", float),)
+        )
     return network
 
 
@@ -492,6 +750,80 @@ def micomplete_results_to_dict(micomplete_file):
     return micomplete_summary
 
 
+def pairs_to_npz(pairs_file, npz_file=None, chunk_size=2_000_000, remove=False):
+    """Convert a pairs file to the compact pairs format: a numpy npz archive
+    with the contigs as int32 ids, the positions as uint32 and the strands as
+    bits. The read names are dropped. The contigs ids are the 1-based index of
+    the contigs in the chromsize lines of the header.
+
+    Parameters:
+    -----------
+    pairs_file : str
+        Path to the pairs file to convert. It could be compressed.
+    npz_file : str
+        Path to the output compact pairs file. [Default: <pairs_file>.npz]
+    chunk_size : int
+        Number of pairs converted per chunk. [Default: 2000000]
+    remove : bool
+        If set to true, it will remove the pairs file. [Default: False]
+
+    Returns:
+    --------
+    str:
+        Path to the compact pairs file.
+    """
+    if npz_file is None:
+        npz_file = pairs_file + ".npz"
+
+    # Retrieve the contigs from the header.
+    chroms, lengths = [], []
+    with read_compressed(pairs_file) as pairs:
+        for line in pairs:
+            if not line.startswith("#"):
+                break
+            if line.startswith("#chromsize:"):
+                chrom, length = line.split()[1:3]
+                chroms.append(chrom)
+                lengths.append(int(length))
+    names = pd.Index(chroms)
+
+    # Encode the pairs by chunks.
+    arrays = {"chr1": [], "pos1": [], "chr2": [], "pos2": [], "strands": []}
+    columns = ["chr1", "pos1", "chr2", "pos2", "strand1", "strand2"]
+    for chunk in read_pairs(pairs_file, chunk_size, columns):
+        for col in ["chr1", "chr2"]:
+            categories_ids = names.get_indexer(chunk[col].cat.categories) + 1
+            if np.any(categories_ids == 0):
+                unknown = chunk[col].cat.categories[categories_ids == 0][0]
+                logger.error(
+                    f"Contig {unknown} is not in the header of {pairs_file}."
+                )
+                raise ValueError
+            arrays[col].append(
+                categories_ids[chunk[col].cat.codes.values].astype(np.int32)
+            )
+        for col in ["pos1", "pos2"]:
+            arrays[col].append(chunk[col].values.astype(np.uint32))
+        arrays["strands"].append(
+            (chunk["strand1"] == "-").values.astype(np.uint8)
+            | ((chunk["strand2"] == "-").values.astype(np.uint8) << 1)
+        )
+    dtypes = {
+        "chr1": np.int32,
+        "pos1": np.uint32,
+        "chr2": np.int32,
+        "pos2": np.uint32,
+        "strands": np.uint8,
+    }
+    for col, dtype in dtypes.items():
+        arrays[col] = np.concatenate(arrays[col] + [np.zeros(0, dtype=dtype)])
+
+    write_pairs_npz(npz_file, chroms, lengths, **arrays)
+    if remove:
+        os.remove(pairs_file)
+    return npz_file
+
+
 def read_bin_summary(bin_summary_file):
     """Read bin summary file from metator pipeline.
 
@@ -584,6 +916,283 @@ def read_contig_data(contig_data_file):
     return data
 
 
+def read_contigs_stats_cache(assembly, pattern):
+    """Read the contigs statistics cached next to the assembly by
+    write_contigs_stats_cache. The cache is used only if the assembly has the
+    same size, modification time and checksum of its first and last MiB and if
+    the restriction sites pattern is the same.
+
+    Parameters:
+    -----------
+    assembly : str
+        Path to the assembly fasta file.
+    pattern : str
+        Regex of the restriction sites or None if there is no enzyme.
+
+    Returns:
+    --------
+    tuple:
+        Names, lengths, GC contents and number of restriction sites (None if
+        there is no pattern) of the contigs. None if there is no valid cache.
+    """
+    cache_file = assembly + ".metator_stats.npz"
+    if not isfile(cache_file):
+        return None
+    try:
+        with np.load(cache_file) as cache:
+            if str(cache["key"]) != get_assembly_key(assembly, pattern):
+                return None
+            names = np.asarray(cache["names"]).tobytes().decode()
+            names = names.split("\n") if names else []
+            lengths = cache["lengths"]
+            GCs = cache["GCs"]
+            restriction_sites = cache["RS"] if pattern else None
+    except (OSError, ValueError, KeyError):
+        logger.warning(f"Unable to read the cache {cache_file}.")
+        return None
+    return names, lengths, GCs, restriction_sites
+
+
+def read_fasta_range(fasta_file, start, end):
+    """Read the records of a byte range of a fasta file given by
+    get_fasta_ranges. The names and the sequences are parsed as Biopython does:
+    the name is the first word of the header and the spaces and the line breaks
+    are removed from the sequence.
+
+    Parameters:
+    -----------
+    fasta_file : str
+        Path to the uncompressed fasta file.
+    start : int
+        Start offset of the range.
+    end : int
+        End offset of the range.
+
+    Returns:
+    --------
+    iterator of tuple:
+        Name (str) and sequence (bytes) of each record of the range.
+    """
+    with open(fasta_file, "rb") as fasta:
+        fasta.seek(start)
+        content = fasta.read(end - start)
+
+    # Skip the text before the first record.
+    if not content.startswith(b">"):
+        first = content.find(b"\n>")
+        if first == -1:
+            return
+        content = content[first + 1 :]
+
+    for record in content[1:].split(b"\n>"):
+        header, _, sequence = record.partition(b"\n")
+        header = header.split(None, 1)
+        name = header[0].decode() if header else ""
+        yield name, sequence.translate(None, b"\n\r ")
+
+
+def read_network(network_file):
+    """Read the edges and the weights of a MetaTOR network. The network could be
+    either the edge list text file or the binary npz network.
+
+    Parameters:
+    -----------
+    network_file : str
+        Path to the network file to read.
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge.
+    numpy.ndarray:
+        Weights of the edges.
+    """
+    # Binary network: upper triangle of the contacts between contigs ids in
+    # CSR format.
+    if network_file.endswith(".npz"):
+        network = sparse.load_npz(network_file).tocoo()
+        edges = np.column_stack([network.row, network.col])
+        return edges, network.data
+
+    # Edge list network.
+    try:
+        network = pd.read_csv(
+            network_file,
+            sep="\t",
+            header=None,
+            names=["id1", "id2", "weight"],
+            dtype={"id1": np.int32, "id2": np.int32, "weight": np.float64},
+        )
+    # Empty network.
+    except pd.errors.EmptyDataError:
+        return np.zeros((0, 2), dtype=np.int32), np.zeros(0)
+    edges = network[["id1", "id2"]].values
+    return edges, network["weight"].values
+
+
+def read_pairs(pairs_file, chunk_size=2_000_000, columns=None):
+    """Read a pairs file by chunks. The header lines are skipped and the contig
+    columns are categorical encoded to reduce the memory usage and allow to
+    quickly map the contig names to their id.
+
+    Parameters:
+    -----------
+    pairs_file : str or file object
+        Path to the pairs file to read. It could be compressed or in the compact
+        npz format. An opened seekable file object could be given instead.
+    chunk_size : int
+        Number of pairs to read per chunk. [Default: 2000000]
+    columns : list of str
+        Columns to extract among: "readID", "chr1", "pos1", "chr2", "pos2",
+        "strand1", "strand2". [Default: chr1, pos1, chr2, pos2]
+
+    Returns:
+    --------
+    iterator of pandas.DataFrame:
+        Chunks of the pairs file with the asked columns.
+    """
+    pairs_columns = [
+        "readID",
+        "chr1",
+        "pos1",
+        "chr2",
+        "pos2",
+        "strand1",
+        "strand2",
+    ]
+    dtypes = {
+        "readID": str,
+        "chr1": "category",
+        "pos1": np.int64,
+        "chr2": "category",
+        "pos2": np.int64,
+        "strand1": "category",
+        "strand2": "category",
+    }
+    if columns is None:
+        columns = ["chr1", "pos1", "chr2", "pos2"]
+
+    # Compact pairs file.
+    if isinstance(pairs_file, str) and pairs_file.endswith(".npz"):
+        yield from read_pairs_npz(pairs_file, chunk_size, columns)
+        return
+
+    # Open the file if a path is given.
+    if isinstance(pairs_file, str):
+        pairs = read_compressed(pairs_file)
+    else:
+        pairs = pairs_file
+
+    # Count the header lines. Comments are not used to skip them as read names
+    # may contains a "#".
+    n_header = 0
+    for line in pairs:
+        if line[:1] not in ("#", b"#"):
+            break
+        n_header += 1
+    pairs.seek(0)
+
+    with pairs:
+        try:
+            chunks = pd.read_csv(
+                pairs,
+                sep="\t",
+                header=None,
+                names=pairs_columns,
+                usecols=columns,
+                dtype={col: dtypes[col] for col in columns},
+                skiprows=n_header,
+                chunksize=chunk_size,
+            )
+        # No pairs in the file.
+        except pd.errors.EmptyDataError:
+            return
+        for chunk in chunks:
+            yield chunk[columns]
+
+
+def read_pairs_npz(pairs_file, chunk_size=2_000_000, columns=None):
+    """Read a compact pairs file from pairs_to_npz by chunks. The chunks are
+    the same as the ones of read_pairs: the contig and strand columns are
+    categorical and the read names, which are not stored, are set to ".".
+
+    Parameters:
+    -----------
+    pairs_file : str
+        Path to the compact pairs file to read.
+    chunk_size : int
+        Number of pairs per chunk. [Default: 2000000]
+    columns : list of str
+        Columns to extract among: "readID", "chr1", "pos1", "chr2", "pos2",
+        "strand1", "strand2". [Default: chr1, pos1, chr2, pos2]
+
+    Returns:
+    --------
+    iterator of pandas.DataFrame:
+        Chunks of the pairs with the asked columns.
+    """
+    if columns is None:
+        columns = ["chr1", "pos1", "chr2", "pos2"]
+    with np.load(pairs_file) as data:
+        chroms = pd.Index(data["chroms"])
+        arrays = {
+            col: data[col]
+            for col in ["chr1", "pos1", "chr2", "pos2", "strands"]
+            if col in columns
+            or (col == "strands" and {"strand1", "strand2"} & set(columns))
+        }
+        n_pairs = len(data["chr1"])
+
+    for start in range(0, n_pairs, chunk_size):
+        chunk = {}
+        for col in columns:
+            if col == "readID":
+                values = np.full(min(chunk_size, n_pairs - start), ".")
+            elif col in ["chr1", "chr2"]:
+                codes = arrays[col][start : start + chunk_size] - 1
+                values = pd.Categorical.from_codes(codes, categories=chroms)
+            elif col in ["pos1", "pos2"]:
+                values = arrays[col][start : start + chunk_size].astype(
+                    np.int64
+                )
+            else:
+                bit = 0 if col == "strand1" else 1
+                strands = arrays["strands"][start : start + chunk_size]
+                values = pd.Categorical.from_codes(
+                    ((strands >> bit) & 1).astype(np.int8),
+                    categories=["+", "-"],
+                )
+            chunk[col] = values
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def read_pairs_range(pairs_file, start, end):
+    """Read a byte range of a pairs file from get_pairs_ranges. If the file is
+    bgzip compressed, the range is decompressed.
+
+    Parameters:
+    -----------
+    pairs_file : str
+        Path to the pairs file to read.
+    start : int
+        Offset of the start of the range.
+    end : int
+        Offset of the end of the range.
+
+    Returns:
+    --------
+    bytes:
+        Uncompressed content of the range. The first and the last lines might
+        be incomplete.
+    """
+    with open(pairs_file, "rb") as pairs:
+        pairs.seek(start)
+        content = pairs.read(end - start)
+    if content.startswith(b"\x1f\x8b"):
+        content = gzip.decompress(content)
+    return content
+
+
 def read_results_checkm(checkm_file, checkm_taxonomy_file):
     """Function to transform the output summary file of checkm into a
     dictionnary.
@@ -715,76 +1324,330 @@ def save_sparse_matrix(s_mat, path):
     )
 
 
-def sort_pairs(in_file, out_file, tmp_dir=None, threads=1, buffer="2G"):
-    """
-    Adapted function from hicstuff.io (https://github.com/koszullab/hicstuff/)
-    Sort a pairs file in batches using UNIX sort.
+def sort_pairs(
+    in_file,
+    out_file,
+    tmp_dir=None,
+    threads=1,
+    buffer="2G",
+    keys=None,
+    dedup=False,
+):
+    """Sort a pairs file with an external merge sort. The header lines are
+    removed and the sorted pairs are appended to the output file.
+
+    The input is read in chunks fitting in the buffer. Each chunk is sorted in
+    a separate process on integer encoded keys and written as a sorted run in a
+    temporary directory, with the array of its keys next to it. The runs are
+    then merged by blocks on their keys.
 
     Parameters:
     -----------
     in_file : str
-        Path to the unsorted input file
+        Path to the unsorted input file. It could be compressed.
     out_file : str
         Path to the sorted output file.
-    keys : list of str
-        list of columns to use as sort keys. Each column can be one of readID,
-        chr1, pos1, chr2, pos2, frag1, frag2. Key priorities are according to
-        the order in the list.
     tmp_dir : str
         Path to the directory where temporary files will be created. Defaults
-        to current directory.
+        to the directory of the output file.
     threads : int
-        Number of parallel sorting threads.
+        Number of chunks sorted in parallel.
     buffer : str
-        Buffer size used for sorting. Consists of a number and a unit.
-    """
-    # TODO: Write a pure python implementation to drop GNU coreutils depencency,
-    # could be inspired from: https://stackoverflow.com/q/14465154/8440675
-
-    # Check if UNIX sort version supports parallelism
-    parallel_ok = True
-    sort_ver = sp.Popen(["sort", "--version"], stdout=sp.PIPE)
-    sort_ver = (
-        sort_ver.communicate()[0]
-        .decode()
-        .split("\n")[0]
-        .split(" ")[-1]
-        .split(".")
-    )
-    # If so, specify threads, otherwise don't mention it in the command line
-    try:
-        sort_ver = list(map(int, sort_ver))
-        if sort_ver[0] < 8 or (sort_ver[0] == 8 and sort_ver[1] < 23):
-            logger.warning(
-                "GNU sort version is {0} but >8.23 is required for parallel "
-                "sort. Sorting on a single thread.".format(
-                    ".".join(map(str, sort_ver))
+        Memory budget used for sorting. Consists of a number and a unit (K, M
+        or G). [Default: 2G]
+    keys : list of tuple
+        Index of the columns to use as sort keys (0-based) and the function
+        converting the field to the sorted value (str for the lexicographic
+        order, int, or any picklable key function), by priority. Default to
+        the two first columns in version order as GNU sort -V.
+    dedup : bool
+        If enabled, only the first of the lines with the same keys is kept.
+        [Default: False]
+
+    Returns:
+    --------
+    int:
+        Number of duplicated lines removed.
+    """
+    if keys is None:
+        keys = ((0, get_natural_key), (1, get_natural_key))
+
+    # Convert the buffer size in bytes and split it between the chunks sorted in
+    # parallel. A chunk takes roughly twice its size once parsed.
+    units = {"K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30}
+    buffer = str(buffer).upper()
+    if buffer[-1] in units:
+        buffer = float(buffer[:-1]) * units[buffer[-1]]
+    buffer = float(buffer)
+    chunk_size = max(1, int(buffer / (2 * threads)))
+
+    # Sort the chunks in parallel and spill them in sorted runs.
+    if tmp_dir is None:
+        tmp_dir = os.path.dirname(os.path.abspath(out_file))
+    run_dir = join(tmp_dir, f"sort_pairs_{getrandbits(32)}")
+    os.makedirs(run_dir)
+    runs = []
+    with read_compressed(in_file) as pairs, cf.ProcessPoolExecutor(
+        max_workers=threads
+    ) as executor:
+        futures = []
+        for i, text in enumerate(iter(lambda: pairs.read(chunk_size), "")):
+            # Complete the last line of the chunk.
+            text += pairs.readline()
+            futures.append(
+                executor.submit(
+                    sort_pairs_chunk, text, join(run_dir, f"run_{i}"), keys
                 )
             )
-            parallel_ok = False
-    # BSD sort has a different format and will throw error upon parsing. It does
-    # not support parallel processes anyway.
-    except ValueError:
-        logger.warning(
-            "Using BSD sort instead of GNU sort, sorting on a single thread."
+            # Keep at most one chunk by process in memory.
+            if len(futures) == threads:
+                runs.append(futures.pop(0).result())
+        runs += [future.result() for future in futures]
+    runs = [run for run in runs if run[2] > 0]
+
+    # Map the codes of the non integer values of each run on their rank among
+    # the values of all the runs.
+    code_maps = [[None] * len(keys) for _ in runs]
+    for k, (_, dtype) in enumerate(keys):
+        if dtype is int:
+            continue
+        # Break the ties of the key function in the lexicographic order, as in
+        # the runs.
+        values = sorted(
+            set(itertools.chain.from_iterable(run[3][k] for run in runs))
         )
-        parallel_ok = False
+        if dtype is not str:
+            values.sort(key=dtype)
+        ranks = {value: rank for rank, value in enumerate(values)}
+        for i, run in enumerate(runs):
+            code_maps[i][k] = np.array(
+                [ranks[value] for value in run[3][k]], dtype=np.int64
+            )
+
+    def load_block(i):
+        """Load the next block of lines of the run i with their keys encoded as
+        big endian bytes, followed by the index of the line in the input to
+        keep the input order between equal keys.
+        """
+        start = offsets[i]
+        block_keys = np.array(run_keys[i][start : start + block_size])
+        for k, code_map in enumerate(code_maps[i]):
+            if code_map is not None:
+                block_keys[:, k] = code_map[block_keys[:, k]]
+        n_lines = len(block_keys)
+        encoded = np.empty((n_lines, len(keys) + 1), dtype=">u8")
+        # Flip the sign bit so that the bytes order is the integers order.
+        encoded[:, :-1] = block_keys.view(np.uint64) ^ np.uint64(2 ** 63)
+        encoded[:, -1] = first_lines[i] + start + np.arange(n_lines)
+        lines = np.empty(n_lines, dtype=object)
+        lines[:] = list(itertools.islice(run_handles[i], n_lines))
+        offsets[i] += n_lines
+        return lines, encoded.view(f"S{8 * (len(keys) + 1)}").ravel()
+
+    # Merge the runs by blocks. At each step, the lines with keys lower than the
+    # lowest last key loaded are complete: the lines of the next blocks of each
+    # run have greater or equal keys. Equal keys are thus written together.
+    n_duplicates = 0
+    key_width = 8 * len(keys)
+    n_lines = sum(run[2] for run in runs)
+    line_size = sum(os.path.getsize(run[0]) for run in runs) / max(1, n_lines)
+    block_size = max(1024, int(buffer / (4 * line_size * max(1, len(runs)))))
+    first_lines = np.cumsum([0] + [run[2] for run in runs])
+    offsets = [0] * len(runs)
+    run_keys = [np.load(run[1], mmap_mode="r") for run in runs]
+    run_handles = [open(run[0]) for run in runs]
+    blocks = [load_block(i) for i in range(len(runs))]
+
+    def last_key(encoded):
+        """Return the key of the last line of a block. The bytes are read from
+        the buffer as the items of bytes arrays lose their trailing zeros.
+        """
+        return encoded[-1:].tobytes()[:key_width]
 
-    # Sort pairs and append to file.
     with open(out_file, "a") as output:
-        grep_proc = sp.Popen(["grep", "-v", "^#", in_file], stdout=sp.PIPE)
-        sort_cmd = ["sort", "-S %s" % buffer] + ["-k1,1V", "-k2,2V"]
-        if tmp_dir is not None:
-            sort_cmd.append("--temporary-directory={0}".format(tmp_dir))
-        if parallel_ok:
-            sort_cmd.append("--parallel={0}".format(threads))
-        sort_proc = sp.Popen(sort_cmd, stdin=grep_proc.stdout, stdout=output)
-        sort_proc.communicate()
+        while blocks:
+            running = [
+                i for i, run in enumerate(runs) if offsets[i] < run[2]
+            ]
+            if running:
+                limit = min(last_key(blocks[i][1]) for i in running)
+                ends = [
+                    np.searchsorted(encoded, limit + bytes(8))
+                    for _, encoded in blocks
+                ]
+            else:
+                ends = [len(lines) for lines, _ in blocks]
+            lines = np.concatenate(
+                [lines[:end] for (lines, _), end in zip(blocks, ends)]
+            )
+            encoded = np.concatenate(
+                [encoded[:end] for (_, encoded), end in zip(blocks, ends)]
+            )
+            order = np.argsort(encoded, kind="stable")
+            lines = lines[order]
+            if dedup and len(lines) > 1:
+                encoded = (
+                    encoded[order]
+                    .view(np.uint8)
+                    .reshape(len(lines), -1)[:, :key_width]
+                )
+                keep = np.ones(len(lines), dtype=bool)
+                keep[1:] = np.any(encoded[1:] != encoded[:-1], axis=1)
+                n_duplicates += len(lines) - np.count_nonzero(keep)
+                lines = lines[keep]
+            output.write("".join(lines))
+            if not running:
+                break
+            # Load the next block of the runs which may have lines lower than
+            # the next limit.
+            for i, ((lines, encoded), end) in enumerate(zip(blocks, ends)):
+                lines, encoded = lines[end:], encoded[end:]
+                if i in running and (
+                    len(lines) == 0 or last_key(encoded) == limit
+                ):
+                    next_lines, next_encoded = load_block(i)
+                    lines = np.concatenate([lines, next_lines])
+                    encoded = np.concatenate([encoded, next_encoded])
+                blocks[i] = (lines, encoded)
+    for run_handle in run_handles:
+        run_handle.close()
+    del run_keys
+    shutil.rmtree(run_dir)
+    return n_duplicates
+
+
+def sort_pairs_chunk(text, out_prefix, keys):
+    """Sort a chunk of pairs lines and write them in a file with the array of
+    their integer encoded keys. The non integer values are encoded with their
+    rank among the unique values of the chunk.
+
+    Parameters:
+    -----------
+    text : str
+        Lines of the chunk. The header lines are removed.
+    out_prefix : str
+        Prefix of the files where to write the sorted lines (.pairs) and their
+        keys (.npy).
+    keys : list of tuple
+        Index of the columns to use as sort keys (0-based) and the function
+        converting the field to the sorted value, by priority.
+
+    Returns:
+    --------
+    str:
+        Path to the file with the sorted lines.
+    str:
+        Path to the file with the keys of the sorted lines.
+    int:
+        Number of lines in the chunk.
+    list:
+        Sorted unique values of each non integer key encoded by their index in
+        the list, None for integer keys.
+    """
+    # Terminate the last line of the file so that it can be moved in the run.
+    if text and not text.endswith("\n"):
+        text += "\n"
+    lines = text.splitlines(keepends=True)
+    if text.startswith("#") or "\n#" in text:
+        lines = [line for line in lines if not line.startswith("#")]
+        text = "".join(lines)
+    sort_keys = np.empty((len(lines), len(keys)), dtype=np.int64)
+    unique_values = [None] * len(keys)
+    if len(lines) > 0:
+        table = pd.read_csv(
+            io.StringIO(text),
+            sep="\t",
+            header=None,
+            usecols=[column for column, _ in keys],
+            dtype={
+                column: np.int64 if dtype is int else str
+                for column, dtype in keys
+            },
+            quoting=3,
+            na_filter=False,
+        )
+        # Encode the non integer values with their rank among the unique
+        # values, so that the key function is called once by unique value.
+        for k, (column, dtype) in enumerate(keys):
+            if dtype is int:
+                sort_keys[:, k] = table[column].values
+                continue
+            values, codes = np.unique(table[column].values, return_inverse=True)
+            if dtype is not str:
+                order = sorted(range(len(values)), key=lambda j: dtype(values[j]))
+                ranks = np.empty(len(values), dtype=np.int64)
+                ranks[order] = np.arange(len(values))
+                codes = ranks[codes]
+                values = values[order]
+            sort_keys[:, k] = codes.ravel()
+            unique_values[k] = values.tolist()
+        order = np.lexsort(sort_keys.T[::-1])
+        sort_keys = sort_keys[order]
+        lines = np.array(lines, dtype=object)[order]
+    with open(f"{out_prefix}.pairs", "w") as out:
+        out.write("".join(lines))
+    np.save(f"{out_prefix}.npy", sort_keys)
+    return f"{out_prefix}.pairs", f"{out_prefix}.npy", len(lines), unique_values
+
+
+def sort_pairs_file(pairfile, out_file, threads=1, buffer="2G", dedup=False):
+    """Sort a pairs file by chr1, chr2, pos1 and pos2 as pairtools does. The
+    header is kept with the sort order.
+
+    Parameters
+    ----------
+    pairfile : str
+        Path to the pairfile to sort.
+    out_file : str
+        Path to the sorted pairs file.
+    threads : int
+        Number of threads to use. [Default: 1]
+    buffer : str
+        Memory budget used for sorting. Consists of a number and a unit (K, M
+        or G). [Default: 2G]
+    dedup : bool
+        If enabled, remove the duplicated pairs, i.e. the pairs with the same
+        contigs, positions and strands. [Default: False]
+
+    Returns
+    -------
+    int :
+        Number of duplicated pairs removed.
+    """
+    # Copy the header with the sort order, then the sorted pairs.
+    with read_compressed(pairfile) as pairs, open(out_file, "w") as out:
+        for i, line in enumerate(pairs):
+            if not line.startswith("#"):
+                break
+            if not line.startswith("#sorted"):
+                out.write(line)
+            if i == 0:
+                out.write("#sorted: chr1-chr2-pos1-pos2\n")
+    keys = [(1, str), (3, str), (2, int), (4, int)]
+    if dedup:
+        keys += [(5, str), (6, str)]
+    n_duplicates = sort_pairs(
+        pairfile,
+        out_file,
+        tmp_dir=os.path.dirname(os.path.abspath(out_file)),
+        threads=threads,
+        buffer=buffer,
+        keys=keys,
+        dedup=dedup,
+    )
+    if dedup:
+        logger.info(
+            f"{n_duplicates} duplicated pairs removed from {os.path.basename(pairfile)}."
+        )
+    return n_duplicates
 
 
-def sort_pairs_pairtools(pairfile, threads=1, remove=False, force=False):
-    """Sort pairs files using pairtools executable. Pairix only works with
-    compressed pair files. So we use bgzip to compress them.
+def sort_pairs_pairtools(
+    pairfile, threads=1, remove=False, force=False, buffer="2G", dedup=False
+):
+    """Sort pairs files by chr1, chr2, pos1 and pos2 as pairtools does,
+    compress them with bgzip and index them with pairix. Pairix only works
+    with compressed pair files.
 
     Parameters
     ----------
@@ -796,6 +1659,12 @@ def sort_pairs_pairtools(pairfile, threads=1, remove=False, force=False):
         If set to true, it will remove the unsorted pair file. [Default: False]
     force : bool
         If set overwrite existing files. [Default: False]
+    buffer : str
+        Memory budget used for sorting. Consists of a number and a unit (K, M
+        or G). [Default: 2G]
+    dedup : bool
+        If enabled, remove the duplicated pairs, i.e. the pairs with the same
+        contigs, positions and strands. [Default: False]
 
     Returns
     -------
@@ -804,43 +1673,77 @@ def sort_pairs_pairtools(pairfile, threads=1, remove=False, force=False):
     """
     # Extract basename of the file.
     basename = os.path.splitext(pairfile)[0]
+    sorted_file = f"{basename}_sorted.pairs"
 
-    # Test if pairix and pairtools are installed and in the path.
-    _ = check_pairix()
-    _ = check_pairtools()
-
-    # Set the force parameter and delete files or raise an error accodringly.
+    # Delete files or raise an error accodringly to the force parameter.
     if force:
-        force = " -f"
-        if os.path.isfile(f"{basename}_sorted.pairs"):
-            os.remove(f"{basename}_sorted.pairs")
-    else:
-        force = ""
-        if os.path.isfile(f"{basename}_sorted.pairs") or os.path.isfile(
-            f"{basename}_sorted.pairs.gz"
-        ):
-            logger.error(
-                f"The {basename}_sorted.pairs exists. Do not overwrite existing, use --force to overwrite or use another location."
-            )
-            raise ValueError
+        for out_file in [
+            sorted_file,
+            f"{sorted_file}.gz",
+            f"{sorted_file}.gz.px2",
+        ]:
+            if os.path.isfile(out_file):
+                os.remove(out_file)
+    elif os.path.isfile(sorted_file) or os.path.isfile(f"{sorted_file}.gz"):
+        logger.error(
+            f"The {basename}_sorted.pairs exists. Do not overwrite existing, use --force to overwrite or use another location."
+        )
+        raise ValueError
 
-    # Sort pairs using pairtools.
-    cmd = f"set -eu ; pairtools sort {pairfile} --nproc {threads} -o {basename}_sorted.pairs"
-    process = sp.Popen(cmd, shell=True)
-    _out, _err = process.communicate()
-    # Compressed pairs.
-    cmd = f"set -eu ; bgzip {basename}_sorted.pairs -@ {threads}{force}"
-    process = sp.Popen(cmd, shell=True)
-    _out, _err = process.communicate()
-    # Indexed pairs.
-    cmd = f"set -eu ;  pairix{force} {basename}_sorted.pairs.gz"
-    process = sp.Popen(cmd, shell=True)
-    _out, _err = process.communicate()
+    sort_pairs_file(pairfile, sorted_file, threads, buffer, dedup)
+
+    # Compress and index the pairs.
+    pysam.tabix_compress(sorted_file, f"{sorted_file}.gz", force=True)
+    os.remove(sorted_file)
+    pypairix.build_index(f"{sorted_file}.gz", "pairs", force=1)
 
     # Remove original pairfile if remove setup.
     if remove:
         os.remove(pairfile)
-    return f"{basename}_sorted.pairs.gz"
+    return f"{sorted_file}.gz"
+
+
+def split_fastq(fastq_file, n_chunks, out_prefix, block_size=100_000):
+    """Split a fastq file in chunks to align them in parallel.
+
+    The reads are distributed by blocks in turn to each chunk, so that the
+    forward and reverse fastq files of a library split with the same
+    parameters give the mates at the same position in the same chunk.
+
+    Parameters:
+    -----------
+    fastq_file : str
+        Path to the fastq file to split. It could be compressed.
+    n_chunks : int
+        Number of chunks.
+    out_prefix : str
+        Prefix of the chunks files. The chunks are written in
+        <out_prefix>_<i>.fq.gz files.
+    block_size : int
+        Number of reads written at once in a chunk. [Default: 100000]
+
+    Returns:
+    --------
+    list of str:
+        List of the paths of the chunks.
+    """
+    chunks_files = [f"{out_prefix}_{i}.fq.gz" for i in range(n_chunks)]
+    # Fast compression as the chunks are only temporary files.
+    chunks = [
+        gzip.open(chunk_file, "wt", compresslevel=1)
+        for chunk_file in chunks_files
+    ]
+    try:
+        with read_compressed(fastq_file) as fastq:
+            for chunk in itertools.cycle(chunks):
+                block = list(itertools.islice(fastq, 4 * block_size))
+                if not block:
+                    break
+                chunk.writelines(block)
+    finally:
+        for chunk in chunks:
+            chunk.close()
+    return chunks_files
 
 
 def write_bin_summary(bin_summary, bin_summary_file):
@@ -872,6 +1775,48 @@ def write_bin_summary(bin_summary, bin_summary_file):
     bin_summary.to_csv(bin_summary_file, sep="\t", float_format="%.2f")
 
 
+def write_contigs_stats_cache(
+    assembly, pattern, names, lengths, GCs, restriction_sites
+):
+    """Cache the contigs statistics in a file next to the assembly, so that
+    they could be read by read_contigs_stats_cache in the next runs. Nothing is
+    written if the directory of the assembly is not writable.
+
+    Parameters:
+    -----------
+    assembly : str
+        Path to the assembly fasta file.
+    pattern : str
+        Regex of the restriction sites or None if there is no enzyme.
+    names : list of str
+        Names of the contigs.
+    lengths : list of int
+        Length of the contigs.
+    GCs : list of float
+        GC content of the contigs.
+    restriction_sites : list of int
+        Number of restriction sites of the contigs. None if there is no
+        pattern.
+    """
+    cache_file = assembly + ".metator_stats.npz"
+    try:
+        with open(cache_file, "wb") as cache:
+            np.savez(
+                cache,
+                key=get_assembly_key(assembly, pattern),
+                names=np.frombuffer(
+                    "\n".join(names).encode(), dtype=np.uint8
+                ),
+                lengths=np.asarray(lengths, dtype=np.int64),
+                GCs=np.asarray(GCs, dtype=np.float64),
+                RS=np.asarray(
+                    restriction_sites if pattern else [], dtype=np.int64
+                ),
+            )
+    except OSError:
+        logger.warning(f"Unable to write the cache {cache_file}.")
+
+
 def write_mge_data(mge_data, out_file):
     """Write mge binning information.
 
@@ -892,3 +1837,104 @@ def write_mge_data(mge_data, out_file):
 
     # Write the data frame
     mge_data.to_csv(out_file, sep="\t", index=False, float_format="%.2f")
+
+
+def write_network_npz(
+    edges, weights, network_file, n_contigs, dtype=np.float32, settings=None
+):
+    """Write the binary version of a network: the upper triangle of the
+    contacts between the contigs ids in CSR format with float32 weights (the
+    ids are stored as int32 as long as there are less than 2**31 edges). It's
+    much smaller and quicker to load than the edge list.
+
+    Parameters:
+    -----------
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge.
+    weights : numpy.ndarray
+        Weights of the edges.
+    network_file : str
+        Path to the output npz network file.
+    n_contigs : int
+        Number of contigs of the assembly.
+    dtype : numpy.dtype
+        Type of the weights. Raw contact counts are stored as int64.
+        [Default: numpy.float32]
+    settings : dict
+        Scalar values saved as extra entries of the npz file, such as the
+        parameters used to build the network. [Default: None]
+    """
+    network = sparse.csr_matrix(
+        (
+            np.asarray(weights, dtype=dtype),
+            (
+                edges[:, 0].astype(np.int32),
+                edges[:, 1].astype(np.int32),
+            ),
+        ),
+        shape=(n_contigs + 1, n_contigs + 1),
+    )
+    if settings is None:
+        sparse.save_npz(network_file, network, compressed=False)
+    else:
+        # Same entries as scipy.sparse.save_npz to be read by load_npz.
+        np.savez(
+            network_file,
+            format=network.format.encode("ascii"),
+            shape=network.shape,
+            data=network.data,
+            indices=network.indices,
+            indptr=network.indptr,
+            **settings,
+        )
+
+
+def write_network_txt(edges, weights, network_file):
+    """Write a network as an edge list text file, used by the external
+    partition tools.
+
+    Parameters:
+    -----------
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge.
+    weights : numpy.ndarray
+        Weights of the edges.
+    network_file : str
+        Path to the output edge list file.
+    """
+    with open(network_file, "w") as network:
+        for (id1, id2), weight in zip(edges.tolist(), weights.tolist()):
+            network.write(f"{id1}\t{id2}\t{weight}\n")
+
+
+def write_pairs_npz(
+    npz_file, chroms, lengths, chr1, pos1, chr2, pos2, strands
+):
+    """Write pairs in the compact pairs format.
+
+    Parameters:
+    -----------
+    npz_file : str
+        Path to the output compact pairs file.
+    chroms : list of str
+        Names of the contigs ordered by their id.
+    lengths : list of int
+        Lengths of the contigs ordered by their id.
+    chr1, chr2 : numpy.ndarray
+        Ids of the contigs of the pairs (1-based index in chroms).
+    pos1, pos2 : numpy.ndarray
+        1-based positions of the reads of the pairs.
+    strands : numpy.ndarray
+        Strands of the pairs: bit 0 set if the first read is on the reverse
+        strand, bit 1 set if the second is.
+    """
+    np.savez_compressed(
+        npz_file,
+        chroms=np.array(chroms, dtype=str),
+        lengths=np.asarray(lengths, dtype=np.int64),
+        chr1=np.asarray(chr1, dtype=np.int32),
+        pos1=np.asarray(pos1, dtype=np.uint32),
+        chr2=np.asarray(chr2, dtype=np.int32),
+        pos2=np.asarray(pos2, dtype=np.uint32),
+        strands=np.asarray(strands, dtype=np.uint8),
+    )
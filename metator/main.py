@@ -25,8 +25,8 @@ The subcommands are:
     contactmap  Generates a HiC contact map from one metaTOR object from the
                 final ouptut of metaTOR.
     scaffold    Scaffold a metator bin based on pairs files.
-    pairs       Sort the pairs file using pairtools. Compress them using bgzip.
-                Index them using pairix.
+    pairs       Sort the pairs file. Compress them using bgzip. Index them using
+                pairix.
     host        Detect bacterial host from a metaHiC network binned by metaTOR
                 given a annotated MGE list.
     mge         Build MGE MAGs based on metagenomic binning using metabat2
@@ -53,7 +53,8 @@ def build_matrix(
         List of the size in bp of the contigs (same order as the contigs).
     pairs_files : List of str
         List of the path of the pairs file from the alignment. If possible index
-        them first using pypairix.
+        them first using pypairix. Compact pairs files (".pairs.npz") are
+        accepted too.
 
     Return:
     -------
@@ -67,6 +68,23 @@ def build_matrix(
     mat = np.zeros((n, n))
     # Write one pair file for all the ones given.
     for pairs_file in pairs_files:
+        # Compact pairs files are read by chunks of contigs ids.
+        if pairs_file.endswith(".npz"):
+            contigs_index = pd.Index(contigs)
+            for chunk in mio.read_pairs(pairs_file):
+                i = contigs_index.get_indexer(chunk["chr1"].cat.categories)[
+                    chunk["chr1"].cat.codes.values
+                ]
+                j = contigs_index.get_indexer(chunk["chr2"].cat.categories)[
+                    chunk["chr2"].cat.codes.values
+                ]
+                mask = (i >= 0) & (j >= 0)
+                npairs += int(np.sum(mask))
+                # The threshold of 1000 is to remove the close range contacts.
+                distance = np.abs(chunk["pos1"].values - chunk["pos2"].values)
+                mask &= (i != j) | (distance > 1000)
+                np.add.at(mat, (i[mask], j[mask]), 1)
+            continue
         # Check if the pairix index exist
         try:
             pairs_data = pypairix.open(pairs_file)
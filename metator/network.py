@@ -6,26 +6,203 @@
 General utility functions for handling aligment files from align module and
 generating metaHiC networks.
 
+Core class to handle the contigs data:
+    - ContigTable
+
 Core function to build the network are:
     - alignment_to_contacts
+    - compute_contigs_stats
     - compute_network
+    - count_contacts
+    - count_pairs
+    - count_pairs_worker
     - create_contig_data
+    - get_contig_ids
+    - get_contigs_stats
+    - get_normalization_factors
+    - init_count_pairs_worker
+    - merge_previous_network
+    - normalize_network
     - normalize_pair
     - precompute_network
+    - reduce_contacts
     - write_contig_data
     - write_hit_data
+    - write_network
 """
 
 import csv
+import io
+import multiprocessing
 import numpy as np
+import pandas as pd
 import re
-from Bio import SeqIO
-from Bio import SeqUtils
-from os.path import join, basename
+from collections.abc import MutableMapping
+from contextlib import ExitStack
+from functools import partial
+from os.path import join, basename, isfile, splitext
 from metator.log import logger
 import metator.io as mio
 
 
+# Arguments shared by the count_pairs_worker tasks.
+COUNT_PAIRS_WORKER_ARGS = None
+
+
+class ContigTable:
+    """
+    Class to handle the data of all the contigs of an assembly in a columnar
+    way: each data is stored in a NumPy array indexed by the contig id and the
+    contig names are stored once in an index which gives their id.
+
+    To keep the compatibility with the dictionnary of the contigs data, the
+    table could be used as a dictionnary with the contigs names as keys and
+    dictionnary-like views of the contigs data as values with the following
+    keys: "id", "length", "GC", "hit", "coverage", "RS". The views write back
+    in the table.
+    """
+
+    columns = ("id", "length", "GC", "hit", "coverage", "RS")
+
+    def __init__(self, names, length, GC, coverage=None, RS=None):
+        """Initiates the table with the contigs in the order of their id, the
+        first contig having the id 1.
+
+        Parameters:
+        -----------
+        names : list of str
+            Names of the contigs.
+        length : list of int
+            Length of the contigs.
+        GC : list of float
+            GC content of the contigs in percent.
+        coverage : list of float
+            Shotgun coverage of the contigs. None if there is no depth file.
+            [Default: None]
+        RS : list of int
+            Number of restriction sites of the contigs. None if there is no
+            enzyme. [Default: None]
+        """
+        self.names = pd.Index(names, dtype=object)
+        self.length = self._column(length, np.int64)
+        self.GC = self._column(GC, np.float64)
+        self.hit = np.zeros(len(self.names) + 1, dtype=np.int64)
+        self.coverage = self._column(coverage, np.float64)
+        self.RS = self._column(RS, np.int64)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __getitem__(self, name):
+        return ContigRow(self, self.get_id(name))
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _column(self, values, dtype):
+        """Build a column indexed by the contigs ids."""
+        if values is None:
+            return None
+        column = np.zeros(len(self.names) + 1, dtype=dtype)
+        column[1:] = values
+        return column
+
+    def column(self, key):
+        """Return the array of the data of the contigs indexed by their id.
+
+        Parameters:
+        -----------
+        key : str
+            Data to return, either "id", "length", "GC", "hit", "coverage" or
+            "RS".
+
+        Returns:
+        --------
+        numpy.ndarray:
+            Data of the contigs indexed by their id. The value at the index 0
+            is not used.
+        """
+        if key == "id":
+            return np.arange(len(self.names) + 1)
+        values = getattr(self, key)
+        if values is None:
+            logger.error(f'There is no "{key}" data for the contigs.')
+            raise ValueError
+        return values
+
+    def get_id(self, name):
+        """Return the id of a contig from its name."""
+        return self.names.get_loc(name) + 1
+
+    def items(self):
+        return ((name, self[name]) for name in self.names)
+
+    def keys(self):
+        return iter(self.names)
+
+    def records(self):
+        """Iterate over the contigs data as tuples (name, id, length, GC, hit,
+        coverage, RS) in the order of the ids. The absent data are set to "-".
+        """
+        n_contigs = len(self.names)
+        columns = [self.names, range(1, n_contigs + 1)]
+        for values in (self.length, self.GC, self.hit, self.coverage, self.RS):
+            if values is None:
+                columns.append(["-"] * n_contigs)
+            else:
+                columns.append(values[1:].tolist())
+        return zip(*columns)
+
+    def values(self):
+        return (self[name] for name in self.names)
+
+
+class ContigRow(MutableMapping):
+    """
+    Dictionnary-like view of the data of one contig of a ContigTable. The
+    absent coverage or restriction sites are given as "-".
+    """
+
+    def __init__(self, table, contig_id):
+        self.table = table
+        self.contig_id = contig_id
+
+    def __delitem__(self, key):
+        logger.error("Contig data could not be removed.")
+        raise TypeError
+
+    def __getitem__(self, key):
+        if key == "id":
+            return self.contig_id
+        if key not in ContigTable.columns:
+            raise KeyError(key)
+        values = getattr(self.table, key)
+        if values is None:
+            return "-"
+        return values[self.contig_id].item()
+
+    def __iter__(self):
+        return iter(ContigTable.columns)
+
+    def __len__(self):
+        return len(ContigTable.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __setitem__(self, key, value):
+        if key == "id" or key not in ContigTable.columns:
+            raise KeyError(key)
+        values = getattr(self.table, key)
+        if values is None:
+            logger.error(f'There is no "{key}" data for the contigs.')
+            raise ValueError
+        values[self.contig_id] = value
+
+
 def alignment_to_contacts(
     alignment_files,
     contig_data,
@@ -38,9 +215,19 @@ def alignment_to_contacts(
     n_cpus,
     normalization,
     self_contacts,
+    aggregation="memory",
+    previous_dir=None,
+    min_quality=None,
 ):
     """Generates a network file (in edgelist form) from an alignment. Contigs
-    are the network nodes and the edges are the contact counts.
+    are the network nodes and the edges are the contact counts. A binary
+    version of the network is written next to it with the npz extension and
+    with the raw contact counts with the "_raw.npz" suffix.
+
+    If the output directory of a previous network run is given, the contacts
+    of the alignment files are added to its raw network and hits and the whole
+    network is normalized again. The edge, self contacts and minimum mapping
+    quality settings are saved in the raw network and should be the same.
 
     The network is in a strict barebone form so that it can be reused and
     imported quickly into other applications etc. Verbose information about
@@ -70,12 +257,28 @@ def alignment_to_contacts(
         'idx_contig_length_GC_hit_cov.txt'
     tmp_dir : str
         Path to th temporary directory. Default in the working directory
+    n_cpus : int
+        Number of cpus used to read the pairs files or to sort the prenetwork.
     normalization : str
         If None, do not normalized the count of a contact by the geometric mean
         of the coverage of the contigs. Otherwise it's the type of
-        normalization.
+        normalization. Several normalizations could be given separated by a
+        comma, the other ones are written in network_<normalization>.txt files.
     self_contacts : bool
         Whether to return network with self contact. Default is False.
+    aggregation : str
+        Either "memory" or "sort". With "memory" the contacts are counted
+        directly in memory while reading the pairs. With "sort", a prenetwork
+        file is written and sorted with UNIX sort before counting the contacts,
+        which uses less memory but is much slower. [Default: memory]
+    previous_dir : str
+        Output directory of a previous network run on the same assembly to
+        update with the new alignment files. Only available with the "memory"
+        aggregation. [Default: None]
+    min_quality : int
+        Minimum mapping quality used to filter the alignments, saved with the
+        raw network. None if unknown, e.g. when starting from pairs files.
+        [Default: None]
 
     Returns:
     --------
@@ -86,44 +289,107 @@ def alignment_to_contacts(
     """
 
     # Create temporary and output file which will be necessary
-    precompute_network_file = join(tmp_dir, "precompute_network_file.txt")
-    pre_network_sorted_file = join(tmp_dir, "tmp_network_sorted.txt")
     network_file = join(out_dir, output_file_network)
+    raw_network_name = splitext(output_file_network)[0] + "_raw.npz"
     contig_data_file = join(out_dir, output_file_contig_data)
     hit_data_file = join(out_dir, "hit_data_alignment.txt")
     nb_alignment = len(alignment_files)
+    settings = {
+        "edge": int(edge),
+        "self_contacts": bool(self_contacts),
+        "min_quality": -1 if min_quality is None else int(min_quality),
+    }
+
+    # The first normalization is used for the network and the sample networks,
+    # the other ones are only written for the network.
+    normalizations = normalization.split(",")
+    normalization = normalizations[0]
+    other_network_files = [
+        join(out_dir, "network_{0}.txt".format(other_normalization))
+        for other_normalization in normalizations[1:]
+    ]
+
+    if aggregation == "memory":
+        # Count the contacts of all the libraries directly from the pairs.
+        contig_data, edges, counts = count_contacts(
+            alignment_files,
+            contig_data,
+            edge,
+            hit_data,
+            self_contacts,
+            threads=int(n_cpus),
+        )
 
-    # Create a contact file easily readable for counting the contacts.
-    contig_data, out_files_list = precompute_network(
-        alignment_files,
-        contig_data,
-        edge,
-        hit_data,
-        precompute_network_file,
-        tmp_dir,
-        self_contacts,
-    )
+        # Add the contacts to the previous network if one is given.
+        if previous_dir is not None:
+            (
+                contig_data,
+                hit_data,
+                edges,
+                counts,
+                nb_previous,
+            ) = merge_previous_network(
+                previous_dir,
+                raw_network_name,
+                output_file_contig_data,
+                contig_data,
+                hit_data,
+                edges,
+                counts,
+                settings,
+            )
+        else:
+            nb_previous = 0
+            counts = np.column_stack([counts.sum(axis=1), counts])
+
+        # Write network and sample networks at once.
+        network_files = [network_file] + [
+            join(out_dir, "network_{0}.txt".format(i))
+            for i in range(nb_previous, nb_previous + nb_alignment)
+        ]
+        weights = write_network(
+            edges, counts, network_files, contig_data, normalization
+        )
+        for other_normalization, other_network_file in zip(
+            normalizations[1:], other_network_files
+        ):
+            write_network(
+                edges,
+                counts[:, :1],
+                [other_network_file],
+                contig_data,
+                other_normalization,
+            )
 
-    # Compute network
-    compute_network(
-        precompute_network_file,
-        network_file,
-        contig_data,
-        tmp_dir,
-        pre_network_sorted_file,
-        n_cpus,
-        normalization,
-    )
+        # Keep the raw contacts to be able to update the network.
+        mio.write_network_npz(
+            edges,
+            counts[:, 0],
+            join(out_dir, raw_network_name),
+            len(contig_data),
+            dtype=np.int64,
+            settings=settings,
+        )
 
-    # Compute sample network
-    for i, precompute_network_file_sample in enumerate(out_files_list):
-        network_file_sample = join(out_dir, "network_{0}.txt".format(i))
-        pre_network_sorted_file = join(
-            tmp_dir, "tmp_network_sorted_{0}.txt".format(i)
+    elif aggregation == "sort" and previous_dir is None:
+        precompute_network_file = join(tmp_dir, "precompute_network_file.txt")
+        pre_network_sorted_file = join(tmp_dir, "tmp_network_sorted.txt")
+
+        # Create a contact file easily readable for counting the contacts.
+        contig_data, out_files_list = precompute_network(
+            alignment_files,
+            contig_data,
+            edge,
+            hit_data,
+            precompute_network_file,
+            tmp_dir,
+            self_contacts,
         )
+
+        # Compute network
         compute_network(
-            precompute_network_file_sample,
-            network_file_sample,
+            precompute_network_file,
+            network_file,
             contig_data,
             tmp_dir,
             pre_network_sorted_file,
@@ -131,14 +397,108 @@ def alignment_to_contacts(
             normalization,
         )
 
+        # Compute sample network
+        for i, precompute_network_file_sample in enumerate(out_files_list):
+            network_file_sample = join(out_dir, "network_{0}.txt".format(i))
+            pre_network_sorted_file = join(
+                tmp_dir, "tmp_network_sorted_{0}.txt".format(i)
+            )
+            compute_network(
+                precompute_network_file_sample,
+                network_file_sample,
+                contig_data,
+                tmp_dir,
+                pre_network_sorted_file,
+                n_cpus,
+                normalization,
+            )
+        for other_normalization, other_network_file in zip(
+            normalizations[1:], other_network_files
+        ):
+            pre_network_sorted_file = join(
+                tmp_dir, "tmp_network_sorted_{0}.txt".format(other_normalization)
+            )
+            compute_network(
+                precompute_network_file,
+                other_network_file,
+                contig_data,
+                tmp_dir,
+                pre_network_sorted_file,
+                n_cpus,
+                other_normalization,
+            )
+        edges, weights = mio.read_network(network_file)
+
+    elif aggregation == "sort":
+        logger.error('Network update is only available with "memory".')
+        raise ValueError
+
+    else:
+        logger.error('Aggregation should be either "memory" or "sort".')
+        raise ValueError
+
+    # Write the binary version of the network.
+    mio.write_network_npz(
+        edges, weights, splitext(network_file)[0] + ".npz", len(contig_data)
+    )
+
     # Write the data from the contigs
     write_contig_data(contig_data, contig_data_file)
-    if nb_alignment > 1:
+    if hit_data is not None:
         write_hit_data(hit_data, hit_data_file)
 
     return network_file, contig_data_file
 
 
+def compute_contigs_stats(assembly, pattern=None, threads=1):
+    """Compute the length, the GC content and the number of restriction sites
+    of all the contigs of the assembly. The assembly is split in byte ranges of
+    complete records processed in parallel.
+
+    Parameters:
+    -----------
+    assembly : str
+        Path to the assembly fasta file.
+    pattern : str
+        Regex of the restriction sites from mio.get_restriction_site. If None,
+        the restriction sites are not counted. [Default: None]
+    threads : int
+        Number of processes to use. [Default: 1]
+
+    Returns:
+    --------
+    list of str:
+        Names of the contigs.
+    list of int:
+        Length of the contigs.
+    list of float:
+        GC content of the contigs in percent.
+    list of int:
+        Number of restriction sites plus one of the contigs. None if no pattern
+        is given.
+    """
+    ranges = mio.get_fasta_ranges(assembly)
+    task = partial(get_contigs_stats, assembly=assembly, pattern=pattern)
+    names, lengths, GCs = [], [], []
+    restriction_sites = [] if pattern else None
+    with ExitStack() as stack:
+        # The pool is terminated on exit, also if a range fails.
+        if threads > 1 and len(ranges) > 1:
+            pool = stack.enter_context(
+                multiprocessing.Pool(processes=min(threads, len(ranges)))
+            )
+            results = pool.imap(task, ranges)
+        else:
+            results = map(task, ranges)
+        for range_names, range_lengths, range_GCs, range_RS in results:
+            names += range_names
+            lengths += range_lengths
+            GCs += range_GCs
+            if pattern:
+                restriction_sites += range_RS
+    return names, lengths, GCs, restriction_sites
+
+
 def compute_network(
     pre_network_file,
     network_file,
@@ -184,7 +544,7 @@ def compute_network(
     n_pairs = 0  # Total number of pairs entered in the matrix
 
     # Read the sorted pairs
-    with open(pre_network_file, "r") as pairs, open(network_file, "w") as net:
+    with open(tmp_file, "r") as pairs, open(network_file, "w") as net:
         pairs_reader = csv.reader(pairs, delimiter="\t")
         prev_pair = next(pairs_reader)
         for pair in pairs_reader:
@@ -238,8 +598,8 @@ def compute_network(
                 map(
                     str,
                     [
-                        contig_data[curr_pair[0]]["id"],
-                        contig_data[curr_pair[1]]["id"],
+                        contig_data[prev_pair[0]]["id"],
+                        contig_data[prev_pair[1]]["id"],
                         effective_count,
                     ],
                 )
@@ -250,8 +610,345 @@ def compute_network(
         n_pairs += n_occ
 
 
-def create_contig_data(assembly, nb_alignment=1, depth_file=None, enzyme=None):
-    """Create a dictionnary with data on each Contig.
+def count_contacts(
+    alignment_files,
+    contig_data,
+    edge,
+    hit_data,
+    self_contacts=False,
+    chunk_size=2_000_000,
+    threads=1,
+    range_size=2**26,
+    flush_size=2**24,
+):
+    """Count the contacts between the contigs directly in memory from the pairs
+    files, without writing and sorting a prenetwork file.
+
+    The pairs are read by chunks and each chunk is processed with NumPy: the
+    contig names are mapped to their id, the pairs are filtered and set in the
+    upper triangle and packed in a key of the contact between the contigs ids
+    and the library. The keys are gathered and counted at once every
+    flush_size contacts, so that the merged and the per library networks are
+    built together without summing a sparse matrix for each chunk.
+
+    If several threads are given, the libraries and the byte ranges of the
+    large uncompressed or bgzip compressed pairs files are counted in parallel
+    and the partial counts are summed.
+
+    Parameters:
+    -----------
+    alignment_files : list of str
+        List of path to the alignment file(s).
+    contig_data : ContigTable
+        Table of the all the contigs from the assembly.
+    edge : int
+        Distance of the edge region in base pair on the contigs where the
+        mapping reads are not considered as inter contigs.
+    hit_data : dict
+        Dictionary with the count of hits for each alignment file.
+    self_contacts : bool
+        If True, the contacts on the same contigs will be kept. Otherwise only
+        displays the inter contigs contacts. [Default False]
+    chunk_size : int
+        Number of pairs read at once. [Default: 2000000]
+    threads : int
+        Number of processes used to read the pairs files. [Default: 1]
+    range_size : int
+        Size in bytes of the ranges of the pairs files read in parallel.
+        [Default: 64MiB]
+    flush_size : int
+        Number of contacts gathered before counting them. [Default: 16777216]
+
+    Returns:
+    --------
+    ContigTable:
+        Table of the all the contigs from the assembly with the hit updated.
+    numpy.ndarray:
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge
+        (id1 <= id2), sorted by ids.
+    numpy.ndarray:
+        Array of shape (n_edges, n_alignment_files) with the number of contacts
+        of each edge in each alignment file.
+    """
+    nb_alignment = len(alignment_files)
+    multiple = nb_alignment > 1
+
+    # Names and lengths of the contigs indexed by their id.
+    names = contig_data.names
+    lengths = contig_data.length
+    n_contigs = len(names) + 1
+    count_args = (names, lengths, edge, self_contacts, nb_alignment)
+
+    # Initiate values to compute 3D ratio and hits of each library.
+    all_contacts = np.zeros(nb_alignment, dtype=np.int64)
+    inter_contacts = np.zeros(nb_alignment, dtype=np.int64)
+    hits = np.zeros((nb_alignment, n_contigs), dtype=np.int64)
+
+    # Contacts of the library i between id1 and id2 are packed in the key
+    # (id1 * n_contigs + id2) * nb_alignment + i. The keys and the counts of
+    # the tasks are gathered and reduced every flush_size contacts.
+    keys, key_counts = [], []
+    n_keys = 0
+
+    # Split the libraries in tasks: the whole file or byte ranges of the file
+    # if it's possible to read them in parallel.
+    tasks = []
+    for i, alignment_file in enumerate(alignment_files):
+        ranges = None
+        if threads > 1:
+            ranges = mio.get_pairs_ranges(alignment_file, range_size)
+        if ranges is None or len(ranges) == 1:
+            tasks.append((i, alignment_file, None))
+        else:
+            tasks += [(i, alignment_file, byte_range) for byte_range in ranges]
+
+    # Count the contacts of each task and sum them.
+    fragments = [[] for _ in alignment_files]
+    with ExitStack() as stack:
+        # The pool is terminated on exit, also if a task fails.
+        if threads > 1:
+            pool = stack.enter_context(
+                multiprocessing.Pool(
+                    processes=min(threads, len(tasks)),
+                    initializer=init_count_pairs_worker,
+                    initargs=(count_args, chunk_size, flush_size),
+                )
+            )
+            results = pool.imap_unordered(count_pairs_worker, tasks)
+        else:
+            init_count_pairs_worker(count_args, chunk_size, flush_size)
+            stack.callback(init_count_pairs_worker, None, None, None)
+            results = map(count_pairs_worker, tasks)
+        for i, task_counts, task_fragments in results:
+            keys.append(task_counts[0])
+            key_counts.append(task_counts[1])
+            n_keys += len(task_counts[0])
+            if n_keys >= flush_size:
+                keys, key_counts = reduce_contacts(keys, key_counts)
+                n_keys = len(keys[0])
+            hits[i] += task_counts[2]
+            all_contacts[i] += task_counts[3]
+            inter_contacts[i] += task_counts[4]
+            if task_fragments is not None:
+                fragments[i].append(task_fragments)
+
+    # Count the pairs overlapping two byte ranges.
+    for i, file_fragments in enumerate(fragments):
+        if len(file_fragments) == 0:
+            continue
+        lines = []
+        pending = b""
+        for _start, lead, trail in sorted(file_fragments):
+            if trail is None:
+                pending += lead
+            else:
+                lines.append(pending + lead)
+                pending = trail
+        lines.append(pending)
+        chunks = mio.read_pairs(io.BytesIO(b"".join(lines)), chunk_size)
+        task_counts = count_pairs(chunks, *count_args, i, flush_size)
+        keys.append(task_counts[0])
+        key_counts.append(task_counts[1])
+        hits[i] += task_counts[2]
+        all_contacts[i] += task_counts[3]
+        inter_contacts[i] += task_counts[4]
+
+    # Count contacts and return sample informations.
+    for i, alignment_file in enumerate(alignment_files):
+        logger.info(f"Information of {basename(alignment_file)}:")
+        logger.info(f"{all_contacts[i]} contacts in the library.")
+        logger.info(
+            f"{inter_contacts[i]} contacts inter-contigs in the library."
+        )
+        logger.info(f"3D ratio : {inter_contacts[i] / all_contacts[i]}\n")
+        if multiple:
+            for contig_id in np.flatnonzero(hits[i]):
+                hit_data[names[contig_id - 1]]["hit"][i] += int(
+                    hits[i, contig_id]
+                )
+
+    # Gather the counts of each library by edge, the keys are sorted by edge.
+    (keys,), (key_counts,) = reduce_contacts(keys, key_counts)
+    edge_keys = keys // nb_alignment
+    new_edge = np.ones(len(keys), dtype=bool)
+    new_edge[1:] = edge_keys[1:] != edge_keys[:-1]
+    edge_keys = edge_keys[new_edge]
+    edges = np.column_stack([edge_keys // n_contigs, edge_keys % n_contigs])
+    counts = np.zeros((len(edges), nb_alignment), dtype=np.int64)
+    counts[np.cumsum(new_edge) - 1, keys % nb_alignment] = key_counts
+
+    # Update the hits of the contigs.
+    contig_data.hit += hits.sum(axis=0)
+
+    # Return information about the network
+    if multiple:
+        all_contacts = all_contacts.sum()
+        inter_contacts = inter_contacts.sum()
+        logger.info("General information:")
+        logger.info("{0} contacts in the library.".format(all_contacts))
+        logger.info(
+            "{0} contacts inter-contigs in the library.".format(inter_contacts)
+        )
+        logger.info("3D ratio : {0}\n".format(inter_contacts / all_contacts))
+
+    return contig_data, edges, counts
+
+
+def count_pairs(
+    chunks,
+    names,
+    lengths,
+    edge,
+    self_contacts,
+    nb_alignment,
+    i,
+    flush_size=2**24,
+):
+    """Count the contacts of chunks of pairs from one alignment file.
+
+    Parameters:
+    -----------
+    chunks : iterator of pandas.DataFrame
+        Chunks of pairs from mio.read_pairs.
+    names : pandas.Index
+        Contig names ordered by their id.
+    lengths : numpy.ndarray
+        Length of the contigs indexed by their id.
+    edge : int
+        Distance of the edge region in base pair on the contigs where the
+        mapping reads are not considered as inter contigs.
+    self_contacts : bool
+        If True, the contacts on the same contigs will be kept.
+    nb_alignment : int
+        Number of alignment files.
+    i : int
+        Index of the alignment file.
+    flush_size : int
+        Number of contacts gathered before counting them. [Default: 16777216]
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Sorted keys (id1 * n_contigs + id2) * nb_alignment + i of the contacts.
+    numpy.ndarray:
+        Number of contacts of each key.
+    numpy.ndarray:
+        Number of hits of each contig indexed by their id.
+    int:
+        Number of contacts.
+    int:
+        Number of inter contigs contacts.
+    """
+    n_contigs = len(lengths)
+    all_contacts = 0
+    inter_contacts = 0
+    hits = np.zeros(n_contigs, dtype=np.int64)
+    keys, key_counts = [], []
+    n_keys = 0
+
+    for chunk in chunks:
+        id1 = get_contig_ids(chunk["chr1"], names)
+        id2 = get_contig_ids(chunk["chr2"], names)
+        pos1 = chunk["pos1"].values
+        pos2 = chunk["pos2"].values
+
+        # Count the contacts
+        all_contacts += len(chunk)
+        hits += np.bincount(id1, minlength=n_contigs)
+        hits += np.bincount(id2, minlength=n_contigs)
+
+        # Keep all pairs if self contacts, otherwise only intercontigs pairs
+        # with both reads not mapping on the edges of the contigs.
+        inter = id1 != id2
+        if self_contacts:
+            mask = np.ones(len(chunk), dtype=bool)
+        else:
+            mask = (
+                inter
+                & (pos1 > edge)
+                & (pos2 > edge)
+                & (lengths[id1] - pos1 > edge)
+                & (lengths[id2] - pos2 > edge)
+            )
+        inter_contacts += int(np.sum(mask & inter))
+
+        # Pack the contacts in the upper triangle and count them once enough
+        # contacts are gathered.
+        id1, id2 = id1[mask].astype(np.int64), id2[mask].astype(np.int64)
+        keys.append(
+            (np.minimum(id1, id2) * n_contigs + np.maximum(id1, id2))
+            * nb_alignment
+            + i
+        )
+        key_counts.append(np.ones(len(id1), dtype=np.int64))
+        n_keys += len(id1)
+        if n_keys >= flush_size:
+            keys, key_counts = reduce_contacts(keys, key_counts)
+            n_keys = len(keys[0])
+
+    (keys,), (key_counts,) = reduce_contacts(keys, key_counts)
+    return keys, key_counts, hits, all_contacts, inter_contacts
+
+
+def count_pairs_worker(task):
+    """Count the contacts of a whole alignment file or of a byte range of an
+    alignment file. The arguments shared by all the tasks are set by
+    init_count_pairs_worker.
+
+    Parameters:
+    -----------
+    task : tuple
+        Index of the alignment file, path of the alignment file and byte range
+        to read or None to read the whole file.
+
+    Returns:
+    --------
+    int:
+        Index of the alignment file.
+    tuple:
+        Output of count_pairs.
+    tuple:
+        Start of the range, first and last incomplete lines of the range (the
+        last one is None if there is no line break in the range). None if the
+        whole file is read.
+    """
+    i, alignment_file, byte_range = task
+    count_args, chunk_size, flush_size = COUNT_PAIRS_WORKER_ARGS
+
+    # Read the whole file.
+    if byte_range is None:
+        chunks = mio.read_pairs(alignment_file, chunk_size)
+        return i, count_pairs(chunks, *count_args, i, flush_size), None
+
+    # Read only the complete lines of the range and return the incomplete ones
+    # to count them once the ranges are gathered.
+    content = mio.read_pairs_range(alignment_file, *byte_range)
+    first = content.find(b"\n") + 1
+    last = content.rfind(b"\n") + 1
+    if first == 0:
+        fragments = (byte_range[0], content, None)
+        content = b""
+    else:
+        fragments = (byte_range[0], content[:first], content[last:])
+        content = content[first:last]
+    chunks = mio.read_pairs(io.BytesIO(content), chunk_size)
+    return i, count_pairs(chunks, *count_args, i, flush_size), fragments
+
+
+def create_contig_data(
+    assembly,
+    nb_alignment=1,
+    depth_file=None,
+    enzyme=None,
+    threads=1,
+    cache=False,
+):
+    """Create a table with data on each Contig.
+
+    The assembly is read by byte ranges of complete records which could be
+    processed in parallel. The statistics of the contigs could be cached in a
+    file next to the assembly to be reused by the next runs on the same
+    assembly and enzymes.
 
     Parameters:
     -----------
@@ -265,73 +962,235 @@ def create_contig_data(assembly, nb_alignment=1, depth_file=None, enzyme=None):
     enzyme : str or None
         String that contains the names of the enzyme separated by a comma.
         [Default: None]
+    threads : int
+        Number of processes used to compute the contigs statistics.
+        [Default: 1]
+    cache : bool
+        If True, read the contigs statistics from the cache next to the
+        assembly if it's up to date, or write it. [Default: False]
 
     Returns:
     --------
-    dict:
-        Dictionary of the all the contigs from the assembly, the contigs names
-        are the keys to the data of the contig available with the following
-        keys: "id", "length", "GC", "hit", "coverage", "RS". Hit is set to 0 and
-        need to be updated later.
+    ContigTable:
+        Table of the all the contigs from the assembly, which could be used as
+        a dictionary with the contigs names as keys to the data of the contig
+        available with the following keys: "id", "length", "GC", "hit",
+        "coverage", "RS". Hit is set to 0 and need to be updated later.
     dict:
         Dictionary for hit information on each contigs.
     """
-
-    # Create a contig data dictionnary from the assembly file
-    contig_data = dict()
-    if nb_alignment > 1:
-        hit_data = dict()
-    else:
-        hit_data = None
+    threads = int(threads)
 
     # Extract restriction sites if an enzyme is given.
     if enzyme:
         pattern = mio.get_restriction_site(enzyme)
+    else:
+        pattern = None
+
+    # Load the statistics of the contigs from the cache if it's up to date.
+    stats = mio.read_contigs_stats_cache(assembly, pattern) if cache else None
+    if stats is not None:
+        logger.info("Contigs statistics loaded from the cache.")
+        names, lengths, GCs, restriction_sites = stats
+    else:
+        names, lengths, GCs, restriction_sites = compute_contigs_stats(
+            assembly, pattern, threads
+        )
+        if cache:
+            mio.write_contigs_stats_cache(
+                assembly, pattern, names, lengths, GCs, restriction_sites
+            )
 
-    global_id = 1
+    # Use the length and the coverage of the depth file if one is given.
     if depth_file:
+        coverages = []
         with open(depth_file, "r") as depth:
-            line = depth.readline()
-            for contig in SeqIO.parse(assembly, "fasta"):
+            depth.readline()
+            for i in range(len(names)):
                 line = depth.readline().split("\t")
-                contig_data[contig.id] = {
-                    "id": global_id,
-                    "length": int(line[1]),
-                    "GC": SeqUtils.gc_fraction(contig.seq),
-                    "hit": 0,
-                    "coverage": float(line[2]),
-                    "RS": (len(re.findall(pattern, str(contig.seq))) + 1)
-                    if enzyme
-                    else "-",
-                }
-                if nb_alignment > 1:
-                    hit_data[contig.id] = {
-                        "id": global_id,
-                        "hit": [0] * nb_alignment,
-                    }
-                global_id += 1
+                lengths[i] = int(line[1])
+                coverages.append(float(line[2]))
     else:
-        for contig in SeqIO.parse(assembly, "fasta"):
-            contig_data[contig.id] = {
-                "id": global_id,
-                "length": len(contig.seq),
-                "GC": SeqUtils.gc_fraction(contig.seq),
-                "hit": 0,
-                "coverage": "-",
-                "RS": (len(re.findall(pattern, str(contig.seq))) + 1)
-                if enzyme
-                else "-",
-            }
-            if nb_alignment > 1:
-                hit_data[contig.id] = {
-                    "id": global_id,
-                    "hit": [0] * nb_alignment,
-                }
-            global_id += 1
+        coverages = None
+
+    contig_data = ContigTable(
+        names, lengths, GCs, coverage=coverages, RS=restriction_sites
+    )
+
+    if nb_alignment > 1:
+        hit_data = {
+            name: {"id": global_id, "hit": [0] * nb_alignment}
+            for global_id, name in enumerate(names, 1)
+        }
+    else:
+        hit_data = None
 
     return contig_data, hit_data
 
 
+def get_contig_ids(contigs, names):
+    """Map the categorical contig names of a chunk of pairs to their ids.
+
+    Parameters:
+    -----------
+    contigs : pandas.Series
+        Categorical contig names.
+    names : pandas.Index
+        Contig names ordered by their id.
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Ids of the contigs.
+    """
+    categories_ids = names.get_indexer(contigs.cat.categories) + 1
+    if np.any(categories_ids == 0):
+        unknown = contigs.cat.categories[categories_ids == 0][0]
+        logger.error(f"Contig {unknown} from the pairs is not in the assembly.")
+        raise KeyError(unknown)
+    return categories_ids[contigs.cat.codes.values]
+
+
+def init_count_pairs_worker(count_args, chunk_size, flush_size):
+    """Set the arguments shared by the count_pairs_worker tasks, so that they
+    are sent only once to each process.
+
+    Parameters:
+    -----------
+    count_args : tuple
+        Contig names, contig lengths, edge, self contacts and number of
+        alignment files arguments of count_pairs.
+    chunk_size : int
+        Number of pairs read at once.
+    flush_size : int
+        Number of contacts gathered before counting them.
+    """
+    global COUNT_PAIRS_WORKER_ARGS
+    COUNT_PAIRS_WORKER_ARGS = (count_args, chunk_size, flush_size)
+
+
+def get_contigs_stats(byte_range, assembly, pattern=None):
+    """Compute the length, the GC content and the number of restriction sites
+    of the contigs of a byte range of the assembly. The GC content is the
+    percentage of G, C and S among the unambiguous bases, as the contig data
+    files store it, and the restriction sites are counted as non-overlapping
+    matches of the pattern.
+
+    Parameters:
+    -----------
+    byte_range : tuple
+        Start and end offset of the range from mio.get_fasta_ranges.
+    assembly : str
+        Path to the assembly fasta file.
+    pattern : str
+        Regex of the restriction sites from mio.get_restriction_site. If None,
+        the restriction sites are not counted. [Default: None]
+
+    Returns:
+    --------
+    list of str:
+        Names of the contigs.
+    list of int:
+        Length of the contigs.
+    list of float:
+        GC content of the contigs in percent.
+    list of int:
+        Number of restriction sites plus one of the contigs. Empty if no
+        pattern is given.
+    """
+    if pattern is not None:
+        pattern = re.compile(pattern.encode())
+    names, lengths, GCs, restriction_sites = [], [], [], []
+    for name, sequence in mio.read_fasta_range(assembly, *byte_range):
+        names.append(name)
+        lengths.append(len(sequence))
+        # GC content in percent on the unambiguous bases.
+        gc = sum(sequence.count(base) for base in b"CGScgs")
+        unambiguous = gc + sum(sequence.count(base) for base in b"ATWUatwu")
+        GCs.append(100 * gc / unambiguous if unambiguous else 0)
+        if pattern is not None:
+            restriction_sites.append(len(pattern.findall(sequence)) + 1)
+    return names, lengths, GCs, restriction_sites
+
+
+def get_normalization_factors(contig_data, edges, normalization):
+    """Compute the normalization factor of each edge, so that the normalized
+    contact count between two contigs is the count divided by the factor. It's
+    the vectorized equivalent of normalize_pair, with the operations done in
+    the same order to give the same values.
+
+    Parameters:
+    -----------
+    contig_data : ContigTable or dict
+        Table of the all the contigs from the assembly or dictionnary with the
+        contigs names as keys to the data of the contig available with the
+        following keys: "id", "length", "GC", "hit", "coverage", "RS".
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge.
+    normalization : str
+        Mode of normalization to use.
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Normalization factors of the edges.
+    """
+
+    if isinstance(contig_data, ContigTable):
+        contig_values = contig_data.column
+    else:
+        n_contigs = max(data["id"] for data in contig_data.values()) + 1
+
+        def contig_values(key):
+            values = np.zeros(n_contigs)
+            for data in contig_data.values():
+                values[data["id"]] = data[key]
+            return values
+
+    # Values of the first and of the second contig of each edge.
+    def edge_values(key):
+        values = contig_values(key)
+        return values[edges[:, 0]], values[edges[:, 1]]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # The four first normalizations are normalization by the geometric
+        # mean of "coverage".
+        if normalization == "abundance":
+            coverage1, coverage2 = edge_values("coverage")
+            factors = np.sqrt(coverage1 * coverage2)
+        elif normalization == "length":
+            hit1, hit2 = edge_values("hit")
+            length1, length2 = edge_values("length")
+            factors = np.sqrt(hit1 / length1 * hit2 / length2)
+        elif normalization == "RS":
+            hit1, hit2 = edge_values("hit")
+            RS1, RS2 = edge_values("RS")
+            factors = 0.01 * np.sqrt(hit1 / RS1 * hit2 / RS2)
+        # The last two normalizations are normalization by geometric means of
+        # hits.
+        elif normalization == "empirical_hit":
+            hit1, hit2 = edge_values("hit")
+            factors = np.sqrt(hit1 * hit2)
+        elif normalization == "theoritical_hit":
+            coverage1, coverage2 = edge_values("coverage")
+            length1, length2 = edge_values("length")
+            RS1, RS2 = edge_values("RS")
+            factors = np.sqrt(
+                coverage1
+                * 10
+                * np.sqrt(length1 * RS1)
+                * coverage2
+                * 10
+                * np.sqrt(length2 * RS2)
+            )
+        else:
+            logger.error(
+                'Normalization should be among this list: "None", "abundance", "length", "RS", "empirical_hit", "theoritical_hit"'
+            )
+            raise ValueError
+    return factors
+
+
 def normalize_pair(contig_data, pair, n_occ, normalization):
     """Function to do the normalization of an inter contig contact depending on
     the mode of normalisation given.
@@ -406,6 +1265,167 @@ def normalize_pair(contig_data, pair, n_occ, normalization):
     return n_occ / factor
 
 
+def merge_previous_network(
+    previous_dir,
+    raw_network_name,
+    contig_data_name,
+    contig_data,
+    hit_data,
+    edges,
+    counts,
+    settings,
+):
+    """Add the contacts and the hits counted from new alignment files to the
+    raw network and the hits of a previous network run on the same assembly
+    and with the same settings.
+
+    Parameters:
+    -----------
+    previous_dir : str
+        Output directory of the previous network run.
+    raw_network_name : str
+        Name of the raw network file in the previous directory.
+    contig_data_name : str
+        Name of the contig data file in the previous directory.
+    contig_data : ContigTable
+        Table of the all the contigs from the assembly with the hits of the new
+        alignment files.
+    hit_data : dict
+        Dictionary for hit information on each contigs of the new alignment
+        files. None if there is only one new alignment file.
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge of
+        the new alignment files.
+    counts : numpy.ndarray
+        Array of shape (n_edges, n_alignment_files) with the number of contacts
+        of each edge in each new alignment file.
+    settings : dict
+        Edge, self contacts and minimum mapping quality (-1 if unknown) used to
+        count the new contacts.
+
+    Returns:
+    --------
+    ContigTable:
+        Table of the all the contigs with the hits of all the libraries.
+    dict:
+        Dictionary for hit information on each contigs of all the libraries.
+    numpy.ndarray:
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge of
+        the updated network, sorted by ids.
+    numpy.ndarray:
+        Array of shape (n_edges, n_alignment_files + 1) with the number of
+        contacts of each edge in the updated network and in each new alignment
+        file.
+    int:
+        Number of libraries of the previous network.
+    """
+    raw_network_file = join(previous_dir, raw_network_name)
+    if not isfile(raw_network_file):
+        logger.error(f"No raw network found in {previous_dir}.")
+        raise ValueError
+    previous_edges, previous_counts = mio.read_network(raw_network_file)
+
+    # The previous contacts should be counted with the same settings. The
+    # minimum mapping quality is only compared if both are known.
+    with np.load(raw_network_file) as raw_network:
+        previous_settings = {
+            key: raw_network[key].item()
+            for key in settings
+            if key in raw_network.files
+        }
+    for key, value in settings.items():
+        if key not in previous_settings:
+            logger.error(f"No {key} setting saved in {raw_network_file}.")
+            raise ValueError
+        previous_value = previous_settings[key]
+        if key == "min_quality" and -1 in (value, previous_value):
+            continue
+        if previous_value != value:
+            logger.error(
+                f"The previous network was built with {key}={previous_value} "
+                f"instead of {value}."
+            )
+            raise ValueError
+
+    # The hits of the previous network should be on the same contigs.
+    previous_data = pd.read_csv(
+        join(previous_dir, contig_data_name), sep="\t", usecols=["Name", "Hit"]
+    )
+    if not np.array_equal(previous_data["Name"].values, contig_data.names):
+        logger.error("The previous network was built on another assembly.")
+        raise ValueError
+    hit_data_file = join(previous_dir, "hit_data_alignment.txt")
+    if isfile(hit_data_file):
+        previous_hits = pd.read_csv(hit_data_file, sep="\t", header=None)
+        previous_hits = previous_hits.iloc[:, 2:].values
+    else:
+        previous_hits = previous_data[["Hit"]].values
+    nb_previous = previous_hits.shape[1]
+
+    # Hits of each library.
+    if hit_data is None:
+        new_hits = contig_data.hit[1:, None]
+    else:
+        new_hits = np.array([hit_data[name]["hit"] for name in contig_data])
+    hits = np.column_stack([previous_hits, new_hits])
+    hit_data = {
+        name: {"id": contig_id, "hit": contig_hits}
+        for contig_id, (name, contig_hits) in enumerate(
+            zip(contig_data, hits.tolist()), 1
+        )
+    }
+    contig_data.hit[1:] += previous_data["Hit"].values
+
+    # Gather the previous and the new edges, sorted by ids.
+    n_contigs = len(contig_data) + 1
+    previous_keys = previous_edges[:, 0].astype(np.int64) * n_contigs
+    previous_keys += previous_edges[:, 1]
+    new_keys = edges[:, 0].astype(np.int64) * n_contigs + edges[:, 1]
+    keys = np.union1d(previous_keys, new_keys)
+    merged_counts = np.zeros((len(keys), counts.shape[1] + 1), dtype=np.int64)
+    merged_counts[np.searchsorted(keys, previous_keys), 0] = previous_counts
+    new_index = np.searchsorted(keys, new_keys)
+    merged_counts[new_index, 0] += counts.sum(axis=1)
+    merged_counts[new_index, 1:] = counts
+    edges = np.column_stack([keys // n_contigs, keys % n_contigs])
+
+    return contig_data, hit_data, edges, merged_counts, nb_previous
+
+
+def normalize_network(edges, counts, contig_data, normalization):
+    """Normalize the contact counts of all the edges of a network at once.
+
+    Parameters:
+    -----------
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge.
+    counts : numpy.ndarray
+        Array of shape (n_edges, n_files) with the number of contacts of each
+        edge.
+    contig_data : dict
+        Dictionnary of the all the contigs from the assembly, the contigs names
+        are the keys to the data of the contig available with the following
+        keys: "id", "length", "GC", "hit", "coverage", "RS".
+    normalization : str
+        Mode of normalization to use. If "None", the counts are returned.
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Normalized contact counts with the same shape as counts.
+    """
+    if normalization == "None":
+        return counts
+
+    edge_factors = get_normalization_factors(contig_data, edges, normalization)
+
+    # If no read mapped from Shotgun libraries could be equal to zero.
+    weights = np.zeros(counts.shape)
+    valid = np.isfinite(edge_factors) & (edge_factors > 0)
+    weights[valid] = counts[valid] / edge_factors[valid, None]
+    return weights
+
+
 def precompute_network(
     alignment_files,
     contig_data,
@@ -574,6 +1594,37 @@ def precompute_network(
     return contig_data, out_files_list
 
 
+def reduce_contacts(keys, counts):
+    """Sum the counts of the identical keys of contacts.
+
+    Parameters:
+    -----------
+    keys : list of numpy.ndarray
+        Keys of the contacts.
+    counts : list of numpy.ndarray
+        Number of contacts of each key.
+
+    Returns:
+    --------
+    list of numpy.ndarray:
+        Single array of the unique keys, sorted.
+    list of numpy.ndarray:
+        Single array of the summed number of contacts of each unique key.
+    """
+    if len(keys) == 0:
+        return [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    keys = np.concatenate(keys)
+    counts = np.concatenate(counts)
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_key)
+    if len(starts) == 0:
+        return [keys], [counts]
+    return [keys[starts]], [np.add.reduceat(counts, starts)]
+
+
 def write_contig_data(contig_data, output_path):
     """Function to write the contig data file at the output path given. The file
     will contains 7 columns separated by a tabulation: id, name, length,
@@ -581,10 +1632,10 @@ def write_contig_data(contig_data, output_path):
 
     Parameters:
     -----------
-    contig_data : dict
-        Dictionary of the all the contigs from the assembly, the contigs names
-        are the keys to the data of the contig available with the following
-        keys: "id", "length", "GC", "hit", "coverage", "RS".
+    contig_data : ContigTable or dict
+        Table of the all the contigs from the assembly or dictionary with the
+        contigs names as keys to the data of the contig available with the
+        following keys: "id", "length", "GC", "hit", "coverage", "RS".
     output_path : str
         Path to the output file where the data from the dictionary will be
         written
@@ -594,13 +1645,14 @@ def write_contig_data(contig_data, output_path):
     with open(output_path, "w") as contig_data_file_handle:
         line = "ID\tName\tSize\tGC_content\tHit\tShotgun_coverage\tRestriction_site\n"
         contig_data_file_handle.write(line)
-        for name in contig_data:
-            length = contig_data[name]["length"]
-            hit = contig_data[name]["hit"]
-            coverage = contig_data[name]["coverage"]
-            GC_content = contig_data[name]["GC"]
-            idx = contig_data[name]["id"]
-            RS = contig_data[name]["RS"]
+        if isinstance(contig_data, ContigTable):
+            records = contig_data.records()
+        else:
+            records = (
+                (name, *[data[key] for key in ContigTable.columns])
+                for name, data in contig_data.items()
+            )
+        for name, idx, length, GC_content, hit, coverage, RS in records:
             line = "{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(
                 idx, name, length, GC_content, hit, coverage, RS
             )
@@ -630,3 +1682,58 @@ def write_hit_data(hit_data, output_path):
             idx = hit_data[name]["id"]
             line = "{0}\t{1}\t{2}\n".format(idx, name, hit_str)
             hit_data_file_handle.write(line)
+
+
+def write_network(edges, counts, network_files, contig_data, normalization):
+    """Write the network files from the contacts counted in memory. The edges
+    are written sorted by the id of the contigs. All the network files are
+    written in a single pass on the edges.
+
+    Parameters:
+    -----------
+    edges : numpy.ndarray
+        Array of shape (n_edges, 2) with the ids of the contigs of each edge,
+        sorted by ids.
+    counts : numpy.ndarray
+        Array of shape (n_edges, n_files) with the number of contacts of each
+        edge for each network file.
+    network_files : list of str
+        Path of the output files (network files).
+    contig_data : dict
+        Dictionary of the all the contigs from the assembly, the contigs names
+        are the keys to the data of the contig available with the following
+        keys: "id", "length", "GC", "hit", "coverage", "RS".
+    normalization : str
+        If None, do not normalized the count of a contact by the geometric mean
+        of the coverage of the contigs. Otherwise it's the type of
+        normalization.
+
+    Returns:
+    --------
+    numpy.ndarray:
+        Weights of the edges of the first network file.
+    """
+    # Normalize all the counts at once.
+    weights = normalize_network(edges, counts, contig_data, normalization)
+
+    with ExitStack() as stack:
+        nets = [stack.enter_context(open(f, "w")) for f in network_files]
+        for (id1, id2), edge_counts, edge_weights in zip(
+            edges.tolist(), counts.tolist(), weights.tolist()
+        ):
+            for net, n_occ, effective_count in zip(
+                nets, edge_counts, edge_weights
+            ):
+                # Skip the edge if it's absent from this network.
+                if n_occ == 0:
+                    continue
+
+                # The edges with a null normalization factor are written as an
+                # integer 0 as normalize_pair returns.
+                if effective_count == 0:
+                    effective_count = 0
+
+                # Write the line in the file
+                net.write(f"{id1}\t{id2}\t{effective_count}\n")
+
+    return weights[:, 0]
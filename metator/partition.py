@@ -16,6 +16,8 @@ Core functions to partition the network are:
     - generate_fasta
     - get_distances_splitmat
     - get_hamming_distance
+    - get_membership_matrix
+    - igraph_iterations
     - leiden_iterations_java
     - louvain_iterations_cpp
     - partition
@@ -26,11 +28,13 @@ Deprecated Spinglass functions:
     - spinglass_partition
 """
 
+import igraph
 import metator.io as mio
 import multiprocessing
 import numpy as np
 import os
 import pandas as pd
+import random
 import subprocess as sp
 
 # from cdlib import algorithms
@@ -38,7 +42,10 @@ from functools import partial
 from metator.log import logger
 from os.path import join
 from scipy import sparse
-from sklearn import metrics
+
+
+# Network and parameters shared by the igraph_worker tasks.
+IGRAPH_WORKER_ARGS = None
 
 
 def algo_partition(
@@ -49,6 +56,7 @@ def algo_partition(
     resolution_parameter=1.0,
     tmpdir=".",
     spin=2,
+    threads=1,
 ):
     """Function to partition the network depednding on the used algorithm.
 
@@ -74,23 +82,38 @@ def algo_partition(
     spin : int
         Deprecated. Number of final cluster if spinglass algorithm chosen.
         [Default: 2]
+    threads : int
+        Number of iterations run in parallel. [Default: 1]
 
     Returns:
     --------
-    dict:
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values.
+    pandas.core.frame.DataFrame:
+        Table with the id of the contigs as index and their bin for each
+        iteration as int32 columns.
     """
     # Launch the write partition algorithm
     if algorithm == "leiden":
         LEIDEN_PATH = os.environ["LEIDEN_PATH"]
         output_partition = leiden_iterations_java(
-            network_file, iterations, resolution_parameter, tmpdir, LEIDEN_PATH,
+            network_file,
+            iterations,
+            resolution_parameter,
+            tmpdir,
+            LEIDEN_PATH,
+            threads,
         )
     elif algorithm == "louvain":
         LOUVAIN_PATH = os.environ["LOUVAIN_PATH"]
         output_partition = louvain_iterations_cpp(
-            network_file, iterations, tmpdir, LOUVAIN_PATH,
+            network_file, iterations, tmpdir, LOUVAIN_PATH, threads,
+        )
+    elif algorithm in ["louvain_igraph", "leiden_igraph"]:
+        output_partition = igraph_iterations(
+            network_file,
+            iterations,
+            algorithm.split("_")[0],
+            resolution_parameter,
+            threads,
         )
     # elif algorithm == "spinglass":
     #     output_partition = spinglass_partition(
@@ -99,7 +122,7 @@ def algo_partition(
     #     )
     else:
         logger.error(
-            'algorithm should be either "louvain", "leiden", or "spinglass"'
+            'algorithm should be either "louvain", "leiden", "louvain_igraph", "leiden_igraph" or "spinglass"'
         )
         raise ValueError
     return output_partition
@@ -221,9 +244,9 @@ def detect_core_bins(output_partition, iterations):
 
     Parameters:
     -----------
-    output_partition : dict
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values.
+    output_partition : pandas.core.frame.DataFrame
+        Table with the id of the contigs as index and their bin for each
+        iteration as columns.
     iterations : int
         Number of iterations made previously with the partition algorithm.
 
@@ -232,42 +255,40 @@ def detect_core_bins(output_partition, iterations):
     dict:
         Dictionnary which has as keys the core bins id and as value the id of
         the contigs of the core bin.
-    pandas.core.frame.DataFrame:
-        Table with the id of the core bin and their values for each iterations.
+    numpy.ndarray:
+        Table with the bins of each core bin (rows) for each iterations
+        (columns).
     """
-    # finding duplicate values in the output of louvain or leiden using a
-    # flipped dictionary.
-
-    # Create dictionnary for core bins
-    core_bins = {}
-    core_bins_contigs = {}
-    core_bins_iterations = np.empty((0, iterations), int)
-    core_bin_id = 0
-    for key, value in output_partition.items():
-        if value not in core_bins:
-            # Create an entry in a dictionnary with all the contigs with
-            # iterations list as a key.
-            core_bins[value] = core_bin_id
-
-            # Create an entry in a dictionnary with all the contigs with core
-            # bin id as a key.
-            core_bins_contigs[core_bin_id] = [key]
-            core_bin_id += 1
-            # Add a line to compute the array used to compute the distance
-            # between two core bins
-            core_bins_iterations = np.append(
-                core_bins_iterations,
-                np.array([list(map(int, value.split(";")))]),
-                axis=0,
-            )
-        # If already an entry created for this bin add a contig in the lists.
-        else:
-            core_bins_contigs[core_bins[value]].append(key)
+    # Find the duplicated rows of the membership matrix, i.e. the contigs
+    # always in the same bin. The rows are hashed one iteration at a time: the
+    # code of the previous iterations and the bin of the current one are
+    # combined in an integer and factorized again. The codes are given in the
+    # order of first appearance, so that the core bins are numbered in the
+    # order of their first contig.
+    memberships = output_partition.values
+    core_bins = np.zeros(len(memberships), dtype=np.int64)
+    for i in range(memberships.shape[1]):
+        labels = memberships[:, i].astype(np.int64)
+        labels -= labels.min(initial=0)
+        core_bins, _ = pd.factorize(
+            core_bins * (labels.max(initial=0) + 1) + labels
+        )
+    _, first = np.unique(core_bins, return_index=True)
+
+    # Create dictionnary with the contigs of each core bin, in their order in
+    # the partition.
+    contigs = output_partition.index.values[np.argsort(core_bins, kind="stable")]
+    bounds = np.cumsum(np.bincount(core_bins))[:-1]
+    core_bins_contigs = {
+        core_bin_id: core_bin_contigs.tolist()
+        for core_bin_id, core_bin_contigs in enumerate(np.split(contigs, bounds))
+    }
 
-    # Transform the array in a dataframe
-    core_bins_iterations = pd.DataFrame(core_bins_iterations)
+    # Table of the bins of each core bin used to compute the distance between
+    # two core bins.
+    core_bins_iterations = memberships[first]
 
-    logger.info(f"{len(core_bins)} core bins were found.")
+    logger.info(f"{len(core_bins_contigs)} core bins were found.")
 
     return core_bins_contigs, core_bins_iterations
 
@@ -336,18 +357,25 @@ def generate_fasta(
     )
 
 
-def get_distances_splitmat(bins, core_bins_iterations):
+def get_distances_splitmat(bins, membership, iterations, threshold=0):
     """This function takes a segment of the full iterative clustering matrix and
-    computes, for each index (i.e. contig), the hamming distance to each of the
-    other indices.
+    computes, for each index (i.e. core bin), the hamming distance to each of
+    the other indices.
+
+    The number of iterations where two core bins share the same bin is the
+    product of their membership rows, so only the pairs of core bins clustered
+    together at least once are computed.
 
     Parameters:
     -----------
-    bins : pandas.core.frame.DataFrame
-        Slice of the table with the id of the core bin and their values for each
-        iterations.
-    core_bins_iterations : pandas.core.frame.DataFrame
-        Table with the id of the core bin and their values for each iterations.
+    bins : scipy.sparse.csr.csr_matrix
+        Slice of the membership matrix of the core bins.
+    membership : scipy.sparse.csr.csr_matrix
+        Membership matrix of all the core bins.
+    iterations : int
+        Number of iterations of the partition.
+    threshold : float
+        Minimum hamming distance to keep a pair of core bins. [Default: 0]
 
     Returns:
     --------
@@ -355,25 +383,30 @@ def get_distances_splitmat(bins, core_bins_iterations):
         matrix of the distance of the possible pairs from the slice of the table
         and the table itself.
     """
-    x = sparse.csr_matrix(
-        1
-        - metrics.pairwise_distances(
-            core_bins_iterations, bins.values, metric="hamming"
-        )
-    )
+    x = membership.dot(bins.T).tocsr().astype(np.float64)
+    x.data /= iterations
+    # Same tolerance as the overlapping threshold.
+    x.data[x.data < threshold - 1e-10] = 0
+    x.eliminate_zeros()
     return x
 
 
-def get_hamming_distance(core_bins_iterations, threads):
+def get_hamming_distance(core_bins_iterations, threads, threshold=0):
     """Generate matrix of Hamming distances between all pairs of core bins.
 
+    Only the pairs with a distance above the threshold are kept, so that the
+    memory and the time scale with the number of similar pairs rather than with
+    the square of the number of core bins.
+
     Parameters:
     -----------
-    core_bins_iterations : pandas.core.frame.DataFrame
-        Table with the id of the core bin as index and their values for each
-        iterations.
+    core_bins_iterations : numpy.ndarray
+        Table with the bins of each core bin for each iterations.
     threads : int
         Number of cores to parallelize computation.
+    threshold : float
+        Minimum hamming distance to keep a pair of core bins. All the pairs
+        clustered together at least once are kept if 0. [Default: 0]
 
     Returns:
     --------
@@ -384,13 +417,18 @@ def get_hamming_distance(core_bins_iterations, threads):
 
     # Compute Hamming distances in the core-bin-level iterative clustering
     # matrix, in parallel
+    membership = get_membership_matrix(core_bins_iterations)
+    iterations = core_bins_iterations.shape[1]
     step = 1000
-    steps = np.arange(step, len(core_bins_iterations.index) + step, step)
-    split_core_bins = [core_bins_iterations[(k - step) : k] for k in steps]
+    steps = np.arange(step, len(core_bins_iterations) + step, step)
+    split_core_bins = [membership[(k - step) : k] for k in steps]
     pool = multiprocessing.Pool(processes=threads)
     res = pool.map(
         partial(
-            get_distances_splitmat, core_bins_iterations=core_bins_iterations,
+            get_distances_splitmat,
+            membership=membership,
+            iterations=iterations,
+            threshold=threshold,
         ),
         split_core_bins,
     )
@@ -399,8 +437,179 @@ def get_hamming_distance(core_bins_iterations, threads):
     return res.tocsr()
 
 
+def get_iterations_seeds(iterations, seed=None):
+    """Generate one seed by iteration of the partition.
+
+    Parameters:
+    -----------
+    iterations : int
+        Number of iterations.
+    seed : int
+        Seed of the first iteration, the next ones use the following integers.
+        Random if None. [Default: None]
+
+    Returns:
+    --------
+    list of int:
+        Seed of each iteration.
+    """
+    if seed is None:
+        seed = random.getrandbits(31)
+    return [seed + i for i in range(iterations)]
+
+
+def get_membership_matrix(core_bins_iterations):
+    """Generate the one-hot membership matrix of the core bins.
+
+    Each column correspond to one bin of one iteration, with a 1 for the core
+    bins belonging to it.
+
+    Parameters:
+    -----------
+    core_bins_iterations : numpy.ndarray
+        Table with the bins of each core bin for each iterations.
+
+    Returns:
+    --------
+    scipy.sparse.csr.csr_matrix:
+        Membership matrix with one row by core bin and one column by bin of
+        each iteration.
+    """
+    labels = np.asarray(core_bins_iterations, dtype=np.int64)
+    n_bins, iterations = labels.shape
+    labels = labels - labels.min(axis=0, initial=0)
+    # Shift the bins of each iteration after the ones of the previous ones.
+    sizes = labels.max(axis=0, initial=0) + 1
+    offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    rows = np.repeat(np.arange(n_bins), iterations)
+    cols = (labels + offsets).ravel()
+    membership = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(n_bins, int(sizes.sum())),
+    )
+    return membership
+
+
+def igraph_iterations(
+    network_file,
+    iterations,
+    algorithm="louvain",
+    resolution_parameter=1.0,
+    threads=1,
+    seed=None,
+):
+    """Use the igraph implementations of Louvain or Leiden to partition the
+    network. The network is loaded once and the iterations run in a pool of
+    processes sharing it.
+
+    Parameters:
+    -----------
+    network_file : str
+        Path to the network computed previously. The file is 3 columns table
+        separated by a tabulation with the id of the first contigs the id of the
+        second one and the weights of the edge normalized or not, or its binary
+        npz version.
+    iterations : int
+        Number of iterations of the algorithm.
+    algorithm : str
+        Either "louvain" or "leiden". [Default: louvain]
+    resolution_parameter : float
+        Resolution parameter of the modularity used by Leiden. [Default: 1.0]
+    threads : int
+        Number of iterations run in parallel. [Default: 1]
+    seed : int
+        Seed of the first iteration, the next ones use the following integers.
+        Random if None. [Default: None]
+
+    Returns:
+    --------
+    pandas.core.frame.DataFrame:
+        Table with the id of the contigs as index and their bin for each
+        iteration as int32 columns.
+    """
+    # Build the graph on the contigs with contacts only.
+    edges, weights = mio.read_network(network_file)
+    nodes = np.unique(edges)
+    network = igraph.Graph(
+        n=len(nodes),
+        edges=np.searchsorted(nodes, edges).tolist(),
+        edge_attrs={"weight": weights.tolist()},
+    )
+
+    # Run the iterations of Louvain or Leiden.
+    seeds = get_iterations_seeds(iterations, seed)
+    worker_args = (network, algorithm, resolution_parameter)
+    if threads > 1:
+        with multiprocessing.Pool(
+            processes=min(threads, iterations),
+            initializer=init_igraph_worker,
+            initargs=worker_args,
+        ) as pool:
+            memberships = pool.map(igraph_worker, seeds)
+    else:
+        init_igraph_worker(*worker_args)
+        memberships = list(map(igraph_worker, seeds))
+        init_igraph_worker(None, None, None)
+    output_partition = pd.DataFrame(
+        np.array(memberships, dtype=np.int32).T, index=nodes
+    )
+    return output_partition
+
+
+def igraph_worker(seed):
+    """Run one iteration of Louvain or Leiden with igraph. The network and the
+    parameters are set by init_igraph_worker.
+
+    Parameters:
+    -----------
+    seed : int
+        Seed of the random number generator used by igraph.
+
+    Returns:
+    --------
+    list of int:
+        Community of each node of the network.
+    """
+    network, algorithm, resolution_parameter = IGRAPH_WORKER_ARGS
+    # igraph uses the random module as random number generator.
+    random.seed(seed)
+    if algorithm == "leiden":
+        clustering = network.community_leiden(
+            objective_function="modularity",
+            weights="weight",
+            resolution=resolution_parameter,
+            n_iterations=4,
+        )
+    else:
+        clustering = network.community_multilevel(weights="weight")
+    return clustering.membership
+
+
+def init_igraph_worker(network, algorithm, resolution_parameter):
+    """Set the network and the parameters shared by the igraph_worker tasks, so
+    that they are sent only once to each process.
+
+    Parameters:
+    -----------
+    network : igraph.Graph
+        Network to partition with the weights as "weight" edge attribute.
+    algorithm : str
+        Either "louvain" or "leiden".
+    resolution_parameter : float
+        Resolution parameter of the modularity used by Leiden.
+    """
+    global IGRAPH_WORKER_ARGS
+    IGRAPH_WORKER_ARGS = (network, algorithm, resolution_parameter)
+
+
 def leiden_iterations_java(
-    network_file, iterations, resolution_parameter, tmp_dir, leiden_path
+    network_file,
+    iterations,
+    resolution_parameter,
+    tmp_dir,
+    leiden_path,
+    threads=1,
+    seed=None,
 ):
     """Use the java implementation of Leiden to partition the network.
 
@@ -418,49 +627,141 @@ def leiden_iterations_java(
         Path to the temporary directory.
     leiden_path : str
         Path to the directory with network analysis java implementation.
+    threads : int
+        Number of iterations run in parallel. [Default: 1]
+    seed : int
+        Seed of the first iteration, the next ones use the following integers.
+        Random if None. [Default: None]
 
     Returns:
     --------
-    dict:
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values.
+    pandas.core.frame.DataFrame:
+        Table with the id of the contigs as index and their bin for each
+        iteration as int32 columns.
     """
-    output_partition = dict()
-
     # Run the iterations of Leiden
-    for i in range(iterations):
-        # logger.info(f"Iteration in progress: {i}")
+    tasks = list(enumerate(get_iterations_seeds(iterations, seed)))
+    worker = partial(
+        leiden_java_worker,
+        network_file=network_file,
+        resolution_parameter=resolution_parameter,
+        tmp_dir=tmp_dir,
+        leiden_path=leiden_path,
+    )
+    if threads > 1:
+        with multiprocessing.Pool(processes=min(threads, iterations)) as pool:
+            outputs = pool.map(worker, tasks)
+    else:
+        outputs = list(map(worker, tasks))
+
+    # Gather the bins of each iteration in a table.
+    output_partition = pd.concat(
+        [
+            pd.read_csv(
+                output, sep="\t", header=None, index_col=0, dtype=np.int32
+            ).iloc[:, 0]
+            for output in outputs
+        ],
+        axis=1,
+        ignore_index=True,
+    )
 
-        output = join(tmp_dir, f"partition_{i}.txt")
+    # Remove isolates (nodes with no contacts):
+    output_partition = output_partition.drop(0)
+    output_partition = remove_isolates(output_partition, network_file)
 
-        # Clusterize the network using Leiden.
-        cmd = (
-            " java -cp {0} nl.cwts.networkanalysis.run.RunNetworkClustering -i 4 -r {1} -w -o {2} -q Modularity -a Leiden {3}"
-        ).format(leiden_path, resolution_parameter, output, network_file)
-        process = sp.Popen(cmd, shell=True, stderr=sp.DEVNULL)
-        process.communicate()
+    return output_partition
 
-        # Save the results in a dictionnary
-        if i == 0:
-            with open(output, "r") as out:
-                for line in out:
-                    result = line.split("\t")
-                    output_partition[int(result[0])] = result[1][:-1]
 
-        else:
-            with open(output, "r") as out:
-                for line in out:
-                    result = line.split("\t")
-                    output_partition[int(result[0])] += ";" + result[1][:-1]
+def leiden_java_worker(
+    task, network_file, resolution_parameter, tmp_dir, leiden_path
+):
+    """Run one iteration of the java implementation of Leiden.
 
-    # Remove isolates (nodes with no contacts):
-    output_partition.pop(0)
-    output_partition = remove_isolates(output_partition, network_file)
+    Parameters:
+    -----------
+    task : tuple
+        Index of the iteration and seed of the random number generator.
+    network_file : str
+        Path to the network computed previously.
+    resolution_parameter : float
+        Resolution parameter for Leiden clustering.
+    tmp_dir : str
+        Path to the temporary directory.
+    leiden_path : str
+        Path to the directory with network analysis java implementation.
 
-    return output_partition
+    Returns:
+    --------
+    str:
+        Path to the output partition of the iteration.
+    """
+    i, seed = task
+    output = join(tmp_dir, f"partition_{i}.txt")
 
+    # Clusterize the network using Leiden.
+    cmd = (
+        " java -cp {0} nl.cwts.networkanalysis.run.RunNetworkClustering -i 4 -r {1} --seed {2} -w -o {3} -q Modularity -a Leiden {4}"
+    ).format(leiden_path, resolution_parameter, seed, output, network_file)
+    process = sp.Popen(cmd, shell=True, stderr=sp.DEVNULL)
+    process.communicate()
+    return output
+
+
+def louvain_cpp_worker(iteration, louvain_args, tmp_dir):
+    """Run one iteration of the cpp original Louvain in its own temporary
+    directory.
 
-def louvain_iterations_cpp(network_file, iterations, tmp_dir, louvain_path):
+    Parameters:
+    -----------
+    iteration : int
+        Index of the iteration.
+    louvain_args : dict
+        Paths of the louvain executables and of the binary network files.
+    tmp_dir : str
+        Path to the temporary directory.
+
+    Returns:
+    --------
+    str:
+        Path to the output partition of the iteration.
+    """
+    iteration_dir = join(tmp_dir, f"iteration_{iteration}")
+    os.makedirs(iteration_dir, exist_ok=True)
+    louvain_args = dict(
+        louvain_args,
+        net_tree=join(iteration_dir, "net_tree"),
+        level_file=join(iteration_dir, "level.txt"),
+        output=join(iteration_dir, "output_louvain_"),
+        iteration=iteration,
+    )
+
+    # Partiotining with weights using louvain and compute the bin tree.
+    cmd = ("{louvain} {net_bin} -l -1 -w {net_weight} > {net_tree}").format(
+        **louvain_args
+    )
+    process = sp.Popen(cmd, shell=True)
+    out, err = process.communicate()
+
+    cmd = ("{hierarchy} {net_tree} > {level_file}").format(**louvain_args)
+    process = sp.Popen(cmd, shell=True)
+    out, err = process.communicate()
+
+    level_file = open(louvain_args["level_file"], "r")
+    louvain_args["level"] = level_file.readlines()[-1][6]
+    level_file.close()
+
+    cmd = (
+        "{hierarchy} {net_tree} -l {level} > {output}{iteration}.txt"
+    ).format(**louvain_args)
+    process = sp.Popen(cmd, shell=True)
+    out, err = process.communicate()
+    return "{output}{iteration}.txt".format(**louvain_args)
+
+
+def louvain_iterations_cpp(
+    network_file, iterations, tmp_dir, louvain_path, threads=1
+):
     """Use the cpp original Louvain to partition the network.
 
     Parameters:
@@ -475,12 +776,14 @@ def louvain_iterations_cpp(network_file, iterations, tmp_dir, louvain_path):
         Path to the temporary directory.
     louvain_path : str
         Path to the directory with louvain functions.
+    threads : int
+        Number of iterations run in parallel. [Default: 1]
 
     Returns:
     --------
-    dict:
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values.
+    pandas.core.frame.DataFrame:
+        Table with the id of the contigs as index and their bin for each
+        iteration as int32 columns.
     """
 
     # Check if louvain cpp is available in the computer. If it's not available
@@ -503,7 +806,6 @@ def louvain_iterations_cpp(network_file, iterations, tmp_dir, louvain_path):
     louvain = join(louvain_path, "louvain")
     convert = join(louvain_path, "convert")
     hierarchy = join(louvain_path, "hierarchy")
-    output_louvain = dict()
 
     # Create dictionnary of all arguments
     louvain_args = {
@@ -528,52 +830,34 @@ def louvain_iterations_cpp(network_file, iterations, tmp_dir, louvain_path):
     process = sp.Popen(cmd, shell=True)
     out, err = process.communicate()
 
-    # Create a dictionary of Louvain labels and original contig id.
-    labels = dict()
-    with open(louvain_args["net_labels"]) as label_file:
-        for label in label_file:
-            label = label.split()
-            labels[label[1]] = int(label[0])
-
-    # Run the iterations of Louvain
-    for i in range(iterations):
-        # logger.info(f"Iteration in progress: {i}")
+    # Create a table of Louvain labels and original contig id.
+    labels = pd.read_csv(
+        louvain_args["net_labels"], sep=" ", header=None, index_col=1
+    ).iloc[:, 0]
 
-        louvain_args["iteration"] = i
-
-        # Partiotining with weights using louvain and compute the bin tree.
-        cmd = ("{louvain} {net_bin} -l -1 -w {net_weight} > {net_tree}").format(
-            **louvain_args
-        )
-        process = sp.Popen(cmd, shell=True)
-        out, err = process.communicate()
-
-        cmd = ("{hierarchy} {net_tree} > {level_file}").format(**louvain_args)
-        process = sp.Popen(cmd, shell=True)
-        out, err = process.communicate()
-
-        level_file = open(level_louvain, "r")
-        louvain_args["level"] = level_file.readlines()[-1][6]
-        level_file.close()
-
-        cmd = (
-            "{hierarchy} {net_tree} -l {level} > {output}{iteration}.txt"
-        ).format(**louvain_args)
-        process = sp.Popen(cmd, shell=True)
-        out, err = process.communicate()
-
-        # Save the results in a dictionnary
-        if i == 0:
-            with open(output + str(i) + ".txt", "r") as out:
-                for line in out:
-                    result = line.split(" ")
-                    output_louvain[labels[result[0]]] = result[1][:-1]
-
-        else:
-            with open(output + str(i) + ".txt", "r") as out:
-                for line in out:
-                    result = line.split(" ")
-                    output_louvain[labels[result[0]]] += ";" + result[1][:-1]
+    # Run the iterations of Louvain. The louvain executable draws its own seed
+    # from the time and its process id.
+    worker = partial(
+        louvain_cpp_worker, louvain_args=louvain_args, tmp_dir=tmp_dir
+    )
+    if threads > 1:
+        with multiprocessing.Pool(processes=min(threads, iterations)) as pool:
+            outputs = pool.map(worker, range(iterations))
+    else:
+        outputs = list(map(worker, range(iterations)))
+
+    # Gather the bins of each iteration in a table.
+    output_louvain = pd.concat(
+        [
+            pd.read_csv(
+                output, sep=" ", header=None, index_col=0, dtype=np.int32
+            ).iloc[:, 0]
+            for output in outputs
+        ],
+        axis=1,
+        ignore_index=True,
+    )
+    output_louvain.index = labels.loc[output_louvain.index].values
 
     return output_louvain
 
@@ -599,7 +883,9 @@ def partition(
     Parameters:
     -----------
     algorithm : str
-        Algorithm to use to partition the network. Either leiden or louvain.
+        Algorithm to use to partition the network. Either leiden or louvain
+        with the external implementations, or leiden_igraph or louvain_igraph
+        to run them in process with igraph.
     assembly : str
         Path to the assembly file used for the partition.
     cluster_matrix : bool
@@ -609,7 +895,8 @@ def partition(
     iterations : int
         Number of iterations to use for the partition.
     network_file : str
-        Path to the network file.
+        Path to the network file, either the edge list or its binary npz
+        version.
     outdir : str
         Path to the output directory where to write the output files.
     fasta_dir : str
@@ -647,6 +934,12 @@ def partition(
     temp_directory_bins = join(temp_directory, "partition_bins")
     os.makedirs(temp_directory_bins, exist_ok=True)
 
+    # The external partition tools need the network as an edge list.
+    if network_file.endswith(".npz") and algorithm in ["louvain", "leiden"]:
+        network_txt = join(temp_directory, "network.txt")
+        mio.write_network_txt(*mio.read_network(network_file), network_txt)
+        network_file = network_txt
+
     # Perform the iterations of Louvain or Leiden to partition the network.
     logger.info("Start iterations:")
     if algorithm == "leiden":
@@ -657,14 +950,29 @@ def partition(
             resolution_parameter,
             temp_directory_clustering,
             LEIDEN_PATH,
+            threads,
         )
     elif algorithm == "louvain":
         LOUVAIN_PATH = os.environ["LOUVAIN_PATH"]
         output_partition = louvain_iterations_cpp(
-            network_file, iterations, temp_directory_clustering, LOUVAIN_PATH,
+            network_file,
+            iterations,
+            temp_directory_clustering,
+            LOUVAIN_PATH,
+            threads,
+        )
+    elif algorithm in ["louvain_igraph", "leiden_igraph"]:
+        output_partition = igraph_iterations(
+            network_file,
+            iterations,
+            algorithm.split("_")[0],
+            resolution_parameter,
+            threads,
         )
     else:
-        logger.error('algorithm should be either "louvain" or "leiden"')
+        logger.error(
+            'algorithm should be either "louvain", "leiden", "louvain_igraph" or "leiden_igraph"'
+        )
         raise ValueError
 
     # Detect core bins
@@ -675,7 +983,11 @@ def partition(
 
     # Compute the Hamming distance between core bins.
     logger.info("Detect overlapping bins:")
-    hamming_distance = get_hamming_distance(core_bins_iterations, threads,)
+    # The clustering matrix needs all the distances.
+    threshold = 0 if cluster_matrix else overlapping_parameter
+    hamming_distance = get_hamming_distance(
+        core_bins_iterations, threads, threshold
+    )
 
     # Defined overlapping bins according to the threshold
     overlapping_bins = defined_overlapping_bins(
@@ -721,30 +1033,24 @@ def remove_isolates(output_partition, network_file):
 
     Parameters:
     -----------
-    output_partition : dict
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values.
+    output_partition : pandas.core.frame.DataFrame
+        Table with the id of the contigs as index and their bin for each
+        iteration as columns.
     network_file : str
         Path to the network computed previously. The file is 3 columns table
         separated by a tabulation with the id of the first contigs the id of the
-        second one and the weights of the edge normalized or not.
+        second one and the weights of the edge normalized or not, or its binary
+        npz version.
 
     Returns:
     --------
-    dict:
-        Dictionnary with the id of the contig as key and the list of the results
-        of each iterations separated by a semicolon as values without isolates.
+    pandas.core.frame.DataFrame:
+        Table with the id of the contigs as index and their bin for each
+        iteration as columns without isolates.
     """
-    nodes_presents = []
-    with open(network_file, "r") as network:
-        for line in network:
-            line = line.split("\t")
-            nodes_presents.append(int(line[0]))
-            nodes_presents.append(int(line[1]))
-    for i in range(1, max(nodes_presents)):
-        if i not in nodes_presents:
-            output_partition.pop(i)
-    return output_partition
+    edges, _ = mio.read_network(network_file)
+    nodes_presents = np.unique(edges)
+    return output_partition[output_partition.index.isin(nodes_presents)]
 
 
 def update_contigs_data(
@@ -20,6 +20,7 @@ import hicstuff.io as hio
 import metator.figures as mtf
 import metator.io as mio
 import numpy as np
+import pandas as pd
 import pypairix
 from Bio import SeqIO
 from metator.log import logger
@@ -68,7 +69,9 @@ def extract_pairs(pairs_files, out_file, contigs, contigs_data):
     Parameters
     ----------
     pairs_files : List of str
-        List of path to pairs files. The can have a pypairix index or not.
+        List of path to pairs files. The can have a pypairix index or not. They
+        could be compact pairs files (".pairs.npz") too, their read names are
+        written as ".".
     out_file : str
         Path where to write the ouput file.
     contigs : List of str
@@ -93,6 +96,29 @@ def extract_pairs(pairs_files, out_file, contigs, contigs_data):
                 )
             )
         for pairs_file in pairs_files:
+            # Compact pairs files are read by chunks of contigs ids.
+            if pairs_file.endswith(".npz"):
+                columns = [
+                    "readID",
+                    "chr1",
+                    "pos1",
+                    "chr2",
+                    "pos2",
+                    "strand1",
+                    "strand2",
+                ]
+                contigs_index = pd.Index(contigs)
+                for chunk in mio.read_pairs(pairs_file, columns=columns):
+                    mask = np.ones(len(chunk), dtype=bool)
+                    for chrom in ["chr1", "chr2"]:
+                        categories = chunk[chrom].cat.categories
+                        in_contigs = contigs_index.get_indexer(categories) >= 0
+                        mask &= in_contigs[chunk[chrom].cat.codes.values]
+                    n_pairs += int(np.sum(mask))
+                    chunk[mask].to_csv(
+                        output_pairs, sep="\t", header=False, index=False
+                    )
+                continue
             pairs_data = mio.get_pairs_data(pairs_file)
             for contig_id1, contig1 in enumerate(contigs):
                 # Only need to retrieve the upper triangle.
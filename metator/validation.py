@@ -514,6 +514,7 @@ def recursive_clustering(
                 iterations=iterations,
                 resolution_parameter=resolution_parameter,
                 contigs_data=contigs_data,
+                threads=threads,
             ),
             bin_ids,
         )
@@ -531,8 +532,10 @@ def recursive_clustering(
         ) = mtp.detect_core_bins(output_partition, iterations)
 
         # Compute the Hamming distance between core bins.
+        # The clustering matrix needs all the distances.
+        threshold = 0 if cluster_matrix > 0 else overlapping_parameter
         hamming_distance = mtp.get_hamming_distance(
-            recursive_bins_iterations, threads,
+            recursive_bins_iterations, threads, threshold
         )
 
         # Defined overlapping bins according to the threshold
@@ -585,6 +588,7 @@ def recursive_clustering_worker(
     iterations,
     resolution_parameter,
     contigs_data,
+    threads=1,
 ):
     """Worker to partition one bin if it's contaminated.
 
@@ -606,6 +610,8 @@ def recursive_clustering_worker(
         Resolution parameter of Leiden algorithm.
     contigs_data_file : str
         Path to the contigs data file from metator partition.
+    threads : int
+        Number of iterations run in parallel. [Default: 1]
     """
     # Create temporary folders.
     tmpdir_subnetwork = join(tmpdir, "recursive_bins", bin_id)
@@ -644,6 +650,7 @@ def recursive_clustering_worker(
         resolution_parameter,
         tmpdir_clustering,
         spin,
+        threads,
     )
     logger.info("Output partition done for {0}.".format(bin_id))
 
@@ -689,7 +696,8 @@ def recursive_decontamination(
     iterations : int
         Number of iterations to use for the recursive partition.
     network_file : str
-        Path to the network file.
+        Path to the network file, either the edge list or its binary npz
+        version.
     outdir : str
         Path to the output directory where to write the output files.
     overlapping_parameter : int
@@ -735,9 +743,7 @@ def recursive_decontamination(
     )
 
     # Load network:
-    network = nx.read_edgelist(
-        network_file, nodetype=int, data=(("weight", float),)
-    )
+    network = mio.import_network(network_file)
 
     # Load contigs data:
     contigs_data = pd.read_csv(
@@ -1,26 +1,254 @@
 # Test for align module
 
+import metator.align as mta
+import metator.io as mio
+import metator.network as mtn
+import os
+import pysam
 import pytest
+import shutil
 
 assembly = "tests_data/assembly.fa"
 
 
+def write_bam(bam_file, reads):
+    """Write a name sorted BAM file from (name, contig, start, flag, mapq)."""
+    header = {
+        "HD": {"VN": "1.0", "SO": "queryname"},
+        "SQ": [
+            {"SN": "NODE_522", "LN": 22786},
+            {"SN": "NODE_1404", "LN": 15000},
+        ],
+    }
+    with pysam.AlignmentFile(bam_file, "wb", header=header) as bam:
+        for name, contig, start, flag, mapq in reads:
+            read = pysam.AlignedSegment()
+            read.query_name = name
+            read.query_sequence = "A" * 10
+            read.cigarstring = "10M"
+            read.flag = flag
+            read.reference_id = 0 if contig == "NODE_522" else 1
+            read.reference_start = start
+            read.mapping_quality = mapq
+            bam.write(read)
+
+
 def test_align():
     # Not tested here as it's tested in the commands tests.
     ...
 
 
-def test_get_contact_pairs():
+def test_align_chunks():
+    # Not tested here as it needs the aligners.
     ...
 
 
-def test_merge_alignement():
+def test_align_pairs():
+    # Not tested here as it needs the aligners.
     ...
 
 
-def test_process_bamfile():
+def test_align_to_pairs():
+    # Not tested here as it needs the aligners.
     ...
 
 
+@pytest.mark.parametrize("threads", [1, 2, 2 * mta.ALIGNER_THREADS])
+@pytest.mark.parametrize("compact", [False, True])
+def test_get_contact_pairs(threads, compact):
+    # The libraries are processed one after the other with a single slot (1
+    # or 2 threads, with the sort done before or during the next library) or
+    # in two parallel slots.
+    tmp_dir = f"tmp_align_contact_{threads}_{compact}"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for_list, rev_list = [], []
+    # Library i has i + 1 pairs to check the order of the output files.
+    for i in range(3):
+        for_bam = os.path.join(tmp_dir, f"for_{i}.bam")
+        rev_bam = os.path.join(tmp_dir, f"rev_{i}.bam")
+        names = [f"read{j}" for j in range(1, i + 2)]
+        write_bam(
+            for_bam, [(name, "NODE_522", 100, 0, 40) for name in names]
+        )
+        write_bam(
+            rev_bam, [(name, "NODE_1404", 50, 16, 40) for name in names]
+        )
+        for_list.append(for_bam)
+        rev_list.append(rev_bam)
+    out_files, _, _ = mta.get_contact_pairs(
+        ",".join(for_list),
+        ",".join(rev_list),
+        None,
+        assembly,
+        "bowtie2",
+        "normal",
+        30,
+        "bam",
+        None,
+        None,
+        tmp_dir,
+        tmp_dir,
+        threads,
+        compact=compact,
+    )
+    if compact:
+        expected = [
+            os.path.join(tmp_dir, f"alignment_{i}.pairs.npz") for i in range(3)
+        ]
+        read_pairs = mio.read_pairs_npz
+    else:
+        expected = [
+            os.path.join(tmp_dir, f"alignment_{i}_sorted.pairs.gz")
+            for i in range(3)
+        ]
+        read_pairs = mio.read_pairs
+    n_pairs = [
+        sum(len(chunk) for chunk in read_pairs(out_file))
+        for out_file in out_files
+    ]
+    shutil.rmtree(tmp_dir)
+    assert out_files == expected
+    assert n_pairs == [1, 2, 3]
+
+
+def test_get_read_name_key():
+    # Order given by samtools sort -n.
+    names = [
+        "read!",
+        "read01a",
+        "read1",
+        "read1:2",
+        "read1:10",
+        "read1a",
+        "read2",
+        "read10",
+        "readA",
+    ]
+    assert sorted(names[::-1], key=mta.get_read_name_key) == names
+
+
+def test_merge_alignement():
+    tmp_dir = "tmp_align_merge"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for_bam = os.path.join(tmp_dir, "for.bam")
+    rev_bam = os.path.join(tmp_dir, "rev.bam")
+    out_file = os.path.join(tmp_dir, "alignment.pairs")
+    write_bam(
+        for_bam,
+        [
+            ("read2", "NODE_522", 100, 0, 40),
+            ("read10", "NODE_1404", 50, 16, 40),
+            ("read11", "NODE_1404", 10, 0, 40),
+        ],
+    )
+    write_bam(
+        rev_bam,
+        [
+            ("read1", "NODE_1404", 20, 0, 40),
+            ("read2", "NODE_522", 10, 16, 40),
+            ("read10", "NODE_522", 30, 0, 40),
+            ("read12", "NODE_1404", 30, 0, 40),
+        ],
+    )
+    contig_data, _ = mtn.create_contig_data(assembly)
+    n_pairs, aligned_for, aligned_rev = mta.merge_alignment(
+        mta.process_bamfile(for_bam, 30),
+        mta.process_bamfile(rev_bam, 30),
+        contig_data,
+        out_file,
+    )
+    with open(out_file) as pairs:
+        lines = [line for line in pairs if not line.startswith("#")]
+    shutil.rmtree(tmp_dir)
+    assert (n_pairs, aligned_for, aligned_rev) == (2, 3, 4)
+    assert lines == [
+        "read2\tNODE_522\t11\tNODE_522\t101\t-\t+\n",
+        "read10\tNODE_522\t31\tNODE_1404\t51\t+\t-\n",
+    ]
+
+
+def test_merge_ordered_alignment():
+    tmp_dir = "tmp_align_ordered"
+    os.makedirs(tmp_dir, exist_ok=True)
+    for_bam = os.path.join(tmp_dir, "for.bam")
+    rev_bam = os.path.join(tmp_dir, "rev.bam")
+    out_file = os.path.join(tmp_dir, "alignment.pairs")
+    # Same reads in the same unsorted order, the unaligned reads included.
+    write_bam(
+        for_bam,
+        [
+            ("read10", "NODE_1404", 50, 16, 40),
+            ("read2", "NODE_522", 100, 0, 40),
+            ("read11", "NODE_1404", 10, 4, 0),
+        ],
+    )
+    write_bam(
+        rev_bam,
+        [
+            ("read10", "NODE_522", 30, 0, 40),
+            ("read2", "NODE_522", 10, 16, 40),
+            ("read11", "NODE_1404", 30, 0, 40),
+        ],
+    )
+    contig_data, _ = mtn.create_contig_data(assembly)
+    with pysam.AlignmentFile(for_bam, "rb") as for_alignment:
+        with pysam.AlignmentFile(rev_bam, "rb") as rev_alignment:
+            n_pairs, aligned_for, aligned_rev = mta.merge_ordered_alignment(
+                for_alignment, rev_alignment, 30, contig_data, out_file
+            )
+    with open(out_file) as pairs:
+        lines = [line for line in pairs if not line.startswith("#")]
+    shutil.rmtree(tmp_dir)
+    assert (n_pairs, aligned_for, aligned_rev) == (2, 2, 3)
+    assert lines == [
+        "read10\tNODE_522\t31\tNODE_1404\t51\t+\t-\n",
+        "read2\tNODE_522\t11\tNODE_522\t101\t-\t+\n",
+    ]
+
+
+def test_process_bamfile():
+    tmp_dir = "tmp_align_process"
+    os.makedirs(tmp_dir, exist_ok=True)
+    bam_file = os.path.join(tmp_dir, "for.bam")
+    write_bam(
+        bam_file,
+        [
+            ("read1", "NODE_522", 100, 0, 40),
+            ("read2", "NODE_1404", 50, 16, 40),
+            ("read3", "NODE_1404", 10, 0, 10),
+            ("read4", "NODE_1404", 10, 256, 40),
+        ],
+    )
+    reads = list(mta.process_bamfile(bam_file, 30))
+    shutil.rmtree(tmp_dir)
+    assert reads == [
+        ("read1", "NODE_522", 100, "+"),
+        ("read2", "NODE_1404", 50, "-"),
+    ]
+
+
 def test_process_bwa_bamfile():
     ...
+
+
+def test_stream_bamfile():
+    tmp_dir = "tmp_align_stream"
+    os.makedirs(tmp_dir, exist_ok=True)
+    bam_file = os.path.join(tmp_dir, "for.bam")
+    write_bam(
+        bam_file,
+        [
+            ("read1", "NODE_522", 100, 0, 40),
+            ("read2", "NODE_1404", 50, 16, 40),
+            ("read3", "NODE_1404", 10, 0, 10),
+            ("read4", "NODE_1404", 20, 0, 40),
+        ],
+    )
+    reads = list(mta.stream_bamfile(bam_file, 30, threads=2, chunk_size=2))
+    expected = list(mta.process_bamfile(bam_file, 30))
+    shutil.rmtree(tmp_dir)
+    assert reads == expected
+    assert len(reads) == 3
+    # The errors of the worker are raised in the main process.
+    with pytest.raises(OSError):
+        list(mta.stream_bamfile(bam_file, 30))
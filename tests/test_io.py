@@ -1,6 +1,7 @@
 # Test for io module.
 
 import metator.io as mio
+import pandas as pd
 import pypairix
 import pytest
 import os
@@ -29,10 +30,29 @@ def test_check_pairix():
     assert test
 
 
-def test_check_pairtools():
-    test = mio.check_pairtools()
-    assert test
-    
+def test_compare_versions():
+    # Order of GNU sort -V, which differs from a split in digit and non-digit
+    # parts for the "~", the suffixes, the dots and the non-letters.
+    expected = [
+        ".hidden",
+        "NODE_2~rc",
+        "NODE_2",
+        "NODE_2.fa",
+        "NODE_2a",
+        "NODE_10",
+        "a~",
+        "a",
+        "a.b",
+        "a.tar",
+        "a.tar.gz",
+        "a1",
+        "ab",
+        "a_",
+    ]
+    assert sorted(expected[::-1], key=mio.get_natural_key) == expected
+    assert mio.compare_versions("NODE_02", "NODE_2") == 0
+    assert mio.compare_versions("NODE_2", "NODE_10") < 0
+
 
 def test_generate_fasta_index():
     ...
@@ -46,10 +66,55 @@ def test_get_restriction_site():
     ...
 
 
+def test_get_fasta_ranges():
+    fasta = "tests_data/assembly.fa"
+    ranges = mio.get_fasta_ranges(fasta, range_size=50_000)
+    assert len(ranges) > 1
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == os.path.getsize(fasta)
+    # Ranges start on a record.
+    with open(fasta, "rb") as f:
+        for start, _ in ranges:
+            f.seek(start)
+            assert f.read(1) == b">"
+
+
 def test_get_pairs():
     ...
 
 
+def test_get_pairs_ranges():
+    pairfile = "tests_data/outdir/alignment.pairs"
+    ranges = mio.get_pairs_ranges(pairfile, range_size=100_000)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == os.path.getsize(pairfile)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    # Case of a bgzip file: the ranges start at the beginning of the blocks.
+    pairfile = "tests_data/outdir/alignment_sorted.pairs.gz"
+    ranges = mio.get_pairs_ranges(pairfile, range_size=100_000)
+    assert len(ranges) > 1
+    assert ranges[-1][1] == os.path.getsize(pairfile)
+
+
+def test_pairs_to_npz():
+    pairfile = "tests_data/outdir/alignment.pairs"
+    tmp_dir = "tmp_io_npz"
+    os.makedirs(tmp_dir, exist_ok=True)
+    test_file = os.path.join(tmp_dir, "test.pairs")
+    shutil.copyfile(pairfile, test_file)
+    npz_file = mio.pairs_to_npz(test_file, chunk_size=10_000, remove=True)
+    removed = not os.path.exists(test_file)
+    columns = ["chr1", "pos1", "chr2", "pos2", "strand1", "strand2"]
+    pairs = pd.concat(mio.read_pairs(pairfile, columns=columns))
+    pairs_npz = pd.concat(mio.read_pairs(npz_file, columns=columns))
+    shutil.rmtree(tmp_dir)
+    assert npz_file == test_file + ".npz"
+    assert removed
+    assert len(pairs_npz) == 41563
+    assert (pairs_npz.astype(str).values == pairs.astype(str).values).all()
+
+
 def test_process_ligation_sites():
     ...
 
@@ -66,6 +131,93 @@ def test_read_contig_data():
     ...
 
 
+def test_read_contigs_stats_cache():
+    tmp_dir = "tmp_io_cache"
+    os.makedirs(tmp_dir, exist_ok=True)
+    assembly = os.path.join(tmp_dir, "assembly.fa")
+    shutil.copyfile("tests_data/assembly.fa", assembly)
+    assert mio.read_contigs_stats_cache(assembly, "GATC") is None
+    mio.write_contigs_stats_cache(
+        assembly, "GATC", ["NODE_1", "NODE_2"], [10, 20], [0.5, 0.4], [1, 3]
+    )
+    names, lengths, GCs, RS = mio.read_contigs_stats_cache(assembly, "GATC")
+    # The cache is not valid for another enzyme or a modified assembly.
+    other_enzyme = mio.read_contigs_stats_cache(assembly, "GA.TC")
+    with open(assembly, "a") as fasta:
+        fasta.write(">NODE_3\nACGT\n")
+    modified = mio.read_contigs_stats_cache(assembly, "GATC")
+    shutil.rmtree(tmp_dir)
+    assert names == ["NODE_1", "NODE_2"]
+    assert list(lengths) == [10, 20]
+    assert list(GCs) == [0.5, 0.4]
+    assert list(RS) == [1, 3]
+    assert other_enzyme is None
+    assert modified is None
+
+
+def test_read_fasta_range():
+    fasta = "tests_data/assembly.fa"
+    records = [
+        record
+        for start, end in mio.get_fasta_ranges(fasta, range_size=50_000)
+        for record in mio.read_fasta_range(fasta, start, end)
+    ]
+    assert len(records) == 1219
+    assert records[0][0] == "NODE_522"
+    assert len(records[0][1]) == 22786
+
+
+def test_read_network():
+    network_file = "tests_data/outdir/network.txt"
+    edges, weights = mio.read_network(network_file)
+    assert edges.shape == (len(weights), 2)
+    assert list(edges[0]) == [1, 2]
+
+
+def test_read_pairs():
+    pairfile = "tests_data/outdir/alignment.pairs"
+    chunks = list(mio.read_pairs(pairfile, chunk_size=10_000))
+    assert len(chunks) == 5
+    assert sum(len(chunk) for chunk in chunks) == 41563
+    assert list(chunks[0].columns) == ["chr1", "pos1", "chr2", "pos2"]
+    assert chunks[0].iloc[0, 0] == "NODE_40511"
+    assert chunks[0].iloc[0, 3] == 322
+    chunk = next(mio.read_pairs(pairfile, columns=["readID", "strand1"]))
+    assert chunk.iloc[1, 0] == "H9:1:HGJYYBBXY:7:1101:2108:15381"
+
+
+def test_read_pairs_npz():
+    pairfile = "tests_data/outdir/alignment.pairs"
+    tmp_dir = "tmp_io_read_npz"
+    os.makedirs(tmp_dir, exist_ok=True)
+    npz_file = os.path.join(tmp_dir, "alignment.pairs.npz")
+    mio.pairs_to_npz(pairfile, npz_file)
+    chunks = list(mio.read_pairs(npz_file, chunk_size=10_000))
+    chunk = next(mio.read_pairs(npz_file, columns=["readID", "strand1"]))
+    shutil.rmtree(tmp_dir)
+    assert len(chunks) == 5
+    assert sum(len(chunk) for chunk in chunks) == 41563
+    assert list(chunks[0].columns) == ["chr1", "pos1", "chr2", "pos2"]
+    assert chunks[0].iloc[0, 0] == "NODE_40511"
+    assert chunks[0].iloc[0, 3] == 322
+    # Read names are not stored.
+    assert chunk.iloc[1, 0] == "."
+
+
+def test_read_pairs_range():
+    # Concatenated ranges should give back the whole file.
+    for pairfile in [
+        "tests_data/outdir/alignment.pairs",
+        "tests_data/outdir/alignment_sorted.pairs.gz",
+    ]:
+        ranges = mio.get_pairs_ranges(pairfile, range_size=100_000)
+        content = b"".join(
+            mio.read_pairs_range(pairfile, start, end) for start, end in ranges
+        )
+        with mio.read_compressed(pairfile) as pairs:
+            assert content.decode() == pairs.read()
+
+
 def test_read_results_checkm():
     ...
 
@@ -75,7 +227,49 @@ def test_retrieve_fasta():
 
 
 def test_sort_pairs():
-    ...
+    pairfile = "tests_data/outdir/alignment.pairs"
+    tmp_dir = "tmp_io_sort"
+    os.makedirs(tmp_dir, exist_ok=True)
+    out_file = os.path.join(tmp_dir, "sorted.pairs")
+    keys = ((1, str), (3, str), (2, int), (4, int))
+    # Small buffer to merge several sorted runs.
+    mio.sort_pairs(pairfile, out_file, tmp_dir, threads=2, buffer="200K", keys=keys)
+    with open(out_file) as pairs:
+        lines = pairs.readlines()
+    remaining = os.listdir(tmp_dir)
+    shutil.rmtree(tmp_dir)
+    with open(pairfile) as pairs:
+        expected = [line for line in pairs if not line.startswith("#")]
+
+    def key(line):
+        fields = line.split("\t")
+        return fields[1], fields[3], int(fields[2]), int(fields[4])
+
+    assert remaining == ["sorted.pairs"]
+    assert sorted(lines) == sorted(expected)
+    assert [key(line) for line in lines] == sorted(map(key, expected))
+
+
+def test_sort_pairs_file():
+    pairfile = "tests_data/outdir/alignment.pairs"
+    tmp_dir = "tmp_io_dedup"
+    os.makedirs(tmp_dir, exist_ok=True)
+    # Duplicate the first pairs with another read name.
+    dup_file = os.path.join(tmp_dir, "dup.pairs")
+    with open(pairfile) as pairs, open(dup_file, "w") as dup:
+        lines = pairs.readlines()
+        body = [line for line in lines if not line.startswith("#")]
+        dup.writelines(lines)
+        dup.writelines("dup" + line for line in body[:100])
+    out_file = os.path.join(tmp_dir, "dedup.pairs")
+    n_duplicates = mio.sort_pairs_file(dup_file, out_file, dedup=True)
+    with open(out_file) as pairs:
+        header = [line for line in pairs if line.startswith("#")]
+    n_pairs = sum(len(chunk) for chunk in mio.read_pairs(out_file))
+    shutil.rmtree(tmp_dir)
+    assert header[1] == "#sorted: chr1-chr2-pos1-pos2\n"
+    assert n_duplicates == 5776 + 100
+    assert n_pairs == len(body) - 5776
 
 
 def test_sort_pairs_pairtools():
@@ -89,5 +283,40 @@ def test_sort_pairs_pairtools():
     shutil.rmtree(tmp_dir)    
 
 
+def test_split_fastq():
+    tmp_dir = "tmp_io_split"
+    os.makedirs(tmp_dir, exist_ok=True)
+    fastq = os.path.join(tmp_dir, "reads.fq")
+    with open(fastq, "w") as reads:
+        for i in range(10):
+            reads.write(f"@read{i}\nACGT\n+\nIIII\n")
+    chunks = mio.split_fastq(fastq, 3, os.path.join(tmp_dir, "for"), 2)
+    names = []
+    for chunk in chunks:
+        with mio.read_compressed(chunk) as reads:
+            names.append([line.strip() for line in reads][::4])
+    shutil.rmtree(tmp_dir)
+    assert len(chunks) == 3
+    assert names == [
+        ["@read0", "@read1", "@read6", "@read7"],
+        ["@read2", "@read3", "@read8", "@read9"],
+        ["@read4", "@read5"],
+    ]
+
+
 def test_write_bin_summary():
     ...
+
+
+def test_write_network_npz():
+    network_file = "tests_data/outdir/network.txt"
+    npz_file = "tests_data/network.npz"
+    edges, weights = mio.read_network(network_file)
+    mio.write_network_npz(edges, weights, npz_file, 1219)
+    edges_npz, weights_npz = mio.read_network(npz_file)
+    network = mio.import_network(npz_file)
+    os.remove(npz_file)
+    assert (edges_npz == edges).all()
+    assert weights_npz.dtype == "float32"
+    assert abs(weights_npz - weights).max() < 1e-3
+    assert network.number_of_edges() == len(edges)
@@ -2,6 +2,7 @@
 
 import metator.io as mio
 import metator.network as mtn
+import numpy as np
 import pandas as pd
 import pytest
 import os
@@ -72,9 +73,49 @@ def test_alignment_to_contacts():
         "empirical_hit",
         True,
     )
+    # The binary network should have the same edges as the text one.
+    edges, _ = mio.read_network(join(tmp_dir, "network.txt"))
+    edges_npz, _ = mio.read_network(join(tmp_dir, "network.npz"))
+    assert (edges == edges_npz).all()
     shutil.rmtree(tmp_dir)
 
 
+def test_alignment_to_contacts_sort():
+    # The sort aggregation should give the same networks as the memory one,
+    # written in the order of the contigs names instead of their ids.
+    tmp_dir = "tmp_network_sort"
+    networks = ["network.txt", "network_0.txt", "network_1.txt"]
+    lines = {}
+    for aggregation in ["memory", "sort"]:
+        out_dir = join(tmp_dir, aggregation)
+        os.makedirs(out_dir, exist_ok=True)
+        contig_data, hit_data = mtn.create_contig_data(assembly, nb_alignment=2)
+        mtn.alignment_to_contacts(
+            [alignment_file, alignment_file],
+            contig_data,
+            0,
+            hit_data,
+            out_dir,
+            "network.txt",
+            "contig_data_network.txt",
+            out_dir,
+            1,
+            "empirical_hit",
+            False,
+            aggregation=aggregation,
+        )
+        for network in networks:
+            with open(join(out_dir, network)) as net:
+                lines[aggregation, network] = sorted(net)
+    shutil.rmtree(tmp_dir)
+    for network in networks:
+        assert lines["sort", network] == lines["memory", network]
+    # No duplicated edges.
+    assert len(set(lines["sort", "network.txt"])) == len(
+        lines["sort", "network.txt"]
+    )
+
+
 def test_compute_network():
     # Test computing network.
     tmp_dir = "tmp_network"
@@ -104,22 +145,113 @@ def test_compute_network():
     alpha = pd.read_csv(tmp_file_sor, sep="\t", header=None).iloc[0, 1]
     beta = pd.read_csv(tmp_file_net, sep="\t", header=None).iloc[62, :]
     assert alpha == "NODE_1404"
-    # assert (beta == [1, 105, 8]).all()
-    # Case with normalization.
+    assert (beta == [1, 105, 8]).all()
+    # Case with normalization. The sorted pairs are appended to the output
+    # file, which should be a new one.
     mtn.compute_network(
         tmp_file_pre,
         tmp_file_net,
         contig_data,
         tmp_dir,
-        tmp_file_sor,
+        join(tmp_dir, "prenetwork_sorted_length.txt"),
         8,
         "length",
     )
     beta = pd.read_csv(tmp_file_net, sep="\t", header=None).iloc[62, 2]
-    assert beta == pytest.approx(23.33, abs=1e-2)
+    assert beta == pytest.approx(157.95, abs=1e-2)
     shutil.rmtree(tmp_dir)
 
 
+def test_contig_table():
+    # Test the columnar contig data and its dictionnary-like views.
+    contig_table = mtn.ContigTable(
+        ["NODE_1", "NODE_6"], [642311, 505338], [38.7, 53.0], RS=[1, 2505]
+    )
+    assert len(contig_table) == 2
+    assert list(contig_table) == ["NODE_1", "NODE_6"]
+    assert "NODE_6" in contig_table
+    assert contig_table.get_id("NODE_6") == 2
+    assert contig_table["NODE_6"] == {
+        "id": 2,
+        "length": 505338,
+        "GC": 53.0,
+        "hit": 0,
+        "coverage": "-",
+        "RS": 2505,
+    }
+    # Views write back in the columns.
+    contig_table["NODE_6"]["hit"] += 3
+    assert list(contig_table.column("hit")) == [0, 0, 3]
+    assert list(contig_table.records())[1] == (
+        "NODE_6",
+        2,
+        505338,
+        53.0,
+        3,
+        "-",
+        2505,
+    )
+    with pytest.raises(ValueError):
+        contig_table.column("coverage")
+    with pytest.raises(KeyError):
+        contig_table["NODE_8"]
+
+
+def test_count_contacts():
+    # Test in memory contacts counting.
+    contig_data, hit_data = mtn.create_contig_data(assembly, nb_alignment=1)
+    contig_data, edges, counts = mtn.count_contacts(
+        [alignment_file], contig_data, 2500, hit_data
+    )
+    assert contig_data["NODE_522"]["hit"] == 1288
+    assert counts.shape == (len(edges), 1)
+    assert counts.sum() == 110
+    assert (edges[:, 0] < edges[:, 1]).all()
+    # Case of multiple files with self contacts read by small chunks.
+    contig_data, hit_data = mtn.create_contig_data(assembly, nb_alignment=2)
+    contig_data, edges, counts = mtn.count_contacts(
+        [alignment_file, alignment_file],
+        contig_data,
+        0,
+        hit_data,
+        True,
+        chunk_size=10_000,
+    )
+    assert contig_data["NODE_522"]["hit"] == 2576
+    assert hit_data["NODE_522"]["hit"] == [1288, 1288]
+    assert counts.shape == (len(edges), 2)
+    assert counts.sum() == 2 * 41563
+    assert (counts[:, 0] == counts[:, 1]).all()
+    assert list(edges[0]) == [1, 1]
+    # Case of files read by ranges in parallel.
+    contig_data, hit_data = mtn.create_contig_data(assembly, nb_alignment=2)
+    contig_data, edges_par, counts_par = mtn.count_contacts(
+        [alignment_file, alignment_file],
+        contig_data,
+        0,
+        hit_data,
+        True,
+        threads=2,
+        range_size=100_000,
+    )
+    assert hit_data["NODE_522"]["hit"] == [1288, 1288]
+    assert (edges_par == edges).all()
+    assert (counts_par == counts).all()
+    # Case of contacts counted by small batches.
+    contig_data, hit_data = mtn.create_contig_data(assembly, nb_alignment=2)
+    contig_data, edges_flush, counts_flush = mtn.count_contacts(
+        [alignment_file, alignment_file],
+        contig_data,
+        0,
+        hit_data,
+        True,
+        chunk_size=10_000,
+        flush_size=1000,
+    )
+    assert (edges_flush == edges).all()
+    assert (counts_flush == counts).all()
+
+
 def test_create_contig_data():
     # Test contig data builder.
     # Case without depth file.
@@ -148,6 +280,122 @@ def test_create_contig_data():
         "RS": 162,
     }
     assert hit_data == None
+    # Case with the cache of the contigs statistics.
+    tmp_dir = "tmp_network_cache"
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_assembly = join(tmp_dir, "assembly.fa")
+    shutil.copyfile(assembly, tmp_assembly)
+    mtn.create_contig_data(tmp_assembly, 1, depth_file, "DpnII", cache=True)
+    assert os.path.isfile(tmp_assembly + ".metator_stats.npz")
+    cached_data, _ = mtn.create_contig_data(
+        tmp_assembly, 1, depth_file, "DpnII", cache=True
+    )
+    shutil.rmtree(tmp_dir)
+    assert (cached_data.RS == contig_data.RS).all()
+    assert (cached_data.GC == contig_data.GC).all()
+    assert list(cached_data) == list(contig_data)
+
+
+def test_get_contigs_stats():
+    # Test the contigs statistics of a range of the assembly.
+    byte_range = (0, os.path.getsize(assembly))
+    names, lengths, GCs, RS = mtn.get_contigs_stats(byte_range, assembly)
+    assert len(names) == 1219
+    assert names[0] == "NODE_522"
+    assert lengths[0] == 22786
+    assert GCs[0] == pytest.approx(62.08, abs=1e-2)
+    assert RS == []
+    _, _, _, RS = mtn.get_contigs_stats(byte_range, assembly, "GATC")
+    assert RS[0] == 162
+
+
+def test_merge_previous_network():
+    # Test that updating a network with a new library gives the same network
+    # as building it from the two libraries at once.
+    tmp_dir = "tmp_network_update"
+    for out_dir, libraries, previous_dir in [
+        ("all", [alignment_file, alignment_file], None),
+        ("first", [alignment_file], None),
+        ("update", [alignment_file], join(tmp_dir, "first")),
+    ]:
+        out_dir = join(tmp_dir, out_dir)
+        os.makedirs(out_dir, exist_ok=True)
+        contig_data, hit_data = mtn.create_contig_data(
+            assembly, len(libraries)
+        )
+        mtn.alignment_to_contacts(
+            libraries,
+            contig_data,
+            0,
+            hit_data,
+            out_dir,
+            "network.txt",
+            "contig_data_network.txt",
+            out_dir,
+            1,
+            "empirical_hit",
+            False,
+            previous_dir=previous_dir,
+        )
+    outputs = ["network.txt", "network_raw.npz", "hit_data_alignment.txt"]
+    for network in outputs:
+        with open(join(tmp_dir, "all", network), "rb") as all_file, open(
+            join(tmp_dir, "update", network), "rb"
+        ) as update_file:
+            assert all_file.read() == update_file.read()
+    assert os.path.isfile(join(tmp_dir, "update", "network_1.txt"))
+    # The previous network should be built with the same settings.
+    out_dir = join(tmp_dir, "other_edge")
+    os.makedirs(out_dir, exist_ok=True)
+    contig_data, hit_data = mtn.create_contig_data(assembly, 1)
+    with pytest.raises(ValueError):
+        mtn.alignment_to_contacts(
+            [alignment_file],
+            contig_data,
+            500,
+            hit_data,
+            out_dir,
+            "network.txt",
+            "contig_data_network.txt",
+            out_dir,
+            1,
+            "empirical_hit",
+            False,
+            previous_dir=join(tmp_dir, "first"),
+        )
+    shutil.rmtree(tmp_dir)
+
+
+def test_normalize_network():
+    # Test the vectorized normalization against the one of normalize_pair.
+    names = {1: "NODE_1", 6: "NODE_6", 8: "NODE_8", 10: "NODE_10"}
+    edges = np.array([[1, 6], [1, 8], [6, 8], [8, 10]])
+    counts = np.array([[52, 52], [2004, 0], [800, 800], [275, 3]])
+    for normalization in [
+        "abundance",
+        "length",
+        "empirical_hit",
+        "theoritical_hit",
+    ]:
+        weights = mtn.normalize_network(
+            edges, counts, contigs_data, normalization
+        )
+        assert weights.shape == counts.shape
+        for (id1, id2), edge_counts, edge_weights in zip(
+            edges, counts, weights
+        ):
+            for n_occ, weight in zip(edge_counts, edge_weights):
+                expected = mtn.normalize_pair(
+                    contigs_data, (names[id1], names[id2]), n_occ, normalization
+                )
+                assert weight == expected
+    # Contigs without restriction sites have null weights.
+    weights = mtn.normalize_network(edges, counts, contigs_data, "RS")
+    assert weights[2, 0] == pytest.approx(221.57, abs=1e-2)
+    assert (weights[:2] == 0).all()
+    # Without normalization the counts are kept.
+    weights = mtn.normalize_network(edges, counts, contigs_data, "None")
+    assert (weights == counts).all()
 
 
 def test_normalize_pair():
@@ -244,3 +492,30 @@ def test_write_hit_data():
     assert data.loc[2, 3] == 4
     assert data.loc[1, 1] == "contig_1"
     os.remove(tmp_file)
+
+
+def test_write_network():
+    # Test network writer from in memory contacts.
+    tmp_files = ["tmp_network_test.txt", "tmp_network_test_0.txt"]
+    edges = np.array([[1, 6], [1, 8], [6, 8]])
+    counts = np.array([[52, 52], [2004, 0], [800, 800]])
+    mtn.write_network(edges, counts, tmp_files, contigs_data, "None")
+    data = pd.read_csv(tmp_files[0], sep="\t", header=None)
+    assert list(data.iloc[1, :]) == [1, 8, 2004]
+    data = pd.read_csv(tmp_files[1], sep="\t", header=None)
+    assert list(data.iloc[1, :]) == [6, 8, 800]
+    mtn.write_network(edges, counts, tmp_files, contigs_data, "length")
+    data = pd.read_csv(tmp_files[0], sep="\t", header=None)
+    assert data.iloc[0, 2] == pytest.approx(71.77, abs=1e-2)
+    # Null normalization factors are written as normalize_pair returns them.
+    edges = np.array([[1, 8], [8, 10]])
+    counts = np.array([[2004], [275]])
+    mtn.write_network(edges, counts, tmp_files[:1], contigs_data, "abundance")
+    with open(tmp_files[0]) as network:
+        lines = network.readlines()
+    weight = mtn.normalize_pair(
+        contigs_data, ("NODE_1", "NODE_8"), 2004, "abundance"
+    )
+    assert lines == [f"1\t8\t{weight}\n", "8\t10\t0\n"]
+    for tmp_file in tmp_files:
+        os.remove(tmp_file)
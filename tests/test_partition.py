@@ -29,18 +29,22 @@ shutil.rmtree(tmp_dir)
 contigs_data = pd.read_csv(
     "tests_data/outdir/contig_data_partition.txt", sep="\t"
 )
-output_partition = {
-    1: "0;13;0;10;5",
-    2: "0;6;3;10;5",
-    3: "7;0;7;0;0",
-    4: "7;0;7;0;0",
-    5: "1;1;7;10;0",
-    6: "2;8;1;13;1",
-    7: "8;11;6;4;1",
-    8: "6;9;15;4;13",
-    9: "10;7;3;2;8",
-    10: "2;8;1;13;1",
-}
+output_partition = pd.DataFrame(
+    [
+        [0, 13, 0, 10, 5],
+        [0, 6, 3, 10, 5],
+        [7, 0, 7, 0, 0],
+        [7, 0, 7, 0, 0],
+        [1, 1, 7, 10, 0],
+        [2, 8, 1, 13, 1],
+        [8, 11, 6, 4, 1],
+        [6, 9, 15, 4, 13],
+        [10, 7, 3, 2, 8],
+        [2, 8, 1, 13, 1],
+    ],
+    index=range(1, 11),
+    dtype=np.int32,
+)
 core_bins_contigs = {
     0: [1],
     1: [2],
@@ -51,7 +55,7 @@ core_bins_contigs = {
     6: [8],
     7: [9],
 }
-core_bins_iterations = pd.DataFrame(
+core_bins_iterations = np.array(
     [
         [0, 13, 0, 10, 5],
         [0, 6, 3, 10, 5],
@@ -97,7 +101,13 @@ def test_algo_partition():
         network_file, nodetype=int, data=(("weight", float),)
     )
     subnetwork = network.subgraph(np.arange(1, 5))
-    for algorithm in ["louvain", "leiden", "error"]:
+    for algorithm in [
+        "louvain",
+        "leiden",
+        "louvain_igraph",
+        "leiden_igraph",
+        "error",
+    ]:
         try:
             mtp.algo_partition(
                 algorithm,
@@ -139,7 +149,8 @@ def test_detect_core_bins():
         output_partition, iterations
     )
     assert cc_contigs == core_bins_contigs
-    assert (cc_iterations == core_bins_iterations).all().all()
+    assert isinstance(cc_iterations, np.ndarray)
+    assert (cc_iterations == core_bins_iterations).all()
 
 
 def test_generate_fasta():
@@ -161,12 +172,14 @@ def test_generate_fasta():
 
 def test_get_distances_splitmat():
     # Test hamming distance computation worker.
-    x = mtp.get_distances_splitmat(
-        core_bins_iterations[0:1], core_bins_iterations
-    )
+    membership = mtp.get_membership_matrix(core_bins_iterations)
+    x = mtp.get_distances_splitmat(membership[0:1], membership, 5)
     assert np.sum(x.data) == pytest.approx(1.8, abs=1e-5)
     assert x.shape == (8, 1)
     assert x.nnz == 3
+    x = mtp.get_distances_splitmat(membership[0:1], membership, 5, 0.6)
+    assert np.sum(x.data) == pytest.approx(1.6, abs=1e-5)
+    assert x.nnz == 2
 
 
 def test_get_hamming_distance():
@@ -175,6 +188,38 @@ def test_get_hamming_distance():
     assert np.sum(hamming_distance.data) == pytest.approx(12, abs=1e-5)
     assert hamming_distance.shape == (8, 8)
     assert hamming_distance.nnz == 22
+    # Only the pairs above the threshold are kept.
+    thresholded = mtp.get_hamming_distance(core_bins_iterations, threads, 0.6)
+    expected = hamming_distance.multiply(hamming_distance >= 0.6 - 1e-10)
+    assert thresholded.nnz == expected.nnz
+    assert (thresholded != expected).nnz == 0
+
+
+def test_get_membership_matrix():
+    membership = mtp.get_membership_matrix(core_bins_iterations)
+    assert membership.shape[0] == 8
+    assert (membership.sum(axis=1) == 5).all()
+
+
+def test_igraph_iterations():
+    # Test in process partitions.
+    for algorithm in ["louvain", "leiden"]:
+        partition = mtp.igraph_iterations(
+            network_file, iterations, algorithm, resolution_parameter, seed=1
+        )
+        _val = int(partition.loc[1, 0])
+        assert len(partition) == 1058
+        assert partition.shape[1] == iterations
+        # Same seeds in parallel give the same partitions.
+        partition_parallel = mtp.igraph_iterations(
+            network_file,
+            iterations,
+            algorithm,
+            resolution_parameter,
+            threads,
+            seed=1,
+        )
+        assert partition_parallel.equals(partition)
 
 
 def test_leiden_iterations_java():
@@ -184,17 +229,18 @@ def test_leiden_iterations_java():
     partition = mtp.leiden_iterations_java(
         network_file, iterations, resolution_parameter, tmp_dir, LEIDEN_PATH
     )
-    _val = int(partition[1].split(";")[0])
+    _val = int(partition.loc[1, 0])
     assert len(partition) == 1058
-    assert len(partition[1].split(";")) == iterations
+    assert partition.shape[1] == iterations
     shutil.rmtree(tmp_dir)
 
 
 def test_louvain_iterations_cpp():
     # Test louvain partition.
-    _val = int(partition[1].split(";")[0])
+    _val = int(partition.loc[1, 0])
     assert len(partition) == 1058
-    assert len(partition[1].split(";")) == iterations
+    assert partition.shape[1] == iterations
+    assert (partition.dtypes == np.int32).all()
 
 
 def test_partition():
@@ -203,16 +249,13 @@ def test_partition():
 
 def test_remove_isolates():
     # Test isolate removing from partition.
-    partition1 = dict()
-    for i in range(1, 1219):
-        try:
-            partition1[i] = partition[i]
-        except KeyError:
-            partition1[i] = ";".join(
-                map(str, map(int, np.ones(iterations) * i))
-            )
+    ids = np.arange(1, 1219)
+    partition1 = pd.DataFrame(
+        np.repeat(ids[:, None], iterations, axis=1), index=ids, dtype=np.int32
+    )
+    partition1.loc[partition.index] = partition.values
     partition2 = mtp.remove_isolates(partition1, network_file)
-    assert partition2 == partition
+    assert partition2.sort_index().equals(partition.sort_index())
 
 
 # def test_spinglass_partition():
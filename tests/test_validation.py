@@ -92,9 +92,9 @@ def test_recursive_clustering_worker():
         resolution_parameter,
         contigs_data,
     )
-    _val = int(partition[716].split(";")[0])
+    _val = int(partition.loc[716, 0])
     assert len(partition) == 192
-    assert len(partition[716].split(";")) == iterations
+    assert partition.shape[1] == iterations
     shutil.rmtree(tmp_dir)
 
 